@@ -0,0 +1,334 @@
+"""
+Team/roster batch grading.
+
+Grades every player in a folder or zip of exports in parallel and writes one
+roster CSV with every metric and grade from the single-player report.
+
+Files are paired per player. When exports sit in one subfolder per player the
+folder name is the player; otherwise the player is the file name with the
+"bat speed" / "exit velocity" words removed, e.g. "Jane Doe - Bat Speed.csv"
+and "Jane Doe - Exit Velocity.csv". Usage:
+
+    python batch.py exports.zip --out roster.csv \
+        --bat-speed-level "High School" --exit-velocity-level "Var/18u" \
+        --heatmaps heatmaps/
+"""
+import argparse
+import dataclasses
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from bootstrap import (
+    DEFAULT_CONFIDENCE,
+    compute_bat_speed_intervals,
+    compute_combined_intervals,
+    compute_exit_velocity_intervals,
+)
+from combined import DEFAULT_TOLERANCE, JOIN_KEYS, compute_combined_metrics
+from formats import BAT_SPEED, EXIT_VELOCITY, KIND_LABELS, UnknownLayoutError, sniff_layout
+from ingest import stream_bat_speed_metrics, stream_exit_velocity
+from metrics import (
+    ZONE_METRICS,
+    compute_bat_speed_metrics,
+    compute_exit_velocity_metrics,
+    compute_zone_stats,
+    read_bat_speed_csv,
+    read_exit_velocity_csv,
+)
+
+# Key of discover_player_files() entries listing a kind's conflicting exports.
+DUPLICATES = "duplicates"
+
+_KIND_PATTERNS = [
+    (BAT_SPEED, re.compile(r"bat[\s_-]*speed|blast", re.IGNORECASE)),
+    (EXIT_VELOCITY, re.compile(r"exit[\s_-]*velo(city)?|hittrax|(?<![a-z])ev(?![a-z])", re.IGNORECASE)),
+]
+
+
+###################
+# FILE DISCOVERY  #
+###################
+
+def _open_source(source):
+    """Open a source: a filesystem path, or a (zip path, member name) tuple."""
+    if isinstance(source, tuple):
+        zip_path, member = source
+        # The member stays readable (and seekable) after the archive handle is
+        # closed, and is decompressed as it is read rather than all at once.
+        with zipfile.ZipFile(zip_path) as archive:
+            return archive.open(member)
+    return open(source, "rb")
+
+
+def _sniff_kind(source):
+    """
+    Tell the two export kinds apart by content, from the layout their header
+    row matches (see formats.py). Files matching no layout count as Bat Speed
+    and fail when graded.
+    """
+    with _open_source(source) as f:
+        try:
+            return sniff_layout(f).kind
+        except UnknownLayoutError:
+            return BAT_SPEED
+
+
+def _classify(relative_path, source):
+    """Return (player, kind) for one CSV file."""
+    parent, filename = os.path.split(relative_path)
+    stem = os.path.splitext(filename)[0]
+
+    kind = None
+    for candidate, pattern in _KIND_PATTERNS:
+        if pattern.search(stem):
+            kind = candidate
+            stem = pattern.sub(" ", stem)
+            break
+    if kind is None:
+        kind = _sniff_kind(source)
+
+    if parent:
+        player = os.path.basename(parent)
+    else:
+        player = re.sub(r"[\s_\-]+", " ", stem).strip() or filename
+    return player, kind
+
+
+def discover_player_files(path):
+    """
+    Pair up exports under a directory or inside a .zip archive.
+    Returns {player: {"bat_speed": source, "exit_velocity": source}} where a
+    source is a path or a (zip path, member) tuple. A player with several
+    exports of one kind also gets {DUPLICATES: {kind: [every source]}}, so
+    grade_player() can report them instead of grading an arbitrary one.
+    """
+    entries = []
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if member.lower().endswith(".csv") and not member.startswith("__MACOSX/"):
+                    entries.append((member, (path, member)))
+    else:
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                if filename.lower().endswith(".csv"):
+                    full_path = os.path.join(dirpath, filename)
+                    entries.append((os.path.relpath(full_path, path), full_path))
+
+    players = {}
+    for relative_path, source in sorted(entries):
+        player, kind = _classify(relative_path, source)
+        files = players.setdefault(player, {})
+        if kind in files:
+            files.setdefault(DUPLICATES, {}).setdefault(kind, [files[kind]]).append(source)
+        else:
+            files[kind] = source
+    return players
+
+
+##################
+# PER-PLAYER JOB #
+##################
+
+def _source_name(source):
+    if source is None:
+        return ""
+    return source[1] if isinstance(source, tuple) else source
+
+
+def grade_player(player, files, bat_speed_level, exit_velocity_level, heatmap_dir=None, streaming=False,
+                 heatmap_metric="avg_exit_velocity", swing_join=None, join_tolerance=DEFAULT_TOLERANCE,
+                 resamples=0, confidence=DEFAULT_CONFIDENCE):
+    """
+    Compute every report metric and grade for one player and return a flat
+    dict (one roster row). Failures are recorded in the "error" column so one
+    bad export does not stop the batch. With streaming=True files are read in
+    chunks through ingest.py, for exports too large to hold in memory.
+    heatmap_metric is the per-zone stat (metrics.ZONE_METRICS) the heatmap shows.
+    swing_join ("timestamp" or "sequence", see combined.py) adds the combined
+    swing metrics when the player has both exports; it needs whole files, so
+    it is ignored with streaming=True. resamples > 0 adds <metric>_ci_low /
+    <metric>_ci_high bootstrap interval columns (see bootstrap.py) at the
+    given confidence, likewise only without streaming.
+    """
+    # A kind with several exports is not graded: which one is current is unknown.
+    duplicates = files.get(DUPLICATES, {})
+    bat_speed_source = None if BAT_SPEED in duplicates else files.get(BAT_SPEED)
+    exit_velocity_source = None if EXIT_VELOCITY in duplicates else files.get(EXIT_VELOCITY)
+    row = {
+        "player": player,
+        "bat_speed_file": _source_name(files.get(BAT_SPEED)),
+        "exit_velocity_file": _source_name(files.get(EXIT_VELOCITY)),
+    }
+    errors = []
+    for kind, sources in duplicates.items():
+        names = [_source_name(source) for source in sources]
+        row[f"{kind}_file"] = "; ".join(names)
+        errors.append(f"{KIND_LABELS[kind].lower()}: {len(names)} exports found for this player "
+                      f"({', '.join(names)}); keep only one")
+    df_bat_speed = df_exit_velocity = None
+
+    if bat_speed_source is not None:
+        try:
+            with _open_source(bat_speed_source) as f:
+                if streaming:
+                    result = stream_bat_speed_metrics(f, bat_speed_level)
+                else:
+                    df_bat_speed = read_bat_speed_csv(f)
+                    result = compute_bat_speed_metrics(df_bat_speed, bat_speed_level)
+            for name, value in dataclasses.asdict(result).items():
+                row["bat_speed_level" if name == "level" else name] = value
+            if resamples and df_bat_speed is not None:
+                row.update(compute_bat_speed_intervals(
+                    df_bat_speed, bat_speed_level, resamples=resamples, confidence=confidence
+                ).as_row())
+        except Exception as e:
+            errors.append(f"bat speed: {e}")
+
+    if exit_velocity_source is not None:
+        try:
+            with _open_source(exit_velocity_source) as f:
+                if streaming:
+                    result, zone_stats = stream_exit_velocity(f, exit_velocity_level)
+                else:
+                    df_exit_velocity = read_exit_velocity_csv(f)
+                    result = compute_exit_velocity_metrics(df_exit_velocity, exit_velocity_level)
+                    zone_stats = None
+            for name, value in dataclasses.asdict(result).items():
+                row["exit_velocity_level" if name == "level" else name] = value
+            if resamples and df_exit_velocity is not None:
+                row.update(compute_exit_velocity_intervals(
+                    df_exit_velocity, exit_velocity_level, resamples=resamples, confidence=confidence
+                ).as_row())
+
+            if heatmap_dir:
+                # Imported here so workers that skip heatmaps never load matplotlib.
+                from heatmap import render_strike_zone_png
+
+                if zone_stats is None:
+                    zone_stats = compute_zone_stats(df_exit_velocity)
+                png = render_strike_zone_png(zone_stats, heatmap_metric)
+                heatmap_path = os.path.join(heatmap_dir, re.sub(r"[^\w\-]+", "_", player) + ".png")
+                with open(heatmap_path, "wb") as out:
+                    out.write(png)
+                row["heatmap_file"] = heatmap_path
+        except Exception as e:
+            errors.append(f"exit velocity: {e}")
+
+    if swing_join and df_bat_speed is not None and df_exit_velocity is not None:
+        try:
+            result = compute_combined_metrics(df_bat_speed, df_exit_velocity, bat_speed_level, swing_join,
+                                              join_tolerance)
+            if result is not None:
+                for name, value in dataclasses.asdict(result).items():
+                    row["combined_level" if name == "level" else name] = value
+                if resamples:
+                    row.update(compute_combined_intervals(
+                        df_bat_speed, df_exit_velocity, bat_speed_level, swing_join, join_tolerance,
+                        resamples=resamples, confidence=confidence
+                    ).as_row())
+        except Exception as e:
+            errors.append(f"swing join: {e}")
+
+    row["error"] = "; ".join(errors)
+    return row
+
+
+def _grade_player_job(args):
+    return grade_player(*args)
+
+
+###############
+# ROSTER RUN  #
+###############
+
+def grade_roster(path, bat_speed_level, exit_velocity_level, heatmap_dir=None, workers=None, streaming=False,
+                 heatmap_metric="avg_exit_velocity", swing_join=None, join_tolerance=DEFAULT_TOLERANCE,
+                 resamples=0, confidence=DEFAULT_CONFIDENCE):
+    """
+    Grade every player found under path (directory or .zip) across a process
+    pool and return the roster as a DataFrame, one row per player.
+    """
+    players = discover_player_files(path)
+    if heatmap_dir:
+        os.makedirs(heatmap_dir, exist_ok=True)
+
+    jobs = [
+        (player, files, bat_speed_level, exit_velocity_level, heatmap_dir, streaming, heatmap_metric,
+         swing_join, join_tolerance, resamples, confidence)
+        for player, files in players.items()
+    ]
+    if not jobs:
+        return pd.DataFrame(columns=["player", "bat_speed_file", "exit_velocity_file", "error"])
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        rows = [_grade_player_job(job) for job in jobs]
+    else:
+        # Several players per task keeps inter-process overhead small for big rosters.
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = list(executor.map(_grade_player_job, jobs, chunksize=chunksize))
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a folder or zip of player exports.")
+    parser.add_argument("source", help="Directory or .zip archive of Bat Speed / Exit Velocity CSVs")
+    parser.add_argument("--out", default="roster.csv", help="Roster CSV to write")
+    parser.add_argument("--bat-speed-level", default="High School")
+    parser.add_argument("--exit-velocity-level", default="Var/18u")
+    parser.add_argument("--heatmaps", metavar="DIR", help="Also write each player's strike zone PNG here")
+    parser.add_argument("--heatmap-metric", choices=ZONE_METRICS, default="avg_exit_velocity",
+                        help="Per-zone metric the heatmaps show")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Read exports in chunks with bounded memory (for very large files)")
+    parser.add_argument("--join", choices=JOIN_KEYS,
+                        help="Match Bat Speed swings to Exit Velocity rows by timestamp or sequence and add the "
+                             "combined swing metrics")
+    parser.add_argument("--join-tolerance", type=float, default=DEFAULT_TOLERANCE, metavar="SECONDS",
+                        help="Largest swing-to-ball time gap matched by --join timestamp")
+    parser.add_argument("--bootstrap", type=int, default=0, metavar="RESAMPLES",
+                        help="Add <metric>_ci_low/_ci_high bootstrap confidence interval columns from this many "
+                             "resamples (e.g. 1000)")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE,
+                        help="Confidence level of the --bootstrap intervals")
+    parser.add_argument("--percentiles", metavar="INDEX",
+                        help="Add <metric>_percentile columns ranked against this percentile index")
+    args = parser.parse_args()
+    if args.join and args.streaming:
+        parser.error("--join needs whole exports and cannot be used with --streaming")
+    if args.bootstrap and args.streaming:
+        parser.error("--bootstrap needs whole exports and cannot be used with --streaming")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1")
+
+    roster = grade_roster(
+        args.source,
+        args.bat_speed_level,
+        args.exit_velocity_level,
+        heatmap_dir=args.heatmaps,
+        workers=args.workers,
+        streaming=args.streaming,
+        heatmap_metric=args.heatmap_metric,
+        swing_join=args.join,
+        join_tolerance=args.join_tolerance,
+        resamples=args.bootstrap,
+        confidence=args.confidence,
+    )
+    if args.percentiles:
+        from percentiles import PercentileIndex
+
+        roster = PercentileIndex.load(args.percentiles).rank_roster(roster)
+    roster.to_csv(args.out, index=False)
+    failed = int((roster["error"] != "").sum())
+    print(f"Graded {len(roster)} players -> {args.out}" + (f" ({failed} with errors)" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Bootstrap confidence intervals as session size grows.
+
+Writes synthetic exports of increasing size to a temporary directory, parses
+them once, then times the Bat Speed, Exit Velocity and combined (sequence
+join) intervals of bootstrap.py. Usage:
+
+    python benchmarks/bench_bootstrap.py [--sizes 50 300 2000 20000] [--resamples 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from synthetic import write_bat_speed_csv, write_exit_velocity_csv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bootstrap import (  # noqa: E402
+    DEFAULT_RESAMPLES,
+    compute_bat_speed_intervals,
+    compute_combined_intervals,
+    compute_exit_velocity_intervals,
+)
+from metrics import read_bat_speed_csv, read_exit_velocity_csv  # noqa: E402
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap interval timings")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 300, 2000, 20_000])
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'swings':>10} {'bat speed':>10} {'exit velo':>10} {'combined':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for swings in args.sizes:
+            bat_path = write_bat_speed_csv(os.path.join(directory, f"bat_{swings}.csv"), swings, args.seed)
+            ev_path = write_exit_velocity_csv(os.path.join(directory, f"ev_{swings}.csv"), swings, args.seed)
+            df_bat_speed = read_bat_speed_csv(bat_path)
+            df_exit_velocity = read_exit_velocity_csv(ev_path)
+
+            _, bat_seconds = timed(
+                compute_bat_speed_intervals, df_bat_speed, "College", resamples=args.resamples
+            )
+            _, ev_seconds = timed(
+                compute_exit_velocity_intervals, df_exit_velocity, "College", resamples=args.resamples
+            )
+            _, combined_seconds = timed(
+                compute_combined_intervals, df_bat_speed, df_exit_velocity, "College", "sequence",
+                resamples=args.resamples
+            )
+            print(f"{swings:>10} {bat_seconds * 1000:8.1f}ms {ev_seconds * 1000:8.1f}ms "
+                  f"{combined_seconds * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
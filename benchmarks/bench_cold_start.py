@@ -0,0 +1,120 @@
+"""
+Cold-start cost of the page: import time, first render and first report.
+
+Each measurement runs in a fresh interpreter so nothing is already cached in
+sys.modules:
+
+- import rows time whole interpreters and subtract a bare one. "eager page
+  imports" is what otrstrike.py used to import at the top; "lazy page
+  imports" is what it imports now.
+- "first render" runs the page once through Streamlit's AppTest with nothing
+  uploaded, which is what a new visitor to a cold container waits for.
+- "first EV report" parses and grades an Exit Velocity export and renders its
+  heatmap in a process that has only imported the page's top-level modules:
+  cold, and again after the page's background pre-warm has finished.
+
+Usage:
+
+    python benchmarks/bench_cold_start.py [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import write_exit_velocity_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTS = {
+    "metrics engine": "import metrics",
+    "eager page imports": (
+        "import streamlit, pandas, smtplib, numpy\n"
+        "import email.mime.multipart, email.mime.text\n"
+        "import matplotlib; matplotlib.use('Agg')\n"
+        "import matplotlib.pyplot\n"
+        "import metrics"
+    ),
+    "lazy page imports": "import streamlit, perf, cache, report",
+}
+
+# Each snippet prints the seconds its measured section took.
+FIRST_RENDER = """
+import os, time
+os.environ["OTR_PREWARM"] = "0"
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+AppTest.from_file("otrstrike.py", default_timeout=60).run()
+print(time.perf_counter() - start)
+"""
+
+FIRST_EV_REPORT = """
+import time
+import streamlit, perf, cache, report
+{setup}
+start = time.perf_counter()
+from metrics import compute_exit_velocity_metrics, compute_zone_stats, read_exit_velocity_csv
+from heatmap import render_strike_zone_png
+df = read_exit_velocity_csv({path!r})
+compute_exit_velocity_metrics(df, "College")
+render_strike_zone_png(compute_zone_stats(df))
+print(time.perf_counter() - start)
+"""
+
+# The page's _prewarm() body, run to completion before timing.
+PREWARM = """
+from io import BytesIO
+import trends
+from heatmap import get_renderer
+from metrics import read_exit_velocity_csv
+get_renderer()
+read_exit_velocity_csv(BytesIO(b"Strike Zone,Velo,LA,Dist\\n5,80,10,200\\n"))
+"""
+
+
+def run_python(code):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def time_import(code, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_python(code)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def time_section(code, runs):
+    return [float(run_python(code).split()[-1]) for _ in range(runs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    interpreter = statistics.median(time_import("pass", args.runs))
+    print(f"{'bare interpreter':<26} {interpreter * 1000:8.1f} ms")
+    for name, code in IMPORTS.items():
+        median = statistics.median(time_import(code, args.runs))
+        print(f"{name:<26} {median * 1000:8.1f} ms  (imports: {(median - interpreter) * 1000:.1f} ms)")
+
+    median = statistics.median(time_section(FIRST_RENDER, args.runs))
+    print(f"{'first render (no uploads)':<26} {median * 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_exit_velocity_csv(os.path.join(directory, "ev.csv"), 1_000)
+        for name, setup in (("first EV report (cold)", ""), ("first EV report (warm)", PREWARM)):
+            median = statistics.median(time_section(FIRST_EV_REPORT.format(setup=setup, path=path), args.runs))
+            print(f"{name:<26} {median * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
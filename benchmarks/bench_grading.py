@@ -0,0 +1,61 @@
+"""
+Scalar vs vectorized grading over a synthetic roster.
+
+Checks that grade_metric_array agrees with evaluate_performance for every
+benchmark metric (including values sitting exactly on the thresholds and
+NaN), then times both. Usage:
+
+    python benchmarks/bench_grading.py [--rows 200000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import benchmark_table, benchmarks, evaluate_performance, grade_metric_array, metric_rules  # noqa: E402
+
+
+def synthetic_column(metric, rows, rng):
+    """Random levels that define metric, and values around their benchmarks."""
+    levels = benchmark_table.index[benchmark_table[metric].notna()].to_numpy(dtype=object)
+    level_col = rng.choice(levels, size=rows)
+    bench = np.array([benchmarks[level][metric] for level in level_col])
+    values = bench * rng.uniform(0.8, 1.2, size=rows)
+    # Exact threshold hits and missing values exercise the boundaries.
+    edges = np.stack([bench, bench - 3, bench * 0.9, bench * 1.1])
+    pick = rng.random(rows) < 0.2
+    values[pick] = edges[rng.integers(0, 4, size=rows), np.arange(rows)][pick]
+    values[rng.random(rows) < 0.01] = np.nan
+    return values, level_col
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalar vs vectorized grading")
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'metric':<18} {'scalar':>10} {'vector':>10} {'speedup':>8}")
+    for metric, rules in metric_rules.items():
+        values, levels = synthetic_column(metric, args.rows, rng)
+
+        start = time.perf_counter()
+        scalar = [evaluate_performance(v, benchmarks[lvl][metric], **rules) for v, lvl in zip(values, levels)]
+        scalar_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vector = grade_metric_array(values, levels, metric)
+        vector_time = time.perf_counter() - start
+
+        mismatches = int((np.asarray(scalar) != vector).sum())
+        if mismatches:
+            raise SystemExit(f"{metric}: {mismatches} grades differ from evaluate_performance")
+        print(f"{metric:<18} {scalar_time * 1000:8.1f}ms {vector_time * 1000:8.1f}ms {scalar_time / vector_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
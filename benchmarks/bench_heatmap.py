@@ -0,0 +1,99 @@
+"""
+Per-render latency of the strike zone heatmap.
+
+Compares the original pyplot path (new figure, patches and text added one at
+a time, savefig with bbox_inches='tight') against the reusable
+StrikeZoneRenderer, both cold (distinct data every time) and memoized
+(repeated data). Usage:
+
+    python benchmarks/bench_heatmap.py [--renders 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import heatmap  # noqa: E402
+
+
+def legacy_render(zone_avg_df):
+    """The renderer as it was before StrikeZoneRenderer, kept for comparison."""
+    if not zone_avg_df.empty:
+        min_ev = zone_avg_df.min()
+        max_ev = zone_avg_df.max()
+    else:
+        min_ev, max_ev = 0, 1
+
+    fig, ax = plt.subplots(figsize=(3,5))
+    ax.axis('off')
+    for r, row_zones in enumerate(heatmap.zone_layout):
+        for c, z in enumerate(row_zones):
+            x = c
+            y = len(heatmap.zone_layout)-1 - r
+            if z is not None:
+                mean_ev = zone_avg_df.get(z, np.nan)
+                if np.isnan(mean_ev):
+                    color = 'white'
+                else:
+                    norm_val = (mean_ev - min_ev) / (max_ev - min_ev) if (max_ev > min_ev) else 0
+                    color = heatmap.cmap(norm_val)
+                ax.add_patch(plt.Rectangle((x, y), 1, 1, facecolor=color, edgecolor='black'))
+                ax.text(x+0.5, y+0.7, str(z), ha='center', va='center', fontsize=10, color='black')
+                if not np.isnan(mean_ev):
+                    ax.text(x+0.5, y+0.3, f"{mean_ev:.1f} mph", ha='center', va='center', fontsize=8, color='black')
+            else:
+                ax.add_patch(plt.Rectangle((x, y), 1, 1, facecolor='white', edgecolor='black'))
+    ax.set_xlim(0, 3)
+    ax.set_ylim(0, 5)
+    buf = BytesIO()
+    plt.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def time_renders(render, inputs):
+    samples = []
+    for zone_avg_df in inputs:
+        start = time.perf_counter()
+        render(zone_avg_df)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strike zone heatmap render latency")
+    parser.add_argument("--renders", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    inputs = [
+        pd.Series(rng.normal(80, 8, 13), index=range(1, 14)).where(rng.random(13) > 0.1)
+        for _ in range(args.renders)
+    ]
+
+    # Warm up both paths so font loading is not counted.
+    legacy_render(inputs[0])
+    heatmap.get_renderer()
+
+    results = {
+        "legacy pyplot": time_renders(legacy_render, inputs),
+        "renderer (cold)": time_renders(heatmap.render_strike_zone_png, inputs),
+        "renderer (memo)": time_renders(heatmap.render_strike_zone_png, inputs),
+    }
+    for name, samples in results.items():
+        print(f"{name:<16} median {statistics.median(samples) * 1000:7.2f} ms   "
+              f"p95 {np.percentile(samples, 95) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Swing-level join of Bat Speed and Exit Velocity exports as file size grows.
+
+Writes synthetic exports of increasing size to a temporary directory, parses
+them once, then times join_swings by timestamp and by sequence plus the full
+compute_combined_metrics. The synthetic devices log the same swing at the
+same second, so every swing must match the EV row at its own position; the
+script checks that before timing. Usage:
+
+    python benchmarks/bench_join.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic import write_bat_speed_csv, write_exit_velocity_csv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from combined import compute_combined_metrics, join_swings  # noqa: E402
+from metrics import read_bat_speed_csv, read_exit_velocity_csv  # noqa: E402
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Swing join timings")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'swings':>10} {'timestamp':>10} {'sequence':>10} {'combined':>10} {'matched':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for swings in args.sizes:
+            bat_path = write_bat_speed_csv(os.path.join(directory, f"bat_{swings}.csv"), swings, args.seed)
+            ev_path = write_exit_velocity_csv(os.path.join(directory, f"ev_{swings}.csv"), swings, args.seed)
+            df_bat_speed = read_bat_speed_csv(bat_path)
+            df_exit_velocity = read_exit_velocity_csv(ev_path)
+
+            by_time, time_seconds = timed(join_swings, df_bat_speed, df_exit_velocity, "timestamp")
+            by_sequence, sequence_seconds = timed(join_swings, df_bat_speed, df_exit_velocity, "sequence")
+            for on, joined in (("timestamp", by_time), ("sequence", by_sequence)):
+                if len(joined) != swings or not np.array_equal(joined["bat_row"], joined["exit_velocity_row"]):
+                    raise SystemExit(f"{swings} swings by {on}: swings were not matched to their own EV rows")
+
+            combined, combined_seconds = timed(
+                compute_combined_metrics, df_bat_speed, df_exit_velocity, "College"
+            )
+            print(f"{swings:>10} {time_seconds * 1000:8.1f}ms {sequence_seconds * 1000:8.1f}ms "
+                  f"{combined_seconds * 1000:8.1f}ms {combined.matched_swings:>10}")
+
+
+if __name__ == "__main__":
+    main()
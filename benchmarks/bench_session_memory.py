@@ -0,0 +1,163 @@
+"""
+Memory each browser session keeps on the server.
+
+Opens --sessions independent page sessions through Streamlit's AppTest. Each
+one uploads its own Bat Speed and Exit Velocity export and waits for its
+report. The script then measures what each session's st.session_state keeps
+alive: the bytes of every object reachable from it, excluding objects that
+are also reachable from the process-wide caches and so are shared by every
+session. Streamlit's own copy of the uploaded files is not counted; it is
+the same for any page.
+
+The legacy column rebuilds, from each finished session, what the page kept
+before reports became one compact result: the request with its uploaded
+bytes, a job result holding the base64 heatmap HTML, and the page's
+module-level metric placeholders.
+
+Usage:
+
+    python benchmarks/bench_session_memory.py [--sessions 10] [--swings 20000]
+"""
+import argparse
+import copy
+import gc
+import os
+import statistics
+import sys
+import tempfile
+import types
+from dataclasses import dataclass, replace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("OTR_PREWARM", "0")
+# Let every report finish inside its run, so each session holds a finished one.
+os.environ.setdefault("OTR_REPORT_WAIT", "120")
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import cache  # noqa: E402
+from synthetic import write_bat_speed_csv, write_exit_velocity_csv  # noqa: E402
+
+# Code, classes and modules are shared by construction; do not walk into them.
+_SKIP = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.CodeType)
+
+
+def _walk(roots, seen):
+    """Total getsizeof of the objects reachable from roots and not in seen (which is updated)."""
+    total = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIP):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return total
+
+
+def shared_ids():
+    """Ids of every object held by the process-wide result caches."""
+    import heatmap
+
+    seen = set()
+    _walk([cache.frame_cache, cache.metrics_cache, cache.heatmap_cache, heatmap._png_cache], seen)
+    return seen
+
+
+def session_values(at):
+    """The page's own session_state entries (not widget values)."""
+    return [value for key, value in at.session_state.items() if not str(key).startswith("$$")]
+
+
+@dataclass(frozen=True)
+class LegacyReportResult:
+    """The job result before the compact ReportResult: HTML instead of PNG bytes."""
+    bat_speed_result: object = None
+    exit_velocity_result: object = None
+    strike_zone_img_html: str = ""
+    messages: tuple = ()
+
+
+# The page's former module-level placeholders, filled from the results each run.
+_LEGACY_GLOBALS = {
+    "player_avg_bat_speed": ("bat_speed_result", "avg_bat_speed"),
+    "bat_speed_benchmark": ("bat_speed_result", "bat_speed_benchmark"),
+    "top_10_percent_bat_speed": ("bat_speed_result", "top_10_percent_bat_speed"),
+    "top_90_benchmark": ("bat_speed_result", "top_90_benchmark"),
+    "avg_attack_angle_top_10": ("bat_speed_result", "avg_attack_angle_top_10"),
+    "attack_angle_benchmark": ("bat_speed_result", "attack_angle_benchmark"),
+    "avg_time_to_contact": ("bat_speed_result", "avg_time_to_contact"),
+    "time_to_contact_benchmark": ("bat_speed_result", "time_to_contact_benchmark"),
+    "exit_velocity_avg": ("exit_velocity_result", "avg_exit_velocity"),
+    "ev_benchmark": ("exit_velocity_result", "ev_benchmark"),
+    "top_8_percent_exit_velocity": ("exit_velocity_result", "top_8_percent_exit_velocity"),
+    "top_8_benchmark": ("exit_velocity_result", "top_8_benchmark"),
+    "avg_launch_angle_top_8": ("exit_velocity_result", "avg_launch_angle_top_8"),
+    "hhb_la_benchmark": ("exit_velocity_result", "hhb_la_benchmark"),
+    "total_avg_launch_angle": ("exit_velocity_result", "total_avg_launch_angle"),
+    "la_benchmark": ("exit_velocity_result", "la_benchmark"),
+    "avg_distance_top_8": ("exit_velocity_result", "avg_distance_top_8"),
+}
+
+
+def legacy_session_values(at, uploads):
+    """
+    What the same session kept before: its ReportRequest with the uploaded
+    bytes, its job holding a LegacyReportResult, and the page globals.
+    """
+    request, job = at.session_state["report"]
+    result = job.result
+    legacy_result = LegacyReportResult(
+        result.bat_speed_result, result.exit_velocity_result, result.strike_zone_html(), result.messages
+    )
+    legacy_job = copy.copy(job)
+    legacy_job.result = legacy_result
+    page_globals = {
+        name: getattr(getattr(result, source), field) for name, (source, field) in _LEGACY_GLOBALS.items()
+    }
+    page_globals["strike_zone_img_html"] = legacy_result.strike_zone_img_html
+    # st.file_uploader's getvalue() returns a fresh copy of the upload each time.
+    bat_speed_data, exit_velocity_data = (bytes(bytearray(data)) for data in uploads)
+    legacy_request = replace(request, bat_speed_data=bat_speed_data, exit_velocity_data=exit_velocity_data)
+    return [(legacy_request, legacy_job), page_globals]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--swings", type=int, default=20_000)
+    args = parser.parse_args()
+
+    sessions = []
+    with tempfile.TemporaryDirectory() as directory:
+        for seed in range(args.sessions):
+            bat_path = write_bat_speed_csv(os.path.join(directory, f"bat_{seed}.csv"), args.swings, seed)
+            ev_path = write_exit_velocity_csv(os.path.join(directory, f"ev_{seed}.csv"), args.swings, seed)
+            with open(bat_path, "rb") as f:
+                bat_speed_data = f.read()
+            with open(ev_path, "rb") as f:
+                exit_velocity_data = f.read()
+            at = AppTest.from_file(os.path.join(REPO_ROOT, "otrstrike.py"), default_timeout=120)
+            at.run()
+            at.file_uploader[0].set_value(("bat.csv", bat_speed_data, "text/csv"))
+            at.file_uploader[1].set_value(("ev.csv", exit_velocity_data, "text/csv"))
+            at.run()
+            sessions.append((at, (bat_speed_data, exit_velocity_data)))
+        upload_kb = (os.path.getsize(bat_path) + os.path.getsize(ev_path)) / 1024
+
+    shared = shared_ids()
+    results = {
+        "legacy": [_walk(legacy_session_values(at, uploads), set(shared)) for at, uploads in sessions],
+        "compact result": [_walk(session_values(at), set(shared)) for at, _ in sessions],
+    }
+    print(f"{args.sessions} sessions, {args.swings} swings per export ({upload_kb:.0f} KB uploaded per session)")
+    print("session_state bytes not shared with other sessions:")
+    print(f"{'':>16} {'median KB':>10} {'max KB':>10}")
+    for name, per_session in results.items():
+        print(f"{name:>16} {statistics.median(per_session) / 1024:10.1f} {max(per_session) / 1024:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Email delivery throughput against a local SMTP stand-in.
+
+Starts an aiosmtpd sink on localhost (pip install aiosmtpd) and sends the
+same report-sized message N times three ways: a fresh connection per message
+(the original send_email_report behaviour), send_bulk over one pooled
+session, and the background DeliveryQueue. Usage:
+
+    python benchmarks/bench_smtp.py [--messages 500]
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailer import DeliveryQueue, SMTPConfig, SMTPConnectionPool, send_bulk  # noqa: E402
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.handlers import Sink
+except ImportError:
+    Controller = None
+
+
+def make_message(i):
+    msg = MIMEMultipart()
+    msg['From'] = "reports@example.com"
+    msg['To'] = f"player{i}@example.com"
+    msg['Subject'] = "OTR Baseball Metrics and Grade Report"
+    # Roughly the size of a report with an embedded heatmap.
+    msg.attach(MIMEText("<html><body>\n" + ("x" * 76 + "\n") * 260 + "</body></html>", 'html'))
+    return msg
+
+
+def per_message_connect(config, messages):
+    for msg in messages:
+        with smtplib.SMTP(config.host, config.port) as server:
+            server.send_message(msg)
+
+
+def pooled_bulk(config, messages):
+    pool = SMTPConnectionPool(config)
+    send_bulk(pool, messages)
+    pool.close()
+
+
+def queued_bulk(config, messages):
+    pool = SMTPConnectionPool(config, size=4)
+    delivery = DeliveryQueue(pool, workers=4, maxsize=len(messages))
+    for future in delivery.submit_bulk(messages):
+        future.result()
+    pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMTP delivery throughput")
+    parser.add_argument("--messages", type=int, default=500)
+    args = parser.parse_args()
+    if Controller is None:
+        raise SystemExit("aiosmtpd is required for this benchmark: pip install aiosmtpd")
+
+    controller = Controller(Sink(), hostname="127.0.0.1", port=8025)
+    controller.start()
+    try:
+        config = SMTPConfig("127.0.0.1", 8025, starttls=False)
+        messages = [make_message(i) for i in range(args.messages)]
+        for name, send in [
+            ("connect per message", per_message_connect),
+            ("pooled send_bulk", pooled_bulk),
+            ("DeliveryQueue (4 workers)", queued_bulk),
+        ]:
+            start = time.perf_counter()
+            send(config, messages)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<26} {args.messages / elapsed:8.1f} msg/s")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Peak memory of in-memory vs streaming ingestion as file size grows.
+
+Writes synthetic Bat Speed and Exit Velocity exports of increasing size to a
+temporary directory, then measures each path in a fresh subprocess. It
+reports peak RSS in MB (read from /proc, so Linux only) and wall time, and
+checks that both paths agree. Usage:
+
+    python benchmarks/bench_streaming.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from synthetic import write_bat_speed_csv, write_exit_velocity_csv
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import json, sys, time
+sys.path.insert(0, {repo!r})
+start = time.perf_counter()
+if {streaming}:
+    from ingest import stream_bat_speed_metrics, stream_exit_velocity
+    bat = stream_bat_speed_metrics({bat!r}, "College")
+    ev, _ = stream_exit_velocity({ev!r}, "College")
+else:
+    from metrics import compute_bat_speed_metrics, compute_exit_velocity_metrics, read_bat_speed_csv, read_exit_velocity_csv
+    bat = compute_bat_speed_metrics(read_bat_speed_csv({bat!r}), "College")
+    ev = compute_exit_velocity_metrics(read_exit_velocity_csv({ev!r}), "College")
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    # VmHWM is this process's own peak; ru_maxrss would include the parent's.
+    "peak_mb": int(next(l for l in open("/proc/self/status") if l.startswith("VmHWM")).split()[1]) / 1024,
+    "top_10": bat.top_10_percent_bat_speed,
+    "top_8": ev.top_8_percent_exit_velocity,
+}}))
+"""
+
+
+def write_files(directory, swings, seed):
+    bat_path = write_bat_speed_csv(os.path.join(directory, f"bat_{swings}.csv"), swings, seed)
+    ev_path = write_exit_velocity_csv(os.path.join(directory, f"ev_{swings}.csv"), swings, seed)
+    return bat_path, ev_path
+
+
+def measure(bat_path, ev_path, streaming):
+    code = MEASURE.format(repo=REPO_ROOT, streaming=streaming, bat=bat_path, ev=ev_path)
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory vs streaming ingestion memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'swings':>10} {'in-memory MB':>13} {'streaming MB':>13} {'in-memory s':>12} {'streaming s':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for swings in args.sizes:
+            bat_path, ev_path = write_files(directory, swings, seed=0)
+            full = measure(bat_path, ev_path, streaming=False)
+            stream = measure(bat_path, ev_path, streaming=True)
+            if (full["top_10"], full["top_8"]) != (stream["top_10"], stream["top_8"]):
+                raise SystemExit(f"{swings} swings: streaming quantiles differ from the in-memory path")
+            print(f"{swings:>10} {full['peak_mb']:>13.1f} {stream['peak_mb']:>13.1f} "
+                  f"{full['seconds']:>12.2f} {stream['seconds']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
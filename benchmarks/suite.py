@@ -0,0 +1,206 @@
+"""
+Per-stage timings of the report pipeline over synthetic exports.
+
+For each size, writes (or reuses) a seeded Bat Speed and Exit Velocity export
+from synthetic.py. It then times every stage of the page separately:
+
+    parse            read_bat_speed_csv + read_exit_velocity_csv
+    metrics          compute_bat_speed_metrics + compute_exit_velocity_metrics
+    grading          attaching benchmarks and grades to the computed values
+    zone_aggregation compute_zone_stats (every per-zone metric in one pass)
+    heatmap_render   render_strike_zone_png with its memo cleared
+    email_body       build_email_body with the embedded heatmap
+
+Each stage is repeated until --repeats runs or --budget seconds are used
+(at least once). Results go to benchmarks/results/<commit>.json, so runs on
+different commits can be diffed with --compare. Usage:
+
+    python benchmarks/suite.py [--sizes 50 1000 100000 1000000] [--data-dir DIR]
+    python benchmarks/suite.py --compare benchmarks/results/<old commit>.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import heatmap  # noqa: E402
+from heatmap import render_strike_zone_png, strike_zone_html  # noqa: E402
+from metrics import (  # noqa: E402
+    build_bat_speed_metrics,
+    build_exit_velocity_metrics,
+    compute_bat_speed_metrics,
+    compute_exit_velocity_metrics,
+    compute_zone_stats,
+    read_bat_speed_csv,
+    read_exit_velocity_csv,
+)
+from report import build_email_body  # noqa: E402
+from synthetic import write_bat_speed_csv, write_exit_velocity_csv  # noqa: E402
+
+DEFAULT_SIZES = [50, 1_000, 100_000, 1_000_000]
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+LEVEL = "College"
+
+
+def git_commit():
+    """(short commit hash, whether the working tree has uncommitted changes)."""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    return commit, bool(git("status", "--porcelain", "--untracked-files=no"))
+
+
+def time_stage(fn, repeats, budget, setup=None):
+    """Run fn up to `repeats` times (stopping once `budget` seconds are used); returns samples."""
+    samples = []
+    while len(samples) < repeats and (not samples or sum(samples) < budget):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def dataset(data_dir, swings, seed):
+    bat_path = os.path.join(data_dir, f"bat_speed_{swings}_s{seed}.csv")
+    ev_path = os.path.join(data_dir, f"exit_velocity_{swings}_s{seed}.csv")
+    for path, write in ((bat_path, write_bat_speed_csv), (ev_path, write_exit_velocity_csv)):
+        if not os.path.exists(path):
+            # Rename into place so an interrupted run never leaves a partial file to reuse.
+            write(path + ".tmp", swings, seed)
+            os.replace(path + ".tmp", path)
+    return bat_path, ev_path
+
+
+def bench_size(bat_path, ev_path, repeats, budget):
+    """Time every stage for one pair of files; returns {stage: samples}."""
+    state = {}
+
+    def parse():
+        state["bat"] = read_bat_speed_csv(bat_path)
+        state["ev"] = read_exit_velocity_csv(ev_path)
+
+    def compute():
+        state["bat_result"] = compute_bat_speed_metrics(state["bat"], LEVEL)
+        state["ev_result"] = compute_exit_velocity_metrics(state["ev"], LEVEL)
+
+    def grade():
+        b, e = state["bat_result"], state["ev_result"]
+        build_bat_speed_metrics(
+            LEVEL, b.avg_bat_speed, b.top_10_percent_bat_speed, b.avg_attack_angle_top_10, b.avg_time_to_contact
+        )
+        build_exit_velocity_metrics(
+            LEVEL, e.avg_exit_velocity, e.top_8_percent_exit_velocity, e.avg_launch_angle_top_8,
+            e.total_avg_launch_angle, e.avg_distance_top_8,
+        )
+
+    def aggregate():
+        state["zones"] = compute_zone_stats(state["ev"])
+
+    def render():
+        state["png"] = render_strike_zone_png(state["zones"])
+
+    def email():
+        build_email_body(
+            "Synthetic Player", "2024-05-01 - 2024-05-31", LEVEL, LEVEL,
+            state["bat_result"], state["ev_result"], strike_zone_html(state["png"]),
+        )
+
+    # The heatmap template figure is built once per process; build it before timing.
+    heatmap.get_renderer()
+    stages = [
+        ("parse", parse, None),
+        ("metrics", compute, None),
+        ("grading", grade, None),
+        ("zone_aggregation", aggregate, None),
+        ("heatmap_render", render, heatmap._png_cache.clear),
+        ("email_body", email, None),
+    ]
+    return {name: time_stage(fn, repeats, budget, setup) for name, fn, setup in stages}
+
+
+def summarize(samples):
+    return {
+        "repeats": len(samples),
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+    }
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["swings"], r["stage"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline['commit']} (median, ratio > 1 is slower now)")
+    print(f"{'swings':>10} {'stage':<17} {'before ms':>11} {'now ms':>11} {'ratio':>7}")
+    for row in current["results"]:
+        old = before.get((row["swings"], row["stage"]))
+        if old is None:
+            continue
+        ratio = row["median_s"] / old["median_s"] if old["median_s"] else float("nan")
+        print(f"{row['swings']:>10} {row['stage']:<17} {old['median_s'] * 1000:>11.2f} "
+              f"{row['median_s'] * 1000:>11.2f} {ratio:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage report pipeline timings")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=10.0, help="seconds per stage before repeats stop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="keep generated exports here to reuse across runs")
+    parser.add_argument("--out", help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    run = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": {"numpy": np.__version__, "pandas": pd.__version__, "matplotlib": matplotlib.__version__},
+        "seed": args.seed,
+        "results": [],
+    }
+
+    print(f"{'swings':>10} {'stage':<17} {'median ms':>11} {'min ms':>11} {'runs':>5}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or tmp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for swings in args.sizes:
+            bat_path, ev_path = dataset(data_dir, swings, args.seed)
+            for stage, samples in bench_size(bat_path, ev_path, args.repeats, args.budget).items():
+                row = dict(swings=swings, stage=stage, **summarize(samples))
+                run["results"].append(row)
+                print(f"{swings:>10} {stage:<17} {row['median_s'] * 1000:>11.2f} "
+                      f"{row['min_s'] * 1000:>11.2f} {row['repeats']:>5}")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(run, f, indent=1)
+    print(f"\nwrote {out}")
+
+    if args.compare:
+        compare(run, args.compare)
+
+
+if __name__ == "__main__":
+    main()
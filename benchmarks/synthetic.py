@@ -0,0 +1,149 @@
+"""
+Synthetic Bat Speed (Blast-style) and Exit Velocity (HitTrax-style) exports.
+
+The files match the Blast Motion and HitTrax layouts in formats.py:
+- Bat Speed: 8 preamble lines, then a header. Bat speed, attack angle and
+  time to contact sit in columns H, K and P.
+- Exit Velocity: a header on the first line. Strike zone, EV, launch angle and
+  distance sit in columns F, H, I and J.
+
+Values are seeded and loosely realistic. Launch angle and distance follow EV.
+About 5% of EV rows are 0 (missed or untracked balls). Rows are written in
+blocks, so multi-million-swing files never have to fit in memory. Usage:
+
+    python benchmarks/synthetic.py bat_speed 1000000 bat.csv
+    python benchmarks/synthetic.py exit_velocity 50 ev.csv --seed 3
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formats import BLAST_MOTION, HITTRAX  # noqa: E402
+
+BAT_SPEED_COLUMNS = [
+    "Date", "Equipment", "Handedness", "Swing Details", "Plane Score",
+    "Connection Score", "Rotation Score", "Bat Speed (mph)", "Rotational Acceleration (g)",
+    "On Plane Efficiency (%)", "Attack Angle (deg)", "Early Connection (deg)",
+    "Connection at Impact (deg)", "Vertical Bat Angle (deg)", "Power (kW)",
+    "Time to Contact (sec)", "Peak Hand Speed (mph)",
+]
+
+EXIT_VELOCITY_COLUMNS = [
+    "#", "Date", "Time Stamp", "Pitch", "Pitch Type", "Strike Zone", "P. Hand",
+    "Velo", "LA", "Dist", "Res", "Type", "Horiz. Angle", "Pts",
+]
+
+# Lines above the Bat Speed header row.
+BAT_SPEED_PREAMBLE_LINES = 8
+
+# Keep the generated headers in step with the registered layouts: every
+# column the app reads must be present under one of its known names.
+for _layout, _header in ((BLAST_MOTION, BAT_SPEED_COLUMNS), (HITTRAX, EXIT_VELOCITY_COLUMNS)):
+    assert all(set(names) & set(_header) for names in _layout.columns.values()), _layout.name
+
+BLOCK_ROWS = 250_000
+_SESSION_START = pd.Timestamp("2024-05-01 10:00:00")
+_SWING_SECONDS = 45
+
+
+def _timestamps(first, rows):
+    offsets = pd.to_timedelta(np.arange(first, first + rows) * _SWING_SECONDS, unit="s")
+    return (_SESSION_START + offsets).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def bat_speed_frame(rows, rng, first=0, mean_bat_speed=65.0):
+    """One block of Blast-style rows; `first` is the block's swing offset."""
+    bat_speed = rng.normal(mean_bat_speed, 4, rows)
+    return pd.DataFrame({
+        "Date": _timestamps(first, rows),
+        "Equipment": "Bat",
+        "Handedness": "R",
+        "Swing Details": "Swing",
+        "Plane Score": rng.integers(20, 80, rows),
+        "Connection Score": rng.integers(20, 80, rows),
+        "Rotation Score": rng.integers(20, 80, rows),
+        "Bat Speed (mph)": bat_speed.round(1),
+        "Rotational Acceleration (g)": rng.normal(14, 3, rows).round(1),
+        "On Plane Efficiency (%)": rng.integers(50, 95, rows),
+        "Attack Angle (deg)": rng.normal(10, 4, rows).round(1),
+        "Early Connection (deg)": rng.normal(95, 8, rows).round(0),
+        "Connection at Impact (deg)": rng.normal(90, 6, rows).round(0),
+        "Vertical Bat Angle (deg)": rng.normal(-28, 6, rows).round(0),
+        "Power (kW)": (bat_speed * 0.045 + rng.normal(0, 0.2, rows)).round(2),
+        # Faster swings get to contact a little sooner.
+        "Time to Contact (sec)": (0.16 - (bat_speed - mean_bat_speed) * 0.001 + rng.normal(0, 0.008, rows)).round(3),
+        "Peak Hand Speed (mph)": (bat_speed * 0.33 + rng.normal(0, 1, rows)).round(1),
+    }, columns=BAT_SPEED_COLUMNS)
+
+
+def exit_velocity_frame(rows, rng, first=0, mean_exit_velocity=80.0):
+    """One block of HitTrax-style rows; `first` is the block's swing offset."""
+    exit_velocity = rng.normal(mean_exit_velocity, 8, rows)
+    launch_angle = rng.normal(12, 14, rows)
+    # Carry peaks near 25-30 degrees and grows with EV.
+    distance = np.clip(exit_velocity * 3.4 * np.cos(np.radians(launch_angle - 28)) - 40, 0, None)
+    missed = rng.random(rows) < 0.05
+    return pd.DataFrame({
+        "#": np.arange(first + 1, first + rows + 1),
+        "Date": _timestamps(first, rows),
+        "Time Stamp": 0,
+        "Pitch": rng.normal(55, 3, rows).round(1),
+        "Pitch Type": "BP",
+        "Strike Zone": rng.integers(1, 14, rows),
+        "P. Hand": "R",
+        "Velo": np.where(missed, 0, exit_velocity.round(1)),
+        "LA": np.where(missed, 0, launch_angle.round(1)),
+        "Dist": np.where(missed, 0, distance.round(0)),
+        "Res": "",
+        "Type": np.where(launch_angle < 10, "GB", np.where(launch_angle < 25, "LD", "FB")),
+        "Horiz. Angle": rng.normal(0, 20, rows).round(1),
+        "Pts": rng.integers(0, 200, rows),
+    }, columns=EXIT_VELOCITY_COLUMNS)
+
+
+def write_bat_speed_csv(path, swings, seed=0, block_rows=BLOCK_ROWS):
+    """Write a Bat Speed export with `swings` rows to path."""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="") as f:
+        f.write("Blast Motion Swing Export\n")
+        f.write("Player,Synthetic Player\n")
+        f.write("Team,OTR Baseball\n")
+        f.write(f"Swings,{swings}\n")
+        for i in range(4, BAT_SPEED_PREAMBLE_LINES):
+            f.write(f"Preamble line {i}\n")
+        for first in range(0, max(swings, 1), block_rows):
+            rows = min(block_rows, swings - first)
+            bat_speed_frame(rows, rng, first).to_csv(f, index=False, header=first == 0)
+    return path
+
+
+def write_exit_velocity_csv(path, swings, seed=0, block_rows=BLOCK_ROWS):
+    """Write an Exit Velocity export with `swings` rows to path."""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="") as f:
+        for first in range(0, max(swings, 1), block_rows):
+            rows = min(block_rows, swings - first)
+            exit_velocity_frame(rows, rng, first).to_csv(f, index=False, header=first == 0)
+    return path
+
+
+WRITERS = {"bat_speed": write_bat_speed_csv, "exit_velocity": write_exit_velocity_csv}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic export")
+    parser.add_argument("kind", choices=sorted(WRITERS))
+    parser.add_argument("swings", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    WRITERS[args.kind](args.path, args.swings, args.seed)
+
+
+if __name__ == "__main__":
+    main()
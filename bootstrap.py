@@ -0,0 +1,286 @@
+"""
+Bootstrap confidence intervals for the report metrics.
+
+Short sessions grade on a handful of swings, so a grade can flip from one
+session to the next on noise alone. For each report metric this module
+estimates a percentile bootstrap interval: the metric is recomputed on
+`resamples` samples of the session's swings drawn with replacement, and the
+interval is the central `confidence` share of those values.
+
+The resamples are one (resamples x swings) matrix of draw counts, so no
+resample is ever materialised or looped over in Python:
+
+- a mean is a matrix product of the counts with the swing values;
+- a quantile sorts the swings once, and each resample's order statistics
+  come from cumulative counts along that order; the means of the rows at or
+  above it are a matrix product of the counts masked to that tail.
+
+Quantiles use the same linear interpolation as pandas, so a resample of
+every swing once reproduces the report's value. The count matrix is built
+CHUNK_CELLS entries at a time, which bounds memory whatever the session
+size, and draws come from a fixed seed, so a report shows the same
+intervals every time it is generated.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import perf
+from metrics import (
+    ATTACK_ANGLE_COL,
+    BAT_SPEED,
+    BAT_SPEED_COL,
+    DISTANCE_COL,
+    EXIT_VELOCITY,
+    EXIT_VELOCITY_COL,
+    LAUNCH_ANGLE_COL,
+    REPORT_METRICS,
+    TIME_TO_CONTACT_COL,
+    grade_metric_array,
+    lerp,
+    quantile_position,
+)
+
+DEFAULT_RESAMPLES = 1000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SEED = 0
+
+# Entries of the count matrix per chunk. A chunk holds a handful of
+# float64 matrices of this size, about 8 MB each.
+CHUNK_CELLS = 1_000_000
+
+
+##################
+# RESULT OBJECT  #
+##################
+
+@dataclass(frozen=True)
+class ConfidenceInterval:
+    low: float
+    high: float
+    low_grade: str      # grade the metric would get at each bound; "" if ungraded
+    high_grade: str
+
+
+@dataclass(frozen=True)
+class ConfidenceIntervals:
+    confidence: float
+    resamples: int
+    swings: int
+    intervals: dict     # report metric -> ConfidenceInterval
+
+    def as_row(self):
+        """Flat {<metric>_ci_low: ..., <metric>_ci_high: ...} columns for a roster row."""
+        row = {}
+        for metric, interval in self.intervals.items():
+            row[f"{metric}_ci_low"] = interval.low
+            row[f"{metric}_ci_high"] = interval.high
+        return row
+
+
+#######################
+# RESAMPLED STATISTICS #
+#######################
+
+def _ratio(total, count):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def _resample_counts(rng, n, resamples):
+    """(resamples, n) float64 matrix: how often each swing is drawn in each resample."""
+    draws = rng.integers(0, n, size=(resamples, n))
+    draws += (np.arange(resamples) * n)[:, None]
+    return np.bincount(draws.ravel(), minlength=resamples * n).reshape(resamples, n).astype(np.float64)
+
+
+def _mean(counts, values):
+    """Per-resample mean of values, skipping NaNs."""
+    present = ~np.isnan(values)
+    if present.all():
+        return counts @ values / counts.shape[1]
+    weights = counts[:, present]
+    return _ratio(weights @ values[present], weights.sum(axis=1))
+
+
+def _quantile_tail(counts, primary, keep, q, secondaries):
+    """
+    Per resample: the quantile q of primary over the rows in keep, and the
+    mean of each secondary over those rows whose primary is at or above it.
+    Returns (quantiles, [means per secondary]).
+    """
+    rows = np.flatnonzero(keep)
+    resamples, n = counts.shape
+    if not len(rows):
+        empty = np.full(resamples, np.nan)
+        return empty, [empty] * len(secondaries)
+    order = rows[np.argsort(primary[rows], kind="stable")]
+    values = primary[order]
+    weights = counts[:, order]
+    cumulative = np.cumsum(weights, axis=1)
+    total = cumulative[:, -1].copy()
+
+    lower, upper, fraction = quantile_position(total, q)
+
+    # The value of 0-based rank r is the first one whose cumulative count
+    # exceeds r. Offsetting each row past the previous row's largest count
+    # makes the whole matrix one sorted array, so a single searchsorted
+    # finds the ranks of every resample.
+    offsets = np.arange(resamples) * (n + 1.0)
+    cumulative += offsets[:, None]
+    flat, base, last = cumulative.ravel(), np.arange(resamples) * len(values), len(values) - 1
+    low = values[np.minimum(np.searchsorted(flat, lower + offsets, side="right") - base, last)]
+    high = values[np.minimum(np.searchsorted(flat, upper + offsets, side="right") - base, last)]
+    quantile = np.where(total > 0, lerp(low, high, fraction), np.nan)
+
+    # Rows at or above the quantile are a suffix of the sorted order; only
+    # the columns from the earliest suffix start on are needed.
+    start = np.searchsorted(values, quantile, side="left")
+    first = start.min()
+    tail = np.where(np.arange(first, len(values)) >= start[:, None], weights[:, first:], 0.0)
+    means = []
+    for secondary in secondaries:
+        secondary = secondary[order[first:]]
+        present = ~np.isnan(secondary)
+        means.append(_ratio(tail @ np.where(present, secondary, 0.0), tail @ present.astype(np.float64)))
+    return quantile, means
+
+
+def bootstrap(n, statistics, resamples=DEFAULT_RESAMPLES, seed=DEFAULT_SEED):
+    """
+    Apply statistics(counts) to chunks of a (resamples, n) count matrix.
+    statistics returns {name: one value per row of counts}; the result is
+    {name: array of resamples values}.
+    """
+    rng = np.random.default_rng(seed)
+    chunk = max(1, CHUNK_CELLS // max(n, 1))
+    parts = {}
+    for start in range(0, resamples, chunk):
+        counts = _resample_counts(rng, n, min(chunk, resamples - start))
+        for name, values in statistics(counts).items():
+            parts.setdefault(name, []).append(values)
+    return {name: np.concatenate(values) for name, values in parts.items()}
+
+
+def _intervals(samples, confidence, resamples, n, grade):
+    """ConfidenceIntervals from bootstrap samples; grade(metric, [low, high]) -> two grades or None."""
+    tail = (1 - confidence) / 2
+    intervals = {}
+    for metric, values in samples.items():
+        values = values[~np.isnan(values)]
+        low, high = np.quantile(values, [tail, 1 - tail]) if values.size else (np.nan, np.nan)
+        grades = grade(metric, np.array([low, high]))
+        intervals[metric] = ConfidenceInterval(
+            float(low), float(high), *(grades if grades is not None else ("", ""))
+        )
+    return ConfidenceIntervals(confidence, resamples, n, intervals)
+
+
+def _benchmark_grader(level, benchmark_names):
+    def grade(metric, bounds):
+        name = benchmark_names[metric]
+        return None if name is None else grade_metric_array(bounds, level, name).tolist()
+    return grade
+
+
+######################
+# REPORT INTERVALS   #
+######################
+
+def bat_speed_intervals_from_arrays(bat_speed, attack_angle, time_to_contact, level,
+                                    resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED):
+    """Intervals for every BatSpeedMetrics value, from per-swing arrays (NaN for missing values)."""
+    bat_speed = np.asarray(bat_speed, dtype=np.float64)
+    attack_angle = np.asarray(attack_angle, dtype=np.float64)
+    time_to_contact = np.asarray(time_to_contact, dtype=np.float64)
+
+    def statistics(counts):
+        top, (attack_angle_top,) = _quantile_tail(counts, bat_speed, ~np.isnan(bat_speed), 0.90, [attack_angle])
+        return {
+            "avg_bat_speed": _mean(counts, bat_speed),
+            "top_10_percent_bat_speed": top,
+            "avg_attack_angle_top_10": attack_angle_top,
+            "avg_time_to_contact": _mean(counts, time_to_contact),
+        }
+
+    with perf.stage("bootstrap.bat_speed", rows=len(bat_speed)):
+        samples = bootstrap(len(bat_speed), statistics, resamples, seed)
+        return _intervals(samples, confidence, resamples, len(bat_speed), _benchmark_grader(level, REPORT_METRICS[BAT_SPEED]))
+
+
+def exit_velocity_intervals_from_arrays(exit_velocity, launch_angle, distance, level,
+                                        resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE,
+                                        seed=DEFAULT_SEED):
+    """Intervals for every ExitVelocityMetrics value, from per-swing arrays (NaN for missing values)."""
+    exit_velocity = np.asarray(exit_velocity, dtype=np.float64)
+    launch_angle = np.asarray(launch_angle, dtype=np.float64)
+    distance = np.asarray(distance, dtype=np.float64)
+    non_zero = exit_velocity > 0
+    non_zero_exit_velocity = np.where(non_zero, exit_velocity, np.nan)
+    positive_launch_angle = np.where(launch_angle > 0, launch_angle, np.nan)
+
+    def statistics(counts):
+        top, (launch_angle_top, distance_top) = _quantile_tail(
+            counts, exit_velocity, non_zero, 0.92, [launch_angle, distance]
+        )
+        return {
+            "avg_exit_velocity": _mean(counts, non_zero_exit_velocity),
+            "top_8_percent_exit_velocity": top,
+            "avg_launch_angle_top_8": launch_angle_top,
+            "total_avg_launch_angle": _mean(counts, positive_launch_angle),
+            "avg_distance_top_8": distance_top,
+        }
+
+    with perf.stage("bootstrap.exit_velocity", rows=len(exit_velocity)):
+        samples = bootstrap(len(exit_velocity), statistics, resamples, seed)
+        return _intervals(
+            samples, confidence, resamples, len(exit_velocity), _benchmark_grader(level, REPORT_METRICS[EXIT_VELOCITY])
+        )
+
+
+def compute_bat_speed_intervals(df, level, **kwargs):
+    """Intervals for the bat speed metrics of a parsed Bat Speed export."""
+    return bat_speed_intervals_from_arrays(
+        pd.to_numeric(df[BAT_SPEED_COL], errors='coerce'),
+        pd.to_numeric(df[ATTACK_ANGLE_COL], errors='coerce'),
+        pd.to_numeric(df[TIME_TO_CONTACT_COL], errors='coerce'),
+        level, **kwargs,
+    )
+
+
+def compute_exit_velocity_intervals(df, level, **kwargs):
+    """Intervals for the exit velocity metrics of a parsed Exit Velocity export."""
+    return exit_velocity_intervals_from_arrays(
+        pd.to_numeric(df[EXIT_VELOCITY_COL], errors='coerce'),
+        pd.to_numeric(df[LAUNCH_ANGLE_COL], errors='coerce'),
+        pd.to_numeric(df[DISTANCE_COL], errors='coerce'),
+        level, **kwargs,
+    )
+
+
+def compute_combined_intervals(df_bat_speed, df_exit_velocity, level, on="timestamp", tolerance=None,
+                               clock_offset=0.0, resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE,
+                               seed=DEFAULT_SEED):
+    """
+    Intervals for the CombinedMetrics values of two parsed exports, over
+    their matched swings (see combined.py). Returns None when no swing
+    matches. The top bat-speed threshold stays that of the whole export.
+    Like the combined metrics themselves, the bounds are not graded.
+    """
+    from combined import DEFAULT_TOLERANCE, join_swings, swing_values
+
+    joined = join_swings(
+        df_bat_speed, df_exit_velocity, on, DEFAULT_TOLERANCE if tolerance is None else tolerance, clock_offset
+    )
+    if joined.empty:
+        return None
+    top_10_bat_speed = pd.to_numeric(df_bat_speed[BAT_SPEED_COL], errors='coerce').quantile(0.90)
+    values = swing_values(joined, top_10_bat_speed)
+
+    def statistics(counts):
+        return {metric: _mean(counts, swing) for metric, swing in values.items()}
+
+    with perf.stage("bootstrap.combined", rows=len(joined)):
+        samples = bootstrap(len(joined), statistics, resamples, seed)
+        return _intervals(samples, confidence, resamples, len(joined), lambda metric, bounds: None)
@@ -0,0 +1,91 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+#####################################
+# BOUNDED LRU CACHES FOR RERUN WORK #
+#####################################
+
+# Streamlit re-executes otrstrike.py on every widget interaction, but imported
+# modules stay loaded, so caches living here survive reruns and are shared by
+# every session on the server.
+
+
+class LRUCache:
+    """
+    Small thread-safe least-recently-used cache with an entry cap.
+    When the cap is reached the entry that was used longest ago is evicted.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for key, calling compute() and storing its
+        result on a miss. compute runs outside the lock so slow work in one
+        session does not stall lookups from another.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+def file_digest(uploaded_file):
+    """
+    SHA-256 of an uploaded file's bytes. Works for Streamlit UploadedFile
+    objects and any other file-like object, and leaves the read position at 0.
+    """
+    if hasattr(uploaded_file, "getvalue"):
+        data = uploaded_file.getvalue()
+    else:
+        uploaded_file.seek(0)
+        data = uploaded_file.read()
+        uploaded_file.seek(0)
+    return hashlib.sha256(data).hexdigest()
+
+
+# Parsed DataFrames are the largest objects, so keep fewer of them.
+frame_cache = LRUCache(max_entries=16)
+# Metric results, zone stats and intervals, keyed by (kind, content digest(s), level, ...).
+metrics_cache = LRUCache(max_entries=128)
+# Raw heatmap PNG bytes, keyed by (content digest, zone map metric).
+heatmap_cache = LRUCache(max_entries=64)
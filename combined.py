@@ -0,0 +1,220 @@
+"""
+Swing-level join of Bat Speed and Exit Velocity exports.
+
+The bat sensor and the ball tracker export separate files, so on their own
+the report cannot say what EV a player produces on their fastest swings, or
+how well bat speed turns into EV. This module matches each bat swing to the
+ball it produced and computes the metrics that need both.
+
+Swings are matched one-to-one with `pd.merge_asof`, in O(n log n):
+
+- on="timestamp": each bat swing goes to the Exit Velocity row nearest in
+  time, within `tolerance` seconds. `clock_offset` seconds are first
+  subtracted from the EV clock, for devices whose clocks disagree;
+- on="sequence": the n-th bat swing goes to the n-th EV row, ordered by the
+  EV "#" column, for exports without usable timestamps.
+
+When several bat swings land on the same EV row, only the closest one keeps it.
+
+The combined metrics are reported without grades. The level benchmarks in
+metrics.py are all single-device numbers, and none of them describes a
+smash factor, the EV of a player's fastest swings or a squared-up rate.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import perf
+from metrics import (
+    ATTACK_ANGLE_COL,
+    BAT_SPEED_COL,
+    BAT_SPEED_DATE_COL,
+    DISTANCE_COL,
+    EXIT_VELOCITY_COL,
+    EXIT_VELOCITY_DATE_COL,
+    LAUNCH_ANGLE_COL,
+    PITCH_SPEED_COL,
+    SEQUENCE_COL,
+    STRIKE_ZONE_COL,
+    TIME_TO_CONTACT_COL,
+    _check_exit_velocity_columns,
+)
+
+JOIN_KEYS = ["timestamp", "sequence"]
+DEFAULT_TOLERANCE = 3.0     # seconds between a swing and its batted ball
+
+# Batted-ball physics (A. M. Nathan's collision model): the best possible EV
+# for a swing is q * pitch speed + (1 + q) * bat speed, where the collision
+# efficiency q is about 0.2 for a well-struck wood or BBCOR ball, his estimate
+# from measured MLB batted balls. A ball is "squared up" when its EV reaches
+# 80% of that maximum, the threshold of MLB Statcast's squared-up rate.
+COLLISION_EFFICIENCY = 0.2
+SQUARED_UP_SHARE = 0.8
+
+# Columns of the frame join_swings() returns.
+JOINED_COLUMNS = [
+    "bat_row", "exit_velocity_row", "gap_seconds",
+    "bat_speed", "attack_angle", "time_to_contact",
+    "exit_velocity", "launch_angle", "distance", "strike_zone", "pitch_speed",
+]
+
+
+def _numeric(df, col):
+    return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _times(df, col):
+    return pd.to_datetime(df[col], errors='coerce').to_numpy(dtype="datetime64[ns]")
+
+
+def _nearest_unique(left_keys, right_keys, tolerance):
+    """
+    Pair positions of left_keys with the nearest right_keys within
+    tolerance, each right position used at most once. Returns (left
+    positions, right positions, absolute gaps).
+    """
+    left = pd.DataFrame({"key": left_keys, "left": np.arange(len(left_keys))})
+    right = pd.DataFrame({"key": right_keys, "right": np.arange(len(right_keys))})
+    # merge_asof needs sorted keys without missing values.
+    left = left[left["key"].notna()].sort_values("key", kind="stable")
+    right = right[right["key"].notna()].sort_values("key", kind="stable")
+    right["right_key"] = right["key"]
+
+    matched = pd.merge_asof(left, right, on="key", direction="nearest", tolerance=tolerance)
+    matched = matched[matched["right"].notna()]
+    gap = (matched["right_key"] - matched["key"]).abs()
+    if isinstance(tolerance, pd.Timedelta):
+        gap = gap.dt.total_seconds()
+    matched = matched.assign(gap=gap.to_numpy(dtype=np.float64))
+
+    # Closest claimant wins; ties go to the earlier swing.
+    matched = matched.sort_values(["gap", "left"], kind="stable").drop_duplicates("right")
+    matched = matched.sort_values("left", kind="stable")
+    return (
+        matched["left"].to_numpy(dtype=np.int64),
+        matched["right"].to_numpy(dtype=np.int64),
+        matched["gap"].to_numpy(dtype=np.float64),
+    )
+
+
+def join_swings(df_bat_speed, df_exit_velocity, on="timestamp", tolerance=DEFAULT_TOLERANCE, clock_offset=0.0):
+    """
+    Match the swings of a parsed Bat Speed export to the batted balls of a
+    parsed Exit Velocity export (see the module docstring for `on`). Returns
+    one row per matched swing with the JOINED_COLUMNS, in bat swing order;
+    bat_row and exit_velocity_row are positions in the input frames. Only the
+    needed columns are read, so neither export is copied.
+    """
+    if on not in JOIN_KEYS:
+        raise ValueError(f"on must be one of {JOIN_KEYS}, not {on!r}")
+    _check_exit_velocity_columns(df_exit_velocity)
+
+    with perf.stage("join.swings", rows=len(df_bat_speed) + len(df_exit_velocity)):
+        if on == "timestamp":
+            bat_keys = _times(df_bat_speed, BAT_SPEED_DATE_COL)
+            offset = np.timedelta64(int(round(clock_offset * 1e9)), "ns")
+            ev_keys = _times(df_exit_velocity, EXIT_VELOCITY_DATE_COL) - offset
+            tolerance = pd.Timedelta(seconds=tolerance)
+        else:
+            bat_keys = np.arange(len(df_bat_speed), dtype=np.float64)
+            # The n-th row by "#" order; rows without a sequence number are skipped.
+            sequence = _numeric(df_exit_velocity, SEQUENCE_COL)
+            ev_keys = np.full(len(sequence), np.nan)
+            valid = ~np.isnan(sequence)
+            ev_keys[np.flatnonzero(valid)[np.argsort(sequence[valid], kind="stable")]] = np.arange(valid.sum())
+            tolerance = 0.0
+
+        bat_rows, ev_rows, gaps = _nearest_unique(bat_keys, ev_keys, tolerance)
+
+        joined = pd.DataFrame({
+            "bat_row": bat_rows,
+            "exit_velocity_row": ev_rows,
+            "gap_seconds": gaps if on == "timestamp" else np.nan,
+            "bat_speed": _numeric(df_bat_speed, BAT_SPEED_COL)[bat_rows],
+            "attack_angle": _numeric(df_bat_speed, ATTACK_ANGLE_COL)[bat_rows],
+            "time_to_contact": _numeric(df_bat_speed, TIME_TO_CONTACT_COL)[bat_rows],
+            "exit_velocity": _numeric(df_exit_velocity, EXIT_VELOCITY_COL)[ev_rows],
+            "launch_angle": _numeric(df_exit_velocity, LAUNCH_ANGLE_COL)[ev_rows],
+            "distance": _numeric(df_exit_velocity, DISTANCE_COL)[ev_rows],
+            "strike_zone": _numeric(df_exit_velocity, STRIKE_ZONE_COL)[ev_rows],
+            "pitch_speed": _numeric(df_exit_velocity, PITCH_SPEED_COL)[ev_rows],
+        }, columns=JOINED_COLUMNS)
+    return joined
+
+
+##################
+# RESULT OBJECT  #
+##################
+
+@dataclass(frozen=True)
+class CombinedMetrics:
+    level: str
+    bat_swings: int
+    matched_swings: int
+    match_rate: float
+    avg_smash_factor: float
+    avg_exit_velocity_top_10_bat_speed: float
+    squared_up_rate: float
+
+
+def swing_values(joined, top_10_bat_speed):
+    """
+    Per-swing values of a join_swings() frame whose means are the combined
+    metrics: {"avg_smash_factor": EV / bat speed, "avg_exit_velocity_top_10_bat_speed":
+    EV, "squared_up_rate": 1.0 or 0.0}. Swings a metric does not count are
+    NaN; only batted balls (EV > 0) count, and only top bat-speed swings for
+    the second one.
+    """
+    bat_speed = joined["bat_speed"].to_numpy()
+    exit_velocity = joined["exit_velocity"].to_numpy()
+    pitch_speed = np.nan_to_num(joined["pitch_speed"].to_numpy())
+    batted = (exit_velocity > 0) & (bat_speed > 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        smash = exit_velocity / bat_speed
+        max_exit_velocity = COLLISION_EFFICIENCY * pitch_speed + (1 + COLLISION_EFFICIENCY) * bat_speed
+        squared_up = (exit_velocity >= SQUARED_UP_SHARE * max_exit_velocity).astype(np.float64)
+    return {
+        "avg_smash_factor": np.where(batted, smash, np.nan),
+        "avg_exit_velocity_top_10_bat_speed": np.where(batted & (bat_speed >= top_10_bat_speed), exit_velocity, np.nan),
+        "squared_up_rate": np.where(batted, squared_up, np.nan),
+    }
+
+
+def _nan_mean(values):
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if values.size else np.nan
+
+
+def combined_metrics_from_joined(joined, level, bat_swings, top_10_bat_speed):
+    """
+    Combined metrics of a join_swings() frame, for a report at a Bat Speed
+    level (ungraded; see the module docstring). bat_swings is the size of the whole Bat Speed export and top_10_bat_speed
+    its 90th percentile bat speed, so "top bat-speed swings" means the same
+    swings as the Bat Speed report. Only batted balls (EV > 0) count.
+    """
+    values = swing_values(joined, top_10_bat_speed)
+    return CombinedMetrics(
+        level=level,
+        bat_swings=int(bat_swings),
+        matched_swings=len(joined),
+        match_rate=len(joined) / bat_swings if bat_swings else np.nan,
+        avg_smash_factor=_nan_mean(values["avg_smash_factor"]),
+        avg_exit_velocity_top_10_bat_speed=_nan_mean(values["avg_exit_velocity_top_10_bat_speed"]),
+        squared_up_rate=_nan_mean(values["squared_up_rate"]),
+    )
+
+
+def compute_combined_metrics(df_bat_speed, df_exit_velocity, level, on="timestamp",
+                             tolerance=DEFAULT_TOLERANCE, clock_offset=0.0):
+    """
+    Join two parsed exports and compute their CombinedMetrics for a report
+    at a Bat Speed level. Returns None when no swing could be matched to a batted ball.
+    """
+    joined = join_swings(df_bat_speed, df_exit_velocity, on, tolerance, clock_offset)
+    if joined.empty:
+        return None
+    with perf.stage("metrics.combined", rows=len(joined)):
+        bat_speed = pd.Series(_numeric(df_bat_speed, BAT_SPEED_COL))
+        return combined_metrics_from_joined(joined, level, len(df_bat_speed), bat_speed.quantile(0.90))
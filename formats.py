@@ -0,0 +1,260 @@
+"""
+Export format registry.
+
+Device exports are recognised by their header row, not by column position.
+Each known format is a Layout: for every field the app reads (a "column" of
+the parsed frame), the header name(s) the device writes for it. Reading an
+export takes two steps:
+
+- sniff_layout() reads only the first SNIFF_BYTES of the file and looks for
+  the first line that holds every required header of a registered layout.
+  That also finds the header whatever the length of the preamble above it.
+  A file that matches no layout is rejected here, before the rest of it is
+  read. Resolutions are cached by header line, so files from the same device
+  resolve without re-parsing it.
+- read_layout() parses just those columns, with fixed float64 dtypes, using
+  the pyarrow CSV engine when pyarrow is installed.
+
+The parsed frame has one column per field, named as below, whatever the
+device calls it. Optional fields a layout lacks are all-NaN columns. To
+support a new device or export version, register_layout() a Layout for it.
+"""
+import csv
+import importlib.util
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+
+BAT_SPEED = "bat_speed"
+EXIT_VELOCITY = "exit_velocity"
+
+KIND_LABELS = {BAT_SPEED: "Bat Speed", EXIT_VELOCITY: "Exit Velocity"}
+
+# Columns of a parsed Bat Speed export
+BAT_SPEED_DATE_COL = "date"
+BAT_SPEED_COL = "bat_speed"
+ATTACK_ANGLE_COL = "attack_angle"
+TIME_TO_CONTACT_COL = "time_to_contact"
+
+# Columns of a parsed Exit Velocity export
+SEQUENCE_COL = "sequence"
+EXIT_VELOCITY_DATE_COL = "date"
+PITCH_SPEED_COL = "pitch_speed"
+STRIKE_ZONE_COL = "strike_zone"
+EXIT_VELOCITY_COL = "exit_velocity"
+LAUNCH_ANGLE_COL = "launch_angle"
+DISTANCE_COL = "distance"
+
+# Parsed frame columns per kind, in order. Dates are left to the parser.
+FRAME_COLUMNS = {
+    BAT_SPEED: [BAT_SPEED_DATE_COL, BAT_SPEED_COL, ATTACK_ANGLE_COL, TIME_TO_CONTACT_COL],
+    EXIT_VELOCITY: [
+        SEQUENCE_COL, EXIT_VELOCITY_DATE_COL, PITCH_SPEED_COL, STRIKE_ZONE_COL,
+        EXIT_VELOCITY_COL, LAUNCH_ANGLE_COL, DISTANCE_COL,
+    ],
+}
+_TEXT_COLUMNS = {"date"}
+
+# Enough for any known preamble plus the header row.
+SNIFF_BYTES = 16 * 1024
+
+# pandas' pyarrow engine parses several times faster than its C engine.
+# OTR_CSV_ENGINE=c forces the C engine.
+PARSE_ENGINE = os.environ.get("OTR_CSV_ENGINE") or ("pyarrow" if importlib.util.find_spec("pyarrow") else "c")
+
+
+class UnknownLayoutError(ValueError):
+    """Raised when a file's header matches no registered layout."""
+
+
+##############
+# REGISTRY   #
+##############
+
+@dataclass(frozen=True)
+class Layout:
+    """
+    One device export format. columns maps each frame column to the header
+    names the device may write for it; the ones in optional may be missing.
+    """
+    name: str
+    kind: str
+    columns: dict
+    optional: frozenset = frozenset()
+
+    @property
+    def required(self):
+        return [column for column in self.columns if column not in self.optional]
+
+
+@dataclass(frozen=True)
+class ResolvedLayout:
+    """Where a layout's columns sit in one file."""
+    layout: Layout
+    header_line: int    # lines before the header row
+    header_offset: int  # bytes (characters for text sources) before the header row
+    names: dict         # frame column -> header name in the file, for the columns present
+    positions: dict     # frame column -> column position in the file
+
+    @property
+    def kind(self):
+        return self.layout.kind
+
+
+# Blast Motion swing export: a short preamble, then the header.
+BLAST_MOTION = Layout(
+    name="Blast Motion",
+    kind=BAT_SPEED,
+    columns={
+        BAT_SPEED_DATE_COL: ("Date",),
+        BAT_SPEED_COL: ("Bat Speed (mph)",),
+        ATTACK_ANGLE_COL: ("Attack Angle (deg)",),
+        TIME_TO_CONTACT_COL: ("Time to Contact (sec)",),
+    },
+    optional=frozenset({BAT_SPEED_DATE_COL}),
+)
+
+# HitTrax session export: the header is the first line.
+HITTRAX = Layout(
+    name="HitTrax",
+    kind=EXIT_VELOCITY,
+    columns={
+        SEQUENCE_COL: ("#",),
+        EXIT_VELOCITY_DATE_COL: ("Date",),
+        PITCH_SPEED_COL: ("Pitch",),
+        STRIKE_ZONE_COL: ("Strike Zone",),
+        EXIT_VELOCITY_COL: ("Velo",),
+        LAUNCH_ANGLE_COL: ("LA",),
+        DISTANCE_COL: ("Dist",),
+    },
+    optional=frozenset({SEQUENCE_COL, EXIT_VELOCITY_DATE_COL, PITCH_SPEED_COL}),
+)
+
+LAYOUTS = [BLAST_MOTION, HITTRAX]
+
+# (kind, header line) -> (layout, names, positions), or False for no match.
+_header_cache = LRUCache(max_entries=256)
+
+
+def register_layout(layout):
+    """Add a layout; it is tried after the ones registered before it."""
+    LAYOUTS.append(layout)
+    _header_cache.clear()
+
+
+def _normalize(name):
+    return " ".join(name.split()).casefold()
+
+
+def _match_header(kind, line):
+    """Resolve one candidate header line against the registry (cached)."""
+    key = (kind, line)
+    match = _header_cache.get(key)
+    if match is None:
+        match = False
+        fields = next(csv.reader([line]), [])
+        normalized = [_normalize(field) for field in fields]
+        for layout in LAYOUTS:
+            if kind is not None and layout.kind != kind:
+                continue
+            positions = {}
+            for column, aliases in layout.columns.items():
+                wanted = {_normalize(alias) for alias in aliases}
+                position = next((i for i, field in enumerate(normalized) if field in wanted), None)
+                if position is not None:
+                    positions[column] = position
+            if all(column in positions for column in layout.required):
+                names = {column: fields[position] for column, position in positions.items()}
+                match = (layout, names, positions)
+                break
+        _header_cache.put(key, match)
+    return match
+
+
+###########
+# SNIFF   #
+###########
+
+def _read_head(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read(SNIFF_BYTES)
+    source.seek(0)
+    head = source.read(SNIFF_BYTES)
+    source.seek(0)
+    return head
+
+
+def _unknown_layout(kind):
+    layouts = [layout for layout in LAYOUTS if kind is None or layout.kind == kind]
+    expected = "; ".join(
+        f"{layout.name}: " + ", ".join(layout.columns[column][0] for column in layout.required)
+        for layout in layouts
+    )
+    label = KIND_LABELS.get(kind, "a known export")
+    return UnknownLayoutError(
+        f"The uploaded file does not have the required columns for {label} "
+        f"(no header row with {expected})."
+    )
+
+
+def sniff_layout(source, kind=None):
+    """
+    Find the header row and layout of an export (path or seekable
+    file-like) from its first SNIFF_BYTES, trying only layouts of kind when
+    given. Returns a ResolvedLayout; raises UnknownLayoutError.
+    """
+    head = _read_head(source)
+    lines = head.splitlines(keepends=True)
+    if len(head) == SNIFF_BYTES and len(lines) > 1:
+        lines.pop()  # may be cut short
+    offset = 0
+    for i, raw in enumerate(lines):
+        text = raw.decode("utf-8-sig" if i == 0 else "utf-8", errors="replace") if isinstance(raw, bytes) else raw
+        match = _match_header(kind, text.rstrip("\r\n").lstrip("\ufeff"))
+        if match:
+            layout, names, positions = match
+            return ResolvedLayout(layout, i, offset, names, positions)
+        offset += len(raw)
+    raise _unknown_layout(kind)
+
+
+###########
+# PARSE   #
+###########
+
+def _read_csv(source, resolved, dtype, engine):
+    usecols = list(resolved.names.values())
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            f.seek(resolved.header_offset)
+            return pd.read_csv(f, usecols=usecols, dtype=dtype, engine=engine)
+    source.seek(resolved.header_offset)
+    return pd.read_csv(source, usecols=usecols, dtype=dtype, engine=engine)
+
+
+def read_layout(source, resolved, engine=None):
+    """
+    Parse the columns of resolved (from sniff_layout) out of source into a
+    frame with the kind's FRAME_COLUMNS. Numeric columns are float64; text
+    cells in them become NaN.
+    """
+    engine = engine or PARSE_ENGINE
+    numeric = [name for column, name in resolved.names.items() if column not in _TEXT_COLUMNS]
+    try:
+        df = _read_csv(source, resolved, {name: np.float64 for name in numeric}, engine)
+    except ValueError:
+        # A text cell in a numeric column: parse as found and coerce, the slow way.
+        df = _read_csv(source, resolved, None, engine)
+        for name in numeric:
+            df[name] = pd.to_numeric(df[name], errors='coerce').astype(np.float64)
+
+    df = df.rename(columns={name: column for column, name in resolved.names.items()})
+    for column in FRAME_COLUMNS[resolved.kind]:
+        if column not in df.columns:
+            df[column] = np.nan
+    return df[FRAME_COLUMNS[resolved.kind]]
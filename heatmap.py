@@ -0,0 +1,155 @@
+"""
+Strike zone heatmap rendering.
+
+Turns one per-zone metric (average exit velocity by default, or any column
+of metrics.compute_zone_stats) into a PNG laid out like the HitTrax strike
+zone (zones 1-9 in the middle, 10-13 in the corners).
+"""
+import base64
+import threading
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+import perf
+from cache import LRUCache
+
+zone_layout = [
+    [10, None, 11],
+    [1,   2,    3],
+    [4,   5,    6],
+    [7,   8,    9],
+    [12, None, 13]
+]
+
+# Our custom colormap: darkblue -> grey -> red
+cmap = LinearSegmentedColormap.from_list('strikezones', ['darkblue', 'grey', 'red'])
+
+# Title and cell label format for each zone map (see metrics.ZONE_METRICS).
+ZONE_MAP_STYLES = {
+    "avg_exit_velocity": ("Strike Zone Average Exit Velocity", "{:.1f} mph"),
+    "avg_launch_angle": ("Strike Zone Average Launch Angle", "{:.1f}°"),
+    "avg_distance": ("Strike Zone Average Distance", "{:.0f} ft"),
+    "swings": ("Strike Zone Swings", "{:.0f}"),
+    "hard_hit_rate": ("Strike Zone Hard-Hit Rate", "{:.0%}"),
+}
+
+
+class StrikeZoneRenderer:
+    """
+    Reusable heatmap figure. The 15 cells, zone numbers and value labels are
+    built once; each render only recolors the cells and rewrites the labels.
+    The figure is drawn through its own Agg canvas rather than pyplot, and a
+    lock serializes renders because Streamlit sessions run in threads.
+    """
+
+    cell_width = 1.0
+    cell_height = 1.0
+
+    def __init__(self):
+        self.fig = Figure(figsize=(3,5))
+        FigureCanvasAgg(self.fig)
+        ax = self.fig.add_subplot()
+        ax.axis('off')
+
+        self.zone_cells = {}
+        self.value_labels = {}
+        for r, row_zones in enumerate(zone_layout):
+            for c, z in enumerate(row_zones):
+                x = c * self.cell_width
+                y = (len(zone_layout)-1 - r) * self.cell_height
+                rect = Rectangle((x, y), self.cell_width, self.cell_height, facecolor='white', edgecolor='black')
+                ax.add_patch(rect)
+                if z is None:
+                    # Blank cell
+                    continue
+                self.zone_cells[z] = rect
+                # Zone number
+                ax.text(x+0.5*self.cell_width, y+0.7*self.cell_height, str(z),
+                        ha='center', va='center', fontsize=10, color='black')
+                # Average EV text, filled in per render
+                self.value_labels[z] = ax.text(x+0.5*self.cell_width, y+0.3*self.cell_height, "",
+                                               ha='center', va='center', fontsize=8, color='black')
+
+        ax.set_xlim(0, 3*self.cell_width)
+        ax.set_ylim(0, 5*self.cell_height)
+
+        # Everything sits inside the axes, so the tight bounding box never
+        # changes; computing it once saves savefig an extra draw per render.
+        self.bbox = self.fig.get_tightbbox(self.fig.canvas.get_renderer()).padded(0.1)
+        self._lock = threading.Lock()
+
+    def render(self, zone_values, min_ev, max_ev, label_format="{:.1f} mph"):
+        """
+        zone_values maps zone number -> value (NaN or missing for no data);
+        min_ev and max_ev span the colormap. Returns the PNG bytes.
+        """
+        with self._lock:
+            for z, rect in self.zone_cells.items():
+                mean_ev = zone_values.get(z, np.nan)
+                if np.isnan(mean_ev):
+                    rect.set_facecolor('white')  # no data
+                    self.value_labels[z].set_text("")
+                else:
+                    norm_val = (mean_ev - min_ev) / (max_ev - min_ev) if (max_ev > min_ev) else 0
+                    rect.set_facecolor(cmap(norm_val))
+                    self.value_labels[z].set_text(label_format.format(mean_ev))
+
+            buf = BytesIO()
+            with perf.stage("heatmap.savefig"):
+                self.fig.savefig(buf, format='png', bbox_inches=self.bbox)
+        return buf.getvalue()
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+# Identical per-zone averages always give the same picture.
+_png_cache = LRUCache(max_entries=256)
+
+
+def get_renderer():
+    """The shared StrikeZoneRenderer, built on first use."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = StrikeZoneRenderer()
+        return _renderer
+
+
+def render_strike_zone_png(zone_avg_df, metric="avg_exit_velocity"):
+    """
+    Render the heatmap and return the PNG bytes. zone_avg_df is either a
+    Series of mean EV indexed by zone number, or the per-zone DataFrame from
+    metrics.compute_zone_stats, of which the `metric` column is drawn (zones
+    without swings are left blank). Results are memoized by the zone values.
+    """
+    if isinstance(zone_avg_df, pd.DataFrame):
+        zone_avg_df = zone_avg_df[metric].where(zone_avg_df["swings"] > 0).dropna()
+    label_format = ZONE_MAP_STYLES[metric][1]
+
+    if not zone_avg_df.empty:
+        min_ev = float(zone_avg_df.min())
+        max_ev = float(zone_avg_df.max())
+    else:
+        min_ev, max_ev = 0, 1
+
+    zone_values = {z: float(zone_avg_df.get(z, np.nan)) for z in range(1, 14)}
+    # NaN never compares equal to itself, so use None for empty zones in the key.
+    key = tuple(None if np.isnan(v) else v for v in zone_values.values()) + (min_ev, max_ev, label_format)
+    return _png_cache.get_or_compute(
+        key, lambda: get_renderer().render(zone_values, min_ev, max_ev, label_format)
+    )
+
+
+def strike_zone_html(png_bytes, metric="avg_exit_velocity"):
+    """HTML snippet (PNG embedded as base64) shared by the page and the email."""
+    img_data = base64.b64encode(png_bytes).decode('utf-8')
+    return (
+        f"<h3 style='color: black;'>{ZONE_MAP_STYLES[metric][0]}</h3>"
+        f"<img src='data:image/png;base64,{img_data}'/>"
+    )
@@ -0,0 +1,292 @@
+"""
+Streaming, column-pruned ingestion for very large exports.
+
+The in-memory path in metrics.py parses a whole file at once. For
+multi-season exports this module reads the columns the report uses, as
+float64, in fixed-size chunks. It computes the same metrics with bounded
+memory:
+
+- Means are running sums and counts.
+- The 90th / 92nd percentiles and the means conditioned on them (attack
+  angle on top-10% bat speed, LA and distance on top-8% EV) take two passes.
+  Pass one builds a fixed-size histogram that tells which bins hold the
+  quantile's order statistics. Pass two keeps only the rows in those bins
+  plus running sums for rows above them. That is enough to reproduce the
+  linearly interpolated quantile exactly.
+
+Peak memory is therefore one chunk plus a fixed histogram, whatever the file
+size.
+"""
+import numpy as np
+import pandas as pd
+
+import perf
+from metrics import (
+    ATTACK_ANGLE_COL,
+    BAT_SPEED_COL,
+    DISTANCE_COL,
+    EXIT_VELOCITY_COL,
+    LAUNCH_ANGLE_COL,
+    STRIKE_ZONE_COL,
+    TIME_TO_CONTACT_COL,
+    ExitVelocityDataError,
+    bat_speed_layout,
+    build_bat_speed_metrics,
+    build_exit_velocity_metrics,
+    exit_velocity_layout,
+    lerp,
+    quantile_position,
+    zone_stats_from_sums,
+    zone_sums,
+)
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# First-pass histogram: 0.05-wide bins from -50 to 250 (mph) with the end bins
+# catching anything outside. Only used to locate ranks, so outliers are safe.
+_HIST_LO = -50.0
+_HIST_WIDTH = 0.05
+_N_BINS = 6000
+
+
+###############
+# CSV CHUNKS  #
+###############
+
+class _NonNumericColumn(Exception):
+    """A metric column holds text, so the float64 fast path cannot parse it."""
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def _iter_chunks(source, skiprows, positions, chunksize, coerce):
+    """
+    Yield one tuple of float64 arrays per chunk, for the columns at positions.
+    The fast path parses straight to float64; with coerce=True text cells
+    become NaN the way pd.to_numeric(errors='coerce') does in metrics.py.
+    """
+    reader = pd.read_csv(
+        _rewind(source),
+        skiprows=skiprows,
+        usecols=positions,
+        dtype=None if coerce else {p: np.float64 for p in positions},
+        chunksize=chunksize,
+    )
+    try:
+        for chunk in reader:
+            # usecols returns columns in file order, which is sorted position order.
+            by_position = dict(zip(sorted(positions), chunk.columns))
+            yield tuple(
+                pd.to_numeric(chunk[by_position[p]], errors='coerce').to_numpy(dtype=np.float64)
+                if coerce else chunk[by_position[p]].to_numpy()
+                for p in positions
+            )
+    except ValueError as e:
+        if coerce:
+            raise
+        raise _NonNumericColumn() from e
+
+
+def _run_pass(pass_fn, source, skiprows, positions, chunksize, coerce):
+    """
+    Run pass_fn over the chunks, falling back to coercing text cells when the
+    float64 fast path hits one. pass_fn must start from fresh state each call
+    since a fallback runs it again. Returns (result, coerce flag to reuse).
+    """
+    if not coerce:
+        try:
+            return pass_fn(_iter_chunks(source, skiprows, positions, chunksize, False)), False
+        except _NonNumericColumn:
+            pass
+    return pass_fn(_iter_chunks(source, skiprows, positions, chunksize, True)), True
+
+
+###########################
+# TWO-PASS QUANTILE TAIL  #
+###########################
+
+def _bin_index(values):
+    idx = np.floor((values - _HIST_LO) / _HIST_WIDTH)
+    return np.clip(idx, 0, _N_BINS - 1).astype(np.int64)
+
+
+def _nan_mean(total, count):
+    return total / count if count else np.nan
+
+
+class QuantileTail:
+    """
+    Exact linearly interpolated quantile q of one column, plus means of other
+    columns over the rows at or above that quantile.
+
+    Feed the primary values (NaNs already removed) to first_pass for every
+    chunk, call plan(), feed the same rows with their secondary columns to
+    second_pass, then call finish().
+    """
+
+    def __init__(self, q, n_secondary):
+        self.q = q
+        self.n_secondary = n_secondary
+        self.hist = np.zeros(_N_BINS, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+
+    def first_pass(self, primary):
+        self.count += len(primary)
+        self.total += primary.sum()
+        self.hist += np.bincount(_bin_index(primary), minlength=_N_BINS)
+
+    @property
+    def mean(self):
+        return _nan_mean(self.total, self.count)
+
+    def plan(self):
+        """Locate the bins holding the two order statistics the quantile needs."""
+        if not self.count:
+            return
+        lower, upper, self.fraction = quantile_position(self.count, self.q)
+        self.ranks = (lower, upper)
+        cumulative = np.cumsum(self.hist)
+        self.lo_bin, self.hi_bin = np.searchsorted(cumulative, self.ranks, side='right')
+        self.rank_offset = int(cumulative[self.lo_bin - 1]) if self.lo_bin else 0
+        # value -> [count, sum_1, count_1, sum_2, count_2, ...] for rows in the bins
+        self.near = {}
+        self.above_sums = np.zeros(self.n_secondary)
+        self.above_counts = np.zeros(self.n_secondary)
+
+    def second_pass(self, primary, secondaries):
+        if not self.count:
+            return
+        bins = _bin_index(primary)
+
+        above = bins > self.hi_bin
+        for i, values in enumerate(secondaries):
+            values = values[above]
+            present = ~np.isnan(values)
+            self.above_sums[i] += values[present].sum()
+            self.above_counts[i] += present.sum()
+
+        near = (bins >= self.lo_bin) & (bins <= self.hi_bin)
+        if not near.any():
+            return
+        distinct, inverse = np.unique(primary[near], return_inverse=True)
+        columns = [np.bincount(inverse, minlength=len(distinct))]
+        for values in secondaries:
+            values = values[near]
+            present = ~np.isnan(values)
+            columns.append(np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=len(distinct)))
+            columns.append(np.bincount(inverse, weights=present, minlength=len(distinct)))
+        stats = np.column_stack(columns).astype(np.float64)
+        for value, row in zip(distinct.tolist(), stats):
+            if value in self.near:
+                self.near[value] += row
+            else:
+                self.near[value] = row
+
+    def finish(self):
+        """Return (quantile, [mean of each secondary over rows >= quantile])."""
+        if not self.count:
+            return np.nan, [np.nan] * self.n_secondary
+        values = np.array(sorted(self.near))
+        stats = np.array([self.near[v] for v in values])
+        cumulative = self.rank_offset + np.cumsum(stats[:, 0])
+        low = values[np.searchsorted(cumulative, self.ranks[0], side='right')]
+        high = values[np.searchsorted(cumulative, self.ranks[1], side='right')]
+        quantile = lerp(low, high, self.fraction)
+
+        selected = stats[values >= quantile]
+        sums = self.above_sums + selected[:, 1::2].sum(axis=0)
+        counts = self.above_counts + selected[:, 2::2].sum(axis=0)
+        return quantile, [_nan_mean(s, c) for s, c in zip(sums, counts)]
+
+
+######################
+# STREAMED METRICS   #
+######################
+
+def stream_bat_speed_metrics(source, level, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Bat speed metrics for a Bat Speed export (path or seekable file-like),
+    read in chunks of the bat speed, attack angle and time to contact
+    columns only.
+    """
+    layout = bat_speed_layout(source)
+    skiprows = layout.header_line
+    positions = [layout.positions[column] for column in (BAT_SPEED_COL, ATTACK_ANGLE_COL, TIME_TO_CONTACT_COL)]
+
+    def first(chunks):
+        tail = QuantileTail(0.90, n_secondary=1)
+        ttc_sum, ttc_count = 0.0, 0
+        for bat_speed, _, ttc in chunks:
+            tail.first_pass(bat_speed[~np.isnan(bat_speed)])
+            present = ~np.isnan(ttc)
+            ttc_sum += ttc[present].sum()
+            ttc_count += present.sum()
+        return tail, _nan_mean(ttc_sum, ttc_count)
+
+    def second(chunks):
+        tail.plan()
+        for bat_speed, attack_angle, _ in chunks:
+            valid = ~np.isnan(bat_speed)
+            tail.second_pass(bat_speed[valid], [attack_angle[valid]])
+
+    with perf.stage("stream.bat_speed") as timer:
+        (tail, avg_time_to_contact), coerce = _run_pass(first, source, skiprows, positions, chunksize, False)
+        _run_pass(second, source, skiprows, positions, chunksize, coerce)
+        top_10_percent_bat_speed, (avg_attack_angle_top_10,) = tail.finish()
+        timer.rows = tail.count
+
+    return build_bat_speed_metrics(
+        level, tail.mean, top_10_percent_bat_speed, avg_attack_angle_top_10, avg_time_to_contact
+    )
+
+
+def stream_exit_velocity(source, level, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Exit velocity metrics and per-zone stats for an Exit Velocity export
+    (path or seekable file-like), read in chunks of the exit velocity, launch
+    angle, distance and strike zone columns only. Returns
+    (ExitVelocityMetrics, zone stats as from metrics.compute_zone_stats).
+    """
+    layout = exit_velocity_layout(source)
+    skiprows = layout.header_line
+    positions = [
+        layout.positions[column] for column in (EXIT_VELOCITY_COL, LAUNCH_ANGLE_COL, DISTANCE_COL, STRIKE_ZONE_COL)
+    ]
+
+    def first(chunks):
+        tail = QuantileTail(0.92, n_secondary=2)
+        la_sum, la_count = 0.0, 0
+        zones = 0.0
+        for exit_velocity, launch_angle, distance, zone in chunks:
+            non_zero = exit_velocity > 0
+            tail.first_pass(exit_velocity[non_zero])
+            positive_la = launch_angle > 0
+            la_sum += launch_angle[positive_la].sum()
+            la_count += positive_la.sum()
+            zones = zones + zone_sums(zone, exit_velocity, launch_angle, distance)
+        return tail, _nan_mean(la_sum, la_count), zones
+
+    def second(chunks):
+        tail.plan()
+        for exit_velocity, launch_angle, distance, _ in chunks:
+            non_zero = exit_velocity > 0
+            tail.second_pass(exit_velocity[non_zero], [launch_angle[non_zero], distance[non_zero]])
+
+    with perf.stage("stream.exit_velocity") as timer:
+        (tail, total_avg_launch_angle, zones), coerce = _run_pass(first, source, skiprows, positions, chunksize, False)
+        if not tail.count:
+            raise ExitVelocityDataError("No valid non-zero Exit Velocity data found in the file.")
+        _run_pass(second, source, skiprows, positions, chunksize, coerce)
+        top_8_percent_exit_velocity, (avg_launch_angle_top_8, avg_distance_top_8) = tail.finish()
+        timer.rows = tail.count
+
+    metrics = build_exit_velocity_metrics(
+        level, tail.mean, top_8_percent_exit_velocity,
+        avg_launch_angle_top_8, total_avg_launch_angle, avg_distance_top_8,
+    )
+    return metrics, zone_stats_from_sums(zones)
@@ -0,0 +1,489 @@
+"""
+Background report jobs.
+
+The page hands report work to a JobManager, so the Streamlit script thread
+only submits and polls. That work is parsing the exports, computing the
+metrics and rendering the heatmap. A slow upload no longer freezes the page
+or the other sessions on the server.
+
+Each job has an id and a progress value with a status message. Long steps
+call job.checkpoint(), which is also where cancellation takes effect:
+
+- a queued job is dropped before it starts;
+- a running job stops at its next checkpoint.
+
+At most `workers` jobs run at once and at most `max_queued` wait. Further
+submissions raise JobQueueFull, like the SMTP DeliveryQueue in mailer.py.
+
+Jobs run on threads rather than processes. They share the in-process result
+caches (cache.py) and the swing store, and the heavy parts (CSV parsing,
+NumPy reductions, PNG encoding) mostly release the GIL. batch.py remains the
+process-pool path for whole rosters.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from io import BytesIO
+
+import perf
+from cache import frame_cache, heatmap_cache, metrics_cache
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """Raised when too many report jobs are already waiting."""
+
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint of a job that was asked to stop."""
+
+
+#########
+# JOBS  #
+#########
+
+class Job:
+    """One submitted unit of work: its state, progress and outcome."""
+
+    __slots__ = (
+        "job_id", "label", "state", "progress", "message", "result", "error", "trace",
+        "submitted_at", "started_at", "finished_at", "_cancel", "_done", "_lock", "_future",
+    )
+
+    def __init__(self, label):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.state = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting for a free worker"
+        self.result = None
+        self.error = None
+        self.trace = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._future = None
+
+    def checkpoint(self, progress, message=None):
+        """Record progress (0-1) and raise JobCancelled if the job was asked to stop."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.job_id)
+        self.progress = progress
+        if message is not None:
+            self.message = message
+
+    def cancel(self):
+        """Ask the job to stop. Returns False if it had already finished."""
+        if self.done():
+            return False
+        self._cancel.set()
+        # A job that has not started yet is finished right away.
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED)
+        return True
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.state in FINISHED_STATES
+
+    def wait(self, timeout=None):
+        """Block until the job finishes or timeout seconds pass; returns done()."""
+        return self._done.wait(timeout)
+
+    @property
+    def elapsed(self):
+        """Seconds since submission, frozen once the job finishes."""
+        return (self.finished_at or time.monotonic()) - self.submitted_at
+
+    def _start(self):
+        with self._lock:
+            if self.state != QUEUED or self._cancel.is_set():
+                return False
+            self.state = RUNNING
+            self.started_at = time.monotonic()
+            self.message = "Starting"
+            return True
+
+    def _finish(self, state, result=None, error=None):
+        with self._lock:
+            if self.done():
+                return
+            self.result = result
+            self.error = error
+            self.finished_at = time.monotonic()
+            if state == DONE:
+                self.progress = 1.0
+            self.message = {DONE: "Done", FAILED: "Failed", CANCELLED: "Cancelled"}[state]
+            self.state = state
+        self._done.set()
+
+
+################
+# JOB MANAGER  #
+################
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool. fn(job, *args, **kwargs) does the
+    work and its return value becomes job.result. An exception fails the
+    job and is kept in job.error. The last `keep_finished` finished jobs stay
+    retrievable by id.
+    """
+
+    def __init__(self, workers=2, max_queued=20, keep_finished=100):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="otr-report")
+
+    def submit(self, fn, *args, label="report", trace=False, **kwargs):
+        """
+        Queue fn and return its Job immediately. With trace=True the job's
+        perf stages are collected into job.trace.
+        """
+        job = Job(label)
+        with self._lock:
+            if self._count(QUEUED) >= self.max_queued:
+                raise JobQueueFull("Too many reports are waiting to be generated; try again shortly.")
+            self._jobs[job.job_id] = job
+            self._prune()
+        job._future = self._executor.submit(self._run, job, trace, fn, args, kwargs)
+        return job
+
+    def _run(self, job, trace, fn, args, kwargs):
+        if not job._start():
+            job._finish(CANCELLED)
+            return
+        job_trace = perf.begin_trace() if trace else None
+        state, result, error = DONE, None, None
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            state = CANCELLED
+        except Exception as e:
+            # Drop the traceback: its frames would keep the job's inputs alive
+            # for as long as a session holds on to the failed job.
+            state, error = FAILED, e.with_traceback(None)
+        finally:
+            if job_trace is not None:
+                job_trace.finish()
+                job.trace = job_trace
+        job._finish(state, result, error)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        return job is not None and job.cancel()
+
+    def jobs(self):
+        """Known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def running(self):
+        with self._lock:
+            return self._count(RUNNING)
+
+    def queued(self):
+        with self._lock:
+            return self._count(QUEUED)
+
+    def _count(self, state):
+        return sum(job.state == state for job in self._jobs.values())
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        """Cancel every job that has not started and stop the workers."""
+        for job in self.jobs():
+            if job.state == QUEUED:
+                job.cancel()
+        self._executor.shutdown(wait=wait)
+
+
+################
+# REPORT JOBS  #
+################
+
+@dataclass(frozen=True)
+class ReportRequest:
+    """
+    Inputs of one page report. Requests compare equal when they would produce
+    the same report, so the page can tell whether its running job is still
+    current. The uploaded bytes are left out of the comparison; their digests
+    stand in for them.
+    """
+    bat_speed_level: str
+    exit_velocity_level: str
+    zone_map_metric: str = "avg_exit_velocity"
+    bat_speed_digest: str = None
+    exit_velocity_digest: str = None
+    bat_speed_data: bytes = field(default=None, compare=False, repr=False)
+    exit_velocity_data: bytes = field(default=None, compare=False, repr=False)
+    history_player: str = None
+    history_start: object = None
+    history_end: object = None
+    # Number of stored sessions for history_player; saving a session changes it.
+    history_sessions: int = 0
+    # How uploaded swings are matched for combined metrics (combined.JOIN_KEYS), or None.
+    swing_join: str = None
+    # Confidence level of the bootstrap intervals (see bootstrap.py), or None for none.
+    confidence: float = None
+
+    def without_uploads(self):
+        """An equal request without the uploaded bytes, cheap to keep in session state."""
+        return replace(self, bat_speed_data=None, exit_velocity_data=None)
+
+
+@dataclass(frozen=True)
+class ReportResult:
+    """
+    One finished report, as a session keeps it. The metric results and the
+    PNG are the objects held by the shared caches, so sessions viewing the
+    same data reference one copy. The base64 HTML the email needs is built
+    only when an email is sent. The *_intervals are bootstrap.ConfidenceIntervals,
+    or None when the request did not ask for them.
+    """
+    __slots__ = (
+        "bat_speed_result", "exit_velocity_result", "combined_result",
+        "bat_speed_intervals", "exit_velocity_intervals", "combined_intervals",
+        "strike_zone_png", "zone_map_metric", "messages",
+    )
+
+    bat_speed_result: object
+    exit_velocity_result: object
+    combined_result: object
+    bat_speed_intervals: object
+    exit_velocity_intervals: object
+    combined_intervals: object
+    strike_zone_png: bytes
+    zone_map_metric: str
+    # (level, text) pairs for the page: level is "error" or "info".
+    messages: tuple
+
+    def strike_zone_html(self):
+        """The heatmap as an HTML snippet (PNG embedded as base64), or "" without one."""
+        if self.strike_zone_png is None:
+            return ""
+        from heatmap import strike_zone_html
+
+        return strike_zone_html(self.strike_zone_png, self.zone_map_metric)
+
+
+def _render_strike_zone(zone_stats, metric):
+    # Imported here so reports without Exit Velocity data never load matplotlib.
+    from heatmap import render_strike_zone_png
+
+    return render_strike_zone_png(zone_stats, metric)
+
+
+def generate_report(job, request, store=None):
+    """
+    Job body for the page: metrics, strike zone heatmap, (for two uploads
+    with request.swing_join set) combined swing metrics and (with
+    request.confidence set) their bootstrap intervals for a ReportRequest,
+    from the uploaded bytes or from `store` (a SwingStore) for a stored
+    history request. Parsed frames and results go through the
+    shared caches, so a repeated request is nearly free.
+    """
+    from formats import UnknownLayoutError
+    from metrics import (
+        ExitVelocityDataError,
+        compute_bat_speed_metrics,
+        compute_exit_velocity_metrics,
+        compute_zone_stats,
+        read_bat_speed_csv,
+        read_exit_velocity_csv,
+    )
+
+    messages = []
+    bat_speed_result = None
+    exit_velocity_result = None
+    combined_result = None
+    bat_speed_intervals = None
+    exit_velocity_intervals = None
+    combined_intervals = None
+    strike_zone_png = None
+    df_bat_speed = None
+    df_exit_velocity = None
+    use_history = request.history_player is not None
+
+    # A bad Bat Speed export is reported and skipped, like a bad Exit
+    # Velocity one below, so it does not cost the rest of the report.
+    try:
+        if use_history:
+            job.checkpoint(0.1, "Loading stored Bat Speed sessions")
+            try:
+                bat_speed_result = store.bat_speed_metrics(
+                    request.history_player, request.bat_speed_level, request.history_start, request.history_end
+                )
+            except LookupError as e:
+                messages.append(("info", str(e)))
+        elif request.bat_speed_data is not None:
+            digest = request.bat_speed_digest
+            job.checkpoint(0.05, "Parsing Bat Speed file")
+            df_bat_speed = frame_cache.get_or_compute(
+                ("bat_speed", digest),
+                lambda: read_bat_speed_csv(BytesIO(request.bat_speed_data))
+            )
+            job.checkpoint(0.25, "Computing Bat Speed metrics")
+            bat_speed_result = metrics_cache.get_or_compute(
+                ("bat_speed", digest, request.bat_speed_level),
+                lambda: compute_bat_speed_metrics(df_bat_speed, request.bat_speed_level)
+            )
+    except JobCancelled:
+        raise
+    except UnknownLayoutError as e:
+        df_bat_speed = None
+        messages.append(("error", str(e)))
+    except Exception as e:
+        df_bat_speed = None
+        messages.append(("error", f"An error occurred while processing the Bat Speed file: {e}"))
+
+    try:
+        if use_history:
+            job.checkpoint(0.4, "Loading stored Exit Velocity sessions")
+            try:
+                exit_velocity_result = store.exit_velocity_metrics(
+                    request.history_player, request.exit_velocity_level, request.history_start, request.history_end
+                )
+                job.checkpoint(0.7, "Rendering strike zone heatmap")
+                strike_zone_png = _render_strike_zone(
+                    store.zone_stats(request.history_player, request.history_start, request.history_end),
+                    request.zone_map_metric
+                )
+            except LookupError as e:
+                messages.append(("info", str(e)))
+        elif request.exit_velocity_data is not None:
+            digest = request.exit_velocity_digest
+            job.checkpoint(0.3, "Parsing Exit Velocity file")
+            df_exit_velocity = frame_cache.get_or_compute(
+                ("exit_velocity", digest),
+                lambda: read_exit_velocity_csv(BytesIO(request.exit_velocity_data))
+            )
+            job.checkpoint(0.5, "Computing Exit Velocity metrics")
+            exit_velocity_result = metrics_cache.get_or_compute(
+                ("exit_velocity", digest, request.exit_velocity_level),
+                lambda: compute_exit_velocity_metrics(df_exit_velocity, request.exit_velocity_level)
+            )
+
+            # Zone stats and heatmaps do not depend on the level, so they are keyed
+            # by content (and map); switching maps reuses the one aggregation pass.
+            job.checkpoint(0.6, "Aggregating strike zones")
+            zone_stats = metrics_cache.get_or_compute(
+                ("zone_stats", digest),
+                lambda: compute_zone_stats(df_exit_velocity)
+            )
+            job.checkpoint(0.7, "Rendering strike zone heatmap")
+            strike_zone_png = heatmap_cache.get_or_compute(
+                (digest, request.zone_map_metric),
+                lambda: _render_strike_zone(zone_stats, request.zone_map_metric)
+            )
+    except JobCancelled:
+        raise
+    except ExitVelocityDataError as e:
+        messages.append(("error", str(e)))
+    except Exception as e:
+        messages.append(("error", f"An error occurred while processing the Exit Velocity file: {e}"))
+
+    if request.confidence is not None and (bat_speed_result is not None or exit_velocity_result is not None):
+        from bootstrap import compute_bat_speed_intervals, compute_exit_velocity_intervals
+
+        job.checkpoint(0.8, "Bootstrapping confidence intervals")
+        try:
+            if use_history:
+                if bat_speed_result is not None:
+                    bat_speed_intervals = store.bat_speed_intervals(
+                        request.history_player, request.bat_speed_level, request.history_start,
+                        request.history_end, confidence=request.confidence
+                    )
+                if exit_velocity_result is not None:
+                    exit_velocity_intervals = store.exit_velocity_intervals(
+                        request.history_player, request.exit_velocity_level, request.history_start,
+                        request.history_end, confidence=request.confidence
+                    )
+            else:
+                if bat_speed_result is not None:
+                    bat_speed_intervals = metrics_cache.get_or_compute(
+                        ("bootstrap", "bat_speed", request.bat_speed_digest, request.bat_speed_level,
+                         request.confidence),
+                        lambda: compute_bat_speed_intervals(
+                            df_bat_speed, request.bat_speed_level, confidence=request.confidence
+                        )
+                    )
+                if exit_velocity_result is not None:
+                    exit_velocity_intervals = metrics_cache.get_or_compute(
+                        ("bootstrap", "exit_velocity", request.exit_velocity_digest, request.exit_velocity_level,
+                         request.confidence),
+                        lambda: compute_exit_velocity_intervals(
+                            df_exit_velocity, request.exit_velocity_level, confidence=request.confidence
+                        )
+                    )
+        except JobCancelled:
+            raise
+        except Exception as e:
+            messages.append(("error", f"Could not compute confidence intervals: {e}"))
+
+    if request.swing_join and df_bat_speed is not None and df_exit_velocity is not None:
+        from combined import DEFAULT_TOLERANCE, compute_combined_metrics
+
+        job.checkpoint(0.9, "Matching bat swings to batted balls")
+        try:
+            combined_result = metrics_cache.get_or_compute(
+                ("combined", request.bat_speed_digest, request.exit_velocity_digest,
+                 request.bat_speed_level, request.swing_join),
+                lambda: compute_combined_metrics(
+                    df_bat_speed, df_exit_velocity, request.bat_speed_level, request.swing_join
+                )
+            )
+            if combined_result is None and request.swing_join == "timestamp":
+                messages.append(("info", f"No Bat Speed swing was within {DEFAULT_TOLERANCE:g} s of an "
+                                         "Exit Velocity row; try matching swings by sequence."))
+            elif combined_result is None:
+                messages.append(("info", "No Bat Speed swing could be matched to an Exit Velocity row."))
+            if combined_result is not None and request.confidence is not None:
+                from bootstrap import compute_combined_intervals
+
+                job.checkpoint(0.95, "Bootstrapping combined confidence intervals")
+                combined_intervals = metrics_cache.get_or_compute(
+                    ("bootstrap", "combined", request.bat_speed_digest, request.exit_velocity_digest,
+                     request.bat_speed_level, request.swing_join, request.confidence),
+                    lambda: compute_combined_intervals(
+                        df_bat_speed, df_exit_velocity, request.bat_speed_level, request.swing_join,
+                        confidence=request.confidence
+                    )
+                )
+        except JobCancelled:
+            raise
+        except Exception as e:
+            messages.append(("error", f"Could not match Bat Speed and Exit Velocity swings: {e}"))
+
+    job.checkpoint(1.0)
+    return ReportResult(
+        bat_speed_result, exit_velocity_result, combined_result,
+        bat_speed_intervals, exit_velocity_intervals, combined_intervals,
+        strike_zone_png, request.zone_map_metric, tuple(messages)
+    )
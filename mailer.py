@@ -0,0 +1,252 @@
+"""
+Pooled, queued SMTP delivery.
+
+Report emails go through a DeliveryQueue: a bounded queue drained by
+background threads that borrow authenticated sessions from an
+SMTPConnectionPool. Submitting returns a Future immediately, so the Streamlit
+script thread never waits on the SMTP handshake. Bulk sends reuse one session
+for a whole batch of messages instead of connecting, STARTTLS-ing and logging
+in once per message.
+"""
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+import perf
+
+
+@dataclass(frozen=True)
+class SMTPConfig:
+    host: str
+    port: int = 587
+    username: str = None
+    password: str = None
+    starttls: bool = True
+    timeout: float = 30.0
+
+
+class DeliveryQueueFull(Exception):
+    """Raised when the delivery queue is at capacity."""
+
+
+####################
+# CONNECTION POOL  #
+####################
+
+class SMTPConnectionPool:
+    """
+    Keeps up to `size` logged-in SMTP sessions for reuse. Idle sessions older
+    than `max_idle` seconds are checked with NOOP before being handed out, and
+    a session that raised during use is dropped instead of being returned.
+    """
+
+    def __init__(self, config, size=2, max_idle=60.0):
+        self.config = config
+        self.size = size
+        self.max_idle = max_idle
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        config = self.config
+        with perf.stage("smtp.connect"):
+            server = smtplib.SMTP(config.host, config.port, timeout=config.timeout)
+            try:
+                if config.starttls:
+                    server.starttls()
+                if config.username:
+                    server.login(config.username, config.password)
+            except Exception:
+                server.close()
+                raise
+        return server
+
+    @staticmethod
+    def _is_alive(server):
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def acquire(self):
+        """Borrow a session, opening a new one when no healthy idle one exists."""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    server, last_used = self._idle.pop()
+                if time.monotonic() - last_used < self.max_idle or self._is_alive(server):
+                    return server
+                self._close(server)
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, server, broken=False):
+        """Return a session to the pool, or close it when it is broken."""
+        try:
+            if broken:
+                self._close(server)
+            else:
+                with self._lock:
+                    self._idle.append((server, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+
+###################
+# DELIVERY QUEUE  #
+###################
+
+def _is_permanent(error):
+    # 5xx replies (bad recipient, message rejected, auth refused) will not
+    # succeed on retry; connection drops and 4xx replies might.
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class DeliveryQueue:
+    """
+    Bounded queue of outgoing messages drained by `workers` background threads.
+    Each queued job is a batch of messages sent over one pooled session. Failed
+    batches are retried with exponential backoff, resuming after the last
+    message that was delivered.
+    """
+
+    def __init__(self, pool, maxsize=100, workers=2, max_retries=3, backoff=1.0, batch_size=50):
+        self.pool = pool
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.sent = 0
+        self.failed = 0
+        self._stats_lock = threading.Lock()
+        self._jobs = queue.Queue(maxsize=maxsize)
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"smtp-delivery-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, msg, block=False):
+        """Queue one message; returns a Future resolving to the recipient dict from send_message."""
+        return self._enqueue([msg], block)[0]
+
+    def submit_bulk(self, messages, block=True):
+        """
+        Queue many messages, grouped into batches that each reuse one session.
+        Returns one Future per message, in order.
+        """
+        futures = []
+        for start in range(0, len(messages), self.batch_size):
+            futures.extend(self._enqueue(messages[start:start + self.batch_size], block))
+        return futures
+
+    def _enqueue(self, messages, block):
+        futures = [Future() for _ in messages]
+        try:
+            self._jobs.put(list(zip(messages, futures)), block=block)
+        except queue.Full:
+            raise DeliveryQueueFull("Too many emails are waiting to be sent; try again shortly.") from None
+        return futures
+
+    def _count(self, sent=0, failed=0):
+        with self._stats_lock:
+            self.sent += sent
+            self.failed += failed
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def _worker(self):
+        while True:
+            batch = self._jobs.get()
+            try:
+                self._deliver(batch)
+            finally:
+                self._jobs.task_done()
+
+    def _deliver(self, batch):
+        # Drop messages whose Future was cancelled while waiting in the queue.
+        batch = [(msg, future) for msg, future in batch if future.set_running_or_notify_cancel()]
+        attempt = 0
+        while batch:
+            server = None
+            try:
+                server = self.pool.acquire()
+                while batch:
+                    msg, future = batch[0]
+                    with perf.stage("smtp.send", rows=1):
+                        refused = server.send_message(msg)
+                    future.set_result(refused)
+                    self._count(sent=1)
+                    batch = batch[1:]
+                self.pool.release(server)
+                return
+            except Exception as e:
+                if server is not None:
+                    self.pool.release(server, broken=True)
+                attempt += 1
+                if attempt > self.max_retries or _is_permanent(e):
+                    if server is None:
+                        # Could not even open a session: the whole batch fails.
+                        failed, batch = batch, []
+                    else:
+                        # Give up on the message that failed; keep going with the rest.
+                        failed, batch = batch[:1], batch[1:]
+                    for _, future in failed:
+                        future.set_exception(e)
+                    self._count(failed=len(failed))
+                    attempt = 0
+                    continue
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+    def join(self):
+        """Block until every queued message has been attempted."""
+        self._jobs.join()
+
+
+def send_bulk(pool, messages):
+    """
+    Send messages synchronously over a single pooled session.
+    Returns a list of (msg, error) pairs for the messages that failed.
+    """
+    failures = []
+    server = pool.acquire()
+    broken = False
+    try:
+        for msg in messages:
+            try:
+                server.send_message(msg)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                failures.append((msg, e))
+    except Exception:
+        broken = True
+        raise
+    finally:
+        pool.release(server, broken=broken)
+    return failures
@@ -0,0 +1,543 @@
+"""
+Headless OTR metrics engine.
+
+Everything needed to turn Bat Speed and Exit Velocity exports into metrics and
+grades, without Streamlit, matplotlib or smtplib. Only numpy and pandas are
+imported, so batch jobs and scripts can use it directly.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import perf
+from formats import (  # noqa: F401  (column names are re-exported for callers)
+    ATTACK_ANGLE_COL,
+    BAT_SPEED,
+    BAT_SPEED_COL,
+    BAT_SPEED_DATE_COL,
+    DISTANCE_COL,
+    EXIT_VELOCITY,
+    EXIT_VELOCITY_COL,
+    EXIT_VELOCITY_DATE_COL,
+    LAUNCH_ANGLE_COL,
+    PITCH_SPEED_COL,
+    SEQUENCE_COL,
+    STRIKE_ZONE_COL,
+    TIME_TO_CONTACT_COL,
+    UnknownLayoutError,
+    read_layout,
+    sniff_layout,
+)
+
+#######################################
+# BENCHMARKS + PERFORMANCE EVALUATION #
+#######################################
+
+benchmarks = {
+    "10u": {
+        "Avg EV": 50, "Top 8th EV": 61,
+        "Avg LA": 12.14, "HHB LA": 8.78
+    },
+    "12u": {
+        "Avg EV": 59, "Top 8th EV": 72,
+        "Avg LA": 12.14, "HHB LA": 8.78
+    },
+    "14u": {
+        "Avg EV": 68, "Top 8th EV": 80,
+        "Avg LA": 12.14, "HHB LA": 8.78
+    },
+    "JV/16u": {
+        "Avg EV": 72.65, "Top 8th EV": 85,
+        "Avg LA": 16.51, "HHB LA": 11.47
+    },
+    "Var/18u": {
+        "Avg EV": 78.0, "Top 8th EV": 91.5,
+        "Avg LA": 16.51, "HHB LA": 11.47
+    },
+    "Youth": {
+        "Avg EV": 58.4, "Top 8th EV": 70.19, "Avg LA": 12.14, "HHB LA": 8.78,
+        "Avg BatSpeed": 49.21, "90th% BatSpeed": 52.81, "Avg TimeToContact": 0.19, "Avg AttackAngle": 11.78
+    },
+    "High School": {
+        "Avg EV": 74.54, "Top 8th EV": 86.75, "Avg LA": 16.51, "HHB LA": 11.47,
+        "Avg BatSpeed": 62.4, "90th% BatSpeed": 67.02, "Avg TimeToContact": 0.163, "Avg AttackAngle": 9.8
+    },
+    "College": {
+        "Avg EV": 81.57, "Top 8th EV": 94.44, "Avg LA": 17.57, "HHB LA": 12.86,
+        "Avg BatSpeed": 67.53, "90th% BatSpeed": 72.54, "Avg TimeToContact": 0.154, "Avg AttackAngle": 10.52
+    },
+    "Indy": {
+        "Avg EV": 85.99, "Top 8th EV": 98.12, "Avg LA": 18.68, "HHB LA": 14.74,
+        "Avg BatSpeed": 69.2, "90th% BatSpeed": 74.04, "Avg TimeToContact": 0.154, "Avg AttackAngle": 10.62
+    },
+    "Affiliate": {
+        "Avg EV": 85.49, "Top 8th EV": 98.71, "Avg LA": 18.77, "HHB LA": 15.55,
+        "Avg BatSpeed": 70.17, "90th% BatSpeed": 75.14, "Avg TimeToContact": 0.147, "Avg AttackAngle": 11.09
+    }
+}
+
+def evaluate_performance(metric, benchmark, lower_is_better=False, special_metric=False):
+    """
+    Grade the player's performance based on the given benchmark.
+    special_metric => uses a +/- 3 mph range for 'Average' to handle certain EV data.
+    """
+    if special_metric:
+        # For EV, say "Average" if metric is within [benchmark-3, benchmark], else below/above
+        if benchmark - 3 <= metric <= benchmark:
+            return "Average"
+        elif metric < benchmark - 3:
+            return "Below Average"
+        else:
+            return "Above Average"
+    else:
+        if lower_is_better:
+            # e.g. time-to-contact (less is better)
+            if metric < benchmark:
+                return "Above Average"
+            elif metric <= benchmark * 1.1:
+                return "Average"
+            else:
+                return "Below Average"
+        else:
+            # e.g. bat speed or EV (more is better)
+            if metric > benchmark:
+                return "Above Average"
+            elif metric >= benchmark * 0.9:
+                return "Average"
+            else:
+                return "Below Average"
+
+
+
+#############################
+# VECTORIZED ROSTER GRADING #
+#############################
+
+# Level-by-metric view of `benchmarks`; metrics a level has no benchmark for are NaN.
+benchmark_table = pd.DataFrame.from_dict(benchmarks, orient="index")
+
+# How each benchmark metric is graded in the report.
+metric_rules = {
+    "Avg EV": {"special_metric": True},
+    "Top 8th EV": {"special_metric": True},
+    "Avg LA": {},
+    "HHB LA": {},
+    "Avg BatSpeed": {},
+    "90th% BatSpeed": {},
+    "Avg TimeToContact": {"lower_is_better": True},
+    "Avg AttackAngle": {},
+}
+
+# Report metrics per export kind, with the benchmark each one is graded
+# against (None: reported but not graded).
+REPORT_METRICS = {
+    BAT_SPEED: {
+        "avg_bat_speed": "Avg BatSpeed",
+        "top_10_percent_bat_speed": "90th% BatSpeed",
+        "avg_attack_angle_top_10": "Avg AttackAngle",
+        "avg_time_to_contact": "Avg TimeToContact",
+    },
+    EXIT_VELOCITY: {
+        "avg_exit_velocity": "Avg EV",
+        "top_8_percent_exit_velocity": "Top 8th EV",
+        "avg_launch_angle_top_8": "HHB LA",
+        "total_avg_launch_angle": "Avg LA",
+        "avg_distance_top_8": None,
+    },
+}
+
+GRADE_LABELS = np.array(["Below Average", "Average", "Above Average"])
+_BELOW, _AVERAGE, _ABOVE = 0, 1, 2
+
+
+def lookup_benchmarks(levels, metric):
+    """
+    Benchmark value for each entry of levels, as a float array.
+    Raises KeyError for an unknown level or a level without this metric,
+    the same way benchmarks[level][metric] would.
+    """
+    levels = np.asarray(levels, dtype=object)
+    if metric not in benchmark_table.columns:
+        raise KeyError(metric)
+    # Factorize first so only the handful of distinct level names are looked up.
+    codes, uniques = pd.factorize(levels.ravel())
+    unique_idx = benchmark_table.index.get_indexer(uniques)
+    if (unique_idx < 0).any():
+        raise KeyError(uniques[unique_idx < 0][0])
+    values = benchmark_table[metric].to_numpy(dtype=float)[unique_idx][codes].reshape(levels.shape)
+    if np.isnan(values).any():
+        raise KeyError(f"{levels[np.isnan(values)].flat[0]!r} has no {metric!r} benchmark")
+    return values
+
+
+def evaluate_performance_array(metrics, benchmark, lower_is_better=False, special_metric=False):
+    """
+    Vectorized evaluate_performance: grades arrays of metric and benchmark
+    values with the same thresholds and returns an array of grade strings.
+    NaN metrics grade the same way the scalar comparisons do.
+    """
+    metrics = np.asarray(metrics, dtype=float)
+    benchmark = np.asarray(benchmark, dtype=float)
+    if special_metric:
+        codes = np.select(
+            [(benchmark - 3 <= metrics) & (metrics <= benchmark), metrics < benchmark - 3],
+            [_AVERAGE, _BELOW],
+            default=_ABOVE,
+        )
+    elif lower_is_better:
+        codes = np.select(
+            [metrics < benchmark, metrics <= benchmark * 1.1],
+            [_ABOVE, _AVERAGE],
+            default=_BELOW,
+        )
+    else:
+        codes = np.select(
+            [metrics > benchmark, metrics >= benchmark * 0.9],
+            [_ABOVE, _AVERAGE],
+            default=_BELOW,
+        )
+    return GRADE_LABELS[codes]
+
+
+def grade_metric_array(values, levels, metric):
+    """
+    Grade a whole column of values for one benchmark metric, e.g.
+    grade_metric_array(roster["avg_bat_speed"], roster["bat_speed_level"], "Avg BatSpeed").
+    levels may be a single level name or one level per value.
+    """
+    values = np.asarray(values, dtype=float)
+    if np.ndim(levels) == 0:
+        benchmark = lookup_benchmarks([levels], metric)[0]
+    else:
+        benchmark = lookup_benchmarks(levels, metric)
+    return evaluate_performance_array(values, benchmark, **metric_rules[metric])
+
+
+#######################
+# FILE LAYOUTS        #
+#######################
+
+# Exports are parsed by header name through the format registry in
+# formats.py; parsed frames have one column per field, named as imported above.
+
+
+class ExitVelocityDataError(ValueError):
+    """Raised when an Exit Velocity file cannot produce a report."""
+
+
+def bat_speed_layout(source):
+    """Resolve the layout of a Bat Speed export from its first few KB."""
+    return sniff_layout(source, BAT_SPEED)
+
+
+def exit_velocity_layout(source):
+    """Resolve the layout of an Exit Velocity export from its first few KB."""
+    try:
+        return sniff_layout(source, EXIT_VELOCITY)
+    except UnknownLayoutError as e:
+        raise ExitVelocityDataError(str(e)) from None
+
+
+def read_bat_speed_csv(source):
+    """Parse a Bat Speed export (path or seekable file-like)."""
+    with perf.stage("parse.bat_speed") as timer:
+        df = read_layout(source, bat_speed_layout(source))
+        timer.rows = len(df)
+    return df
+
+
+def read_exit_velocity_csv(source):
+    """Parse an Exit Velocity export (path or seekable file-like)."""
+    with perf.stage("parse.exit_velocity") as timer:
+        df = read_layout(source, exit_velocity_layout(source))
+        timer.rows = len(df)
+    return df
+
+
+##################
+# RESULT OBJECTS #
+##################
+
+@dataclass(frozen=True)
+class BatSpeedMetrics:
+    level: str
+    avg_bat_speed: float
+    top_10_percent_bat_speed: float
+    avg_attack_angle_top_10: float
+    avg_time_to_contact: float
+    bat_speed_benchmark: float
+    top_90_benchmark: float
+    attack_angle_benchmark: float
+    time_to_contact_benchmark: float
+    avg_bat_speed_grade: str
+    top_10_percent_bat_speed_grade: str
+    avg_attack_angle_top_10_grade: str
+    avg_time_to_contact_grade: str
+
+
+@dataclass(frozen=True)
+class ExitVelocityMetrics:
+    level: str
+    avg_exit_velocity: float
+    top_8_percent_exit_velocity: float
+    avg_launch_angle_top_8: float
+    total_avg_launch_angle: float
+    avg_distance_top_8: float
+    ev_benchmark: float
+    top_8_benchmark: float
+    hhb_la_benchmark: float
+    la_benchmark: float
+    avg_exit_velocity_grade: str
+    top_8_percent_exit_velocity_grade: str
+    avg_launch_angle_top_8_grade: str
+    total_avg_launch_angle_grade: str
+
+
+########################
+# METRIC COMPUTATIONS  #
+########################
+
+def quantile_position(count, q):
+    """
+    Where the linearly interpolated quantile q of count sorted values lies:
+    (lower rank, upper rank, fraction between them), 0-based. pandas
+    computes percentiles from q * 100, so this mirrors that rounding. count
+    may be an array.
+    """
+    position = (count - 1) * (q * 100 / 100)
+    lower = np.floor(position)
+    return lower, np.minimum(lower + 1, count - 1), position - lower
+
+
+def lerp(a, b, t):
+    """Interpolate like numpy's method='linear', so quantiles match pandas to the last bit."""
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)[()]
+
+
+def build_bat_speed_metrics(level, avg_bat_speed, top_10_percent_bat_speed,
+                            avg_attack_angle_top_10, avg_time_to_contact):
+    """Attach the level's benchmarks and grades to computed bat speed values."""
+    level_benchmarks = benchmarks[level]
+    bat_speed_benchmark = level_benchmarks["Avg BatSpeed"]
+    top_90_benchmark = level_benchmarks["90th% BatSpeed"]
+    attack_angle_benchmark = level_benchmarks["Avg AttackAngle"]
+    time_to_contact_benchmark = level_benchmarks["Avg TimeToContact"]
+
+    return BatSpeedMetrics(
+        level=level,
+        avg_bat_speed=avg_bat_speed,
+        top_10_percent_bat_speed=top_10_percent_bat_speed,
+        avg_attack_angle_top_10=avg_attack_angle_top_10,
+        avg_time_to_contact=avg_time_to_contact,
+        bat_speed_benchmark=bat_speed_benchmark,
+        top_90_benchmark=top_90_benchmark,
+        attack_angle_benchmark=attack_angle_benchmark,
+        time_to_contact_benchmark=time_to_contact_benchmark,
+        avg_bat_speed_grade=evaluate_performance(avg_bat_speed, bat_speed_benchmark),
+        top_10_percent_bat_speed_grade=evaluate_performance(top_10_percent_bat_speed, top_90_benchmark),
+        avg_attack_angle_top_10_grade=evaluate_performance(avg_attack_angle_top_10, attack_angle_benchmark),
+        avg_time_to_contact_grade=evaluate_performance(
+            avg_time_to_contact, time_to_contact_benchmark, lower_is_better=True
+        ),
+    )
+
+
+def bat_speed_metrics_from_arrays(bat_speed, attack_angle, time_to_contact, level):
+    """
+    Compute bat speed metrics from per-swing arrays (NaN for missing values).
+    Mean and quantile semantics match pandas: NaNs are skipped and the 90th
+    percentile uses linear interpolation.
+    """
+    bat_speed = pd.Series(bat_speed, dtype=float)
+    attack_angle = pd.Series(attack_angle, dtype=float)
+    time_to_contact = pd.Series(time_to_contact, dtype=float)
+
+    avg_bat_speed = bat_speed.mean()
+    top_10_percent_bat_speed = bat_speed.quantile(0.90)
+    avg_attack_angle_top_10 = attack_angle[(bat_speed >= top_10_percent_bat_speed).to_numpy()].mean()
+    avg_time_to_contact = time_to_contact.mean()
+
+    return build_bat_speed_metrics(
+        level, avg_bat_speed, top_10_percent_bat_speed, avg_attack_angle_top_10, avg_time_to_contact
+    )
+
+
+def compute_bat_speed_metrics(df, level):
+    """Compute bat speed metrics from a parsed Bat Speed export."""
+    with perf.stage("metrics.bat_speed", rows=len(df)):
+        return bat_speed_metrics_from_arrays(
+            pd.to_numeric(df[BAT_SPEED_COL], errors='coerce'),
+            pd.to_numeric(df[ATTACK_ANGLE_COL], errors='coerce'),
+            pd.to_numeric(df[TIME_TO_CONTACT_COL], errors='coerce'),
+            level,
+        )
+
+
+def build_exit_velocity_metrics(level, avg_exit_velocity, top_8_percent_exit_velocity,
+                                avg_launch_angle_top_8, total_avg_launch_angle, avg_distance_top_8):
+    """Attach the level's benchmarks and grades to computed exit velocity values."""
+    level_benchmarks = benchmarks[level]
+    ev_benchmark = level_benchmarks["Avg EV"]
+    top_8_benchmark = level_benchmarks["Top 8th EV"]
+    hhb_la_benchmark = level_benchmarks["HHB LA"]
+    la_benchmark = level_benchmarks["Avg LA"]
+
+    return ExitVelocityMetrics(
+        level=level,
+        avg_exit_velocity=avg_exit_velocity,
+        top_8_percent_exit_velocity=top_8_percent_exit_velocity,
+        avg_launch_angle_top_8=avg_launch_angle_top_8,
+        total_avg_launch_angle=total_avg_launch_angle,
+        avg_distance_top_8=avg_distance_top_8,
+        ev_benchmark=ev_benchmark,
+        top_8_benchmark=top_8_benchmark,
+        hhb_la_benchmark=hhb_la_benchmark,
+        la_benchmark=la_benchmark,
+        avg_exit_velocity_grade=evaluate_performance(avg_exit_velocity, ev_benchmark, special_metric=True),
+        top_8_percent_exit_velocity_grade=evaluate_performance(
+            top_8_percent_exit_velocity, top_8_benchmark, special_metric=True
+        ),
+        avg_launch_angle_top_8_grade=evaluate_performance(avg_launch_angle_top_8, hhb_la_benchmark),
+        total_avg_launch_angle_grade=evaluate_performance(total_avg_launch_angle, la_benchmark),
+    )
+
+
+def exit_velocity_metrics_from_arrays(exit_velocity, launch_angle, distance, level):
+    """
+    Compute exit velocity metrics from per-swing arrays (NaN for missing values).
+    Zero-EV rows are ignored; raises ExitVelocityDataError when none remain.
+    """
+    exit_velocity = pd.Series(exit_velocity, dtype=float)
+    launch_angle = pd.Series(launch_angle, dtype=float)
+    distance = pd.Series(distance, dtype=float)
+
+    # Filter out zero EV rows
+    non_zero_mask = (exit_velocity > 0).to_numpy()
+    non_zero_ev_data = exit_velocity[non_zero_mask]
+    if non_zero_ev_data.empty:
+        raise ExitVelocityDataError("No valid non-zero Exit Velocity data found in the file.")
+
+    avg_exit_velocity = non_zero_ev_data.mean()
+    top_8_percent_exit_velocity = non_zero_ev_data.quantile(0.92)
+
+    # For top 8% calculations
+    top_8_mask = (exit_velocity >= top_8_percent_exit_velocity).to_numpy() & non_zero_mask
+    avg_launch_angle_top_8 = launch_angle[top_8_mask].mean()
+    avg_distance_top_8 = distance[top_8_mask].mean()
+    total_avg_launch_angle = launch_angle[(launch_angle > 0).to_numpy()].mean()
+
+    return build_exit_velocity_metrics(
+        level, avg_exit_velocity, top_8_percent_exit_velocity,
+        avg_launch_angle_top_8, total_avg_launch_angle, avg_distance_top_8,
+    )
+
+
+def _check_exit_velocity_columns(df):
+    # Confirm sufficient columns
+    if not {STRIKE_ZONE_COL, EXIT_VELOCITY_COL, LAUNCH_ANGLE_COL, DISTANCE_COL}.issubset(df.columns):
+        raise ExitVelocityDataError("The uploaded file does not have the required columns for Exit Velocity.")
+
+
+def compute_exit_velocity_metrics(df, level):
+    """Compute exit velocity metrics from a parsed Exit Velocity export."""
+    _check_exit_velocity_columns(df)
+    with perf.stage("metrics.exit_velocity", rows=len(df)):
+        return exit_velocity_metrics_from_arrays(
+            pd.to_numeric(df[EXIT_VELOCITY_COL], errors='coerce'),
+            pd.to_numeric(df[LAUNCH_ANGLE_COL], errors='coerce'),
+            pd.to_numeric(df[DISTANCE_COL], errors='coerce'),
+            level,
+        )
+
+
+##########################
+# STRIKE ZONE AGGREGATION #
+##########################
+
+N_ZONES = 13
+HARD_HIT_MPH = 95.0
+
+# Per-zone metrics, in column order of compute_zone_stats().
+ZONE_METRICS = ["avg_exit_velocity", "avg_launch_angle", "avg_distance", "swings", "hard_hit_rate"]
+
+# Rows of the array zone_sums() returns, one column per zone.
+_SWINGS, _BATTED, _EV_SUM, _LA_SUM, _LA_COUNT, _DIST_SUM, _DIST_COUNT, _HARD_HIT = range(8)
+_N_SUMS = 8
+
+
+def zone_sums(strike_zone, exit_velocity, launch_angle, distance, hard_hit_mph=HARD_HIT_MPH):
+    """
+    Per-zone sums and counts for zones 1-13 as an (8, 13) array, built with
+    one np.bincount per quantity over integer zone ids. Rows outside zones
+    1-13 are ignored. Sums from separate chunks of a file simply add up.
+    """
+    zone = np.asarray(strike_zone, dtype=np.float64)
+    exit_velocity = np.asarray(exit_velocity, dtype=np.float64)
+    launch_angle = np.asarray(launch_angle, dtype=np.float64)
+    distance = np.asarray(distance, dtype=np.float64)
+
+    # Zone z -> id z - 1; anything else (NaN, 0, 14, 2.5) -> the spare id N_ZONES.
+    ids = zone - 1
+    ids = np.where((ids >= 0) & (ids < N_ZONES) & (ids == np.floor(ids)), ids, N_ZONES).astype(np.intp)
+
+    # Averages and the hard-hit rate use batted balls (non-zero EV), like the report.
+    batted = exit_velocity > 0
+    la_present = batted & ~np.isnan(launch_angle)
+    dist_present = batted & ~np.isnan(distance)
+    weights = [
+        None,
+        batted,
+        np.where(batted, exit_velocity, 0.0),
+        np.where(la_present, launch_angle, 0.0),
+        la_present,
+        np.where(dist_present, distance, 0.0),
+        dist_present,
+        batted & (exit_velocity >= hard_hit_mph),
+    ]
+    sums = np.empty((_N_SUMS, N_ZONES))
+    for row, w in enumerate(weights):
+        sums[row] = np.bincount(ids, weights=w, minlength=N_ZONES + 1)[:N_ZONES]
+    return sums
+
+
+def zone_stats_from_sums(sums):
+    """
+    DataFrame indexed by zone 1-13 ("StrikeZone") with the ZONE_METRICS
+    columns. Zones without batted balls have NaN averages.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats = pd.DataFrame({
+            "avg_exit_velocity": sums[_EV_SUM] / sums[_BATTED],
+            "avg_launch_angle": sums[_LA_SUM] / sums[_LA_COUNT],
+            "avg_distance": sums[_DIST_SUM] / sums[_DIST_COUNT],
+            "swings": sums[_SWINGS].astype(np.int64),
+            "hard_hit_rate": sums[_HARD_HIT] / sums[_BATTED],
+        }, index=pd.RangeIndex(1, N_ZONES + 1, name="StrikeZone"))
+    return stats
+
+
+def compute_zone_stats(df, hard_hit_mph=HARD_HIT_MPH):
+    """
+    Per-zone mean EV, launch angle and distance, swing count and hard-hit
+    rate for a parsed Exit Velocity export, in one vectorized pass over its
+    columns (the frame itself is never copied).
+    """
+    _check_exit_velocity_columns(df)
+    with perf.stage("zone_aggregation", rows=len(df)):
+        return zone_stats_from_sums(zone_sums(
+            pd.to_numeric(df[STRIKE_ZONE_COL], errors='coerce'),
+            pd.to_numeric(df[EXIT_VELOCITY_COL], errors='coerce'),
+            pd.to_numeric(df[LAUNCH_ANGLE_COL], errors='coerce'),
+            pd.to_numeric(df[DISTANCE_COL], errors='coerce'),
+            hard_hit_mph,
+        ))
+
+
+def compute_zone_averages(df):
+    """
+    Mean exit velocity per strike zone over all non-zero EV rows.
+    Returns a Series indexed by zone number (zones with data only).
+    """
+    return compute_zone_stats(df)["avg_exit_velocity"].dropna()
@@ -1,99 +1,28 @@
+import datetime
+
+import os
+import threading
+
 import streamlit as st
-import pandas as pd
-import smtplib
-import base64
-from io import BytesIO
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for Streamlit
-import matplotlib.pyplot as plt
-import numpy as np
-from matplotlib.colors import LinearSegmentedColormap
-
-#######################################
-# BENCHMARKS + PERFORMANCE EVALUATION #
-#######################################
-
-benchmarks = {
-    "10u": {
-        "Avg EV": 50, "Top 8th EV": 61,
-        "Avg LA": 12.14, "HHB LA": 8.78
-    },
-    "12u": {
-        "Avg EV": 59, "Top 8th EV": 72,
-        "Avg LA": 12.14, "HHB LA": 8.78
-    },
-    "14u": {
-        "Avg EV": 68, "Top 8th EV": 80,
-        "Avg LA": 12.14, "HHB LA": 8.78
-    },
-    "JV/16u": {
-        "Avg EV": 72.65, "Top 8th EV": 85,
-        "Avg LA": 16.51, "HHB LA": 11.47
-    },
-    "Var/18u": {
-        "Avg EV": 78.0, "Top 8th EV": 91.5,
-        "Avg LA": 16.51, "HHB LA": 11.47
-    },
-    "Youth": {
-        "Avg EV": 58.4, "Top 8th EV": 70.19, "Avg LA": 12.14, "HHB LA": 8.78,
-        "Avg BatSpeed": 49.21, "90th% BatSpeed": 52.81, "Avg TimeToContact": 0.19, "Avg AttackAngle": 11.78
-    },
-    "High School": {
-        "Avg EV": 74.54, "Top 8th EV": 86.75, "Avg LA": 16.51, "HHB LA": 11.47,
-        "Avg BatSpeed": 62.4, "90th% BatSpeed": 67.02, "Avg TimeToContact": 0.163, "Avg AttackAngle": 9.8
-    },
-    "College": {
-        "Avg EV": 81.57, "Top 8th EV": 94.44, "Avg LA": 17.57, "HHB LA": 12.86,
-        "Avg BatSpeed": 67.53, "90th% BatSpeed": 72.54, "Avg TimeToContact": 0.154, "Avg AttackAngle": 10.52
-    },
-    "Indy": {
-        "Avg EV": 85.99, "Top 8th EV": 98.12, "Avg LA": 18.68, "HHB LA": 14.74,
-        "Avg BatSpeed": 69.2, "90th% BatSpeed": 74.04, "Avg TimeToContact": 0.154, "Avg AttackAngle": 10.62
-    },
-    "Affiliate": {
-        "Avg EV": 85.49, "Top 8th EV": 98.71, "Avg LA": 18.77, "HHB LA": 15.55,
-        "Avg BatSpeed": 70.17, "90th% BatSpeed": 75.14, "Avg TimeToContact": 0.147, "Avg AttackAngle": 11.09
-    }
-}
 
-def evaluate_performance(metric, benchmark, lower_is_better=False, special_metric=False):
-    """
-    Grade the player's performance based on the given benchmark.
-    special_metric => uses a +/- 3 mph range for 'Average' to handle certain EV data.
-    """
-    if special_metric:
-        # For EV, say "Average" if metric is within [benchmark-3, benchmark], else below/above
-        if benchmark - 3 <= metric <= benchmark:
-            return "Average"
-        elif metric < benchmark - 3:
-            return "Below Average"
-        else:
-            return "Above Average"
-    else:
-        if lower_is_better:
-            # e.g. time-to-contact (less is better)
-            if metric < benchmark:
-                return "Above Average"
-            elif metric <= benchmark * 1.1:
-                return "Average"
-            else:
-                return "Below Average"
-        else:
-            # e.g. bat speed or EV (more is better)
-            if metric > benchmark:
-                return "Above Average"
-            elif metric >= benchmark * 0.9:
-                return "Average"
-            else:
-                return "Below Average"
+import perf
+from cache import file_digest, frame_cache, heatmap_cache, metrics_cache
+from report import build_email_body
 
+# Heavy modules are imported on the code paths that need them: the metrics
+# engine (pandas/numpy) once there is data, matplotlib once there is Exit
+# Velocity data, and smtplib/email once a report is sent. The landing page of
+# a cold container loads none of them; see "PRE-WARM" at the bottom.
 
 ###################################
 # STREAMLIT INTERFACE & ANALYSIS #
 ###################################
 
+# Stage timings for this run, shown at the bottom when logging is configured
+# (OTR_PERF_LOG / OTR_PERF_PROM) or the page is opened with ?perf=1.
+show_performance = perf.enabled() or st.query_params.get("perf") == "1"
+page_trace = perf.begin_trace() if show_performance else None
+
 st.title("OTR Baseball Metrics Analyzer")
 st.write("Upload your Bat Speed and Exit Velocity CSV files to generate a comprehensive report.")
 
@@ -115,207 +44,378 @@ exit_velocity_level = st.selectbox(
 st.write(f"Selected Bat Speed Level: {bat_speed_level}")
 st.write(f"Selected Exit Velocity Level: {exit_velocity_level}")
 
-# Global placeholders for storing computed metrics used in the email function
-player_avg_bat_speed = None
-bat_speed_benchmark = None
-top_10_percent_bat_speed = None
-top_90_benchmark = None
-avg_attack_angle_top_10 = None
-attack_angle_benchmark = None
-avg_time_to_contact = None
-time_to_contact_benchmark = None
-
-exit_velocity_avg = None
-ev_benchmark = None
-top_8_percent_exit_velocity = None
-top_8_benchmark = None
-avg_launch_angle_top_8 = None
-hhb_la_benchmark = None
-total_avg_launch_angle = None
-la_benchmark = None
-avg_distance_top_8 = None
-
-# A variable to hold the strike zone HTML (PNG embedded) so we can also send it via email
-strike_zone_img_html = ""
+# 3) REPORT SOURCE: this upload, or a player's stored sessions over a date range
+report_source = st.radio("Report Source", ["Uploaded Files", "Stored History"], horizontal=True)
+use_history = report_source == "Stored History"
+if use_history:
+    history_player = st.text_input("History Player Name")
+    today = datetime.date.today()
+    history_dates = st.date_input("History Date Range", value=(today - datetime.timedelta(days=30), today))
+    # While the user is still picking, the range can have a single date.
+    history_start, history_end = (tuple(history_dates) + (None, None))[:2]
+
+
+@st.cache_resource
+def get_swing_store():
+    """The on-disk swing store shared by every session on this server."""
+    from store import SwingStore
+
+    return SwingStore()
+
+
+@st.cache_resource
+def get_trend_engine():
+    """Session aggregates shared by every session, built once per stored file."""
+    from trends import TrendEngine
+
+    return TrendEngine(get_swing_store())
+
+
+# Keyed by mtime so a rebuilt index is picked up; one entry, so the index it
+# replaces is released instead of staying in memory for the server's life.
+@st.cache_resource(max_entries=1)
+def _load_percentile_index(path, mtime):
+    from percentiles import PercentileIndex
+
+    return PercentileIndex.load(path)
+
+
+def get_percentile_index():
+    """The saved population percentile index (None if there is none), reloaded when the file changes."""
+    from percentiles import DEFAULT_INDEX_PATH
+
+    if not os.path.exists(DEFAULT_INDEX_PATH):
+        return None
+    return _load_percentile_index(DEFAULT_INDEX_PATH, os.path.getmtime(DEFAULT_INDEX_PATH))
+
+
+@st.cache_resource
+def get_report_jobs():
+    """One bounded pool of report workers shared by every session on this server."""
+    from jobs import JobManager
+
+    return JobManager(workers=int(os.environ.get("OTR_REPORT_WORKERS", "2")))
+
+
+# How long a run waits for its report before showing progress instead. Small
+# uploads finish within it and render in the same run, without a flash of
+# progress bar.
+REPORT_WAIT_SECONDS = float(os.environ.get("OTR_REPORT_WAIT", "0.5"))
+
+has_data = use_history or bat_speed_file is not None or exit_velocity_file is not None
+if has_data:
+    from jobs import CANCELLED, DONE, FAILED, JobQueueFull, ReportRequest, generate_report
+    from metrics import read_bat_speed_csv, read_exit_velocity_csv
+    from trends import TREND_METRICS
+
+    swing_store = get_swing_store()
+    trend_engine = get_trend_engine()
+    percentile_index = get_percentile_index()
+
+# Zone maps the user can pick, by label (see metrics.ZONE_METRICS).
+ZONE_MAP_OPTIONS = {
+    "Average Exit Velocity": "avg_exit_velocity",
+    "Average Launch Angle": "avg_launch_angle",
+    "Average Distance": "avg_distance",
+    "Swings": "swings",
+    "Hard-Hit Rate (95+ mph)": "hard_hit_rate",
+}
+zone_map_metric = "avg_exit_velocity"
+if use_history or exit_velocity_file:
+    zone_map_metric = ZONE_MAP_OPTIONS[st.selectbox("Strike Zone Map", list(ZONE_MAP_OPTIONS))]
+
+# How swings of the two uploads are matched for combined metrics (see combined.py).
+SWING_JOIN_OPTIONS = {"By Timestamp": "timestamp", "By Sequence (#)": "sequence", "Off": None}
+swing_join = None
+if not use_history and bat_speed_file and exit_velocity_file:
+    swing_join = SWING_JOIN_OPTIONS[st.selectbox("Match Swings", list(SWING_JOIN_OPTIONS))]
+
+# Bootstrap confidence intervals for every metric (see bootstrap.py).
+CONFIDENCE_OPTIONS = {"Off": None, "90%": 0.90, "95%": 0.95}
+confidence = None
+if has_data:
+    confidence = CONFIDENCE_OPTIONS[st.selectbox("Confidence Intervals", list(CONFIDENCE_OPTIONS))]
+
+###############
+# REPORT JOB  #
+###############
+
+# Parsing, metrics and the heatmap run as a background job (jobs.py). Each
+# rerun either picks up this session's job for the same inputs or, when an
+# input changed, cancels it and submits a new one, so the form stays usable
+# while a large file is processed.
+
+report_request = None
+if use_history:
+    if history_player:
+        report_request = ReportRequest(
+            bat_speed_level, exit_velocity_level, zone_map_metric,
+            history_player=history_player, history_start=history_start, history_end=history_end,
+            history_sessions=len(swing_store.sessions(player=history_player)),
+            confidence=confidence,
+        )
+elif bat_speed_file or exit_velocity_file:
+    bat_speed_digest = file_digest(bat_speed_file) if bat_speed_file else None
+    exit_velocity_digest = file_digest(exit_velocity_file) if exit_velocity_file else None
+    report_request = ReportRequest(
+        bat_speed_level, exit_velocity_level, zone_map_metric,
+        bat_speed_digest=bat_speed_digest,
+        exit_velocity_digest=exit_velocity_digest,
+        bat_speed_data=bat_speed_file.getvalue() if bat_speed_file else None,
+        exit_velocity_data=exit_velocity_file.getvalue() if exit_velocity_file else None,
+        swing_join=swing_join,
+        confidence=confidence,
+    )
+
+report_job = None
+previous_report = st.session_state.get("report")
+if previous_report is not None and previous_report[0] == report_request:
+    report_job = previous_report[1]
+else:
+    if previous_report is not None:
+        previous_report[1].cancel()
+    if report_request is not None:
+        try:
+            report_job = get_report_jobs().submit(
+                generate_report, report_request, swing_store, label="page report", trace=show_performance
+            )
+        except JobQueueFull as e:
+            st.error(str(e))
+    # Keep the request without its uploaded bytes: Streamlit already holds the files.
+    st.session_state["report"] = (report_request.without_uploads(), report_job) if report_job is not None else None
+
+
+@st.fragment(run_every=1.0)
+def show_report_progress(job):
+    """Progress of a running report, refreshed every second; reruns the page once it is done."""
+    if job.done():
+        st.rerun()
+    st.progress(job.progress, text=f"{job.message}... ({job.elapsed:.0f} s)")
+    if st.button("Cancel Report"):
+        job.cancel()
+        st.rerun()
+
+
+report_result = None
+if report_job is not None:
+    report_job.wait(REPORT_WAIT_SECONDS)
+    if report_job.state == DONE:
+        report_result = report_job.result
+    elif report_job.state == FAILED:
+        st.error(f"An error occurred while generating the report: {report_job.error}")
+    elif report_job.state == CANCELLED:
+        st.info("Report cancelled. Change an input to generate it again.")
+    else:
+        show_report_progress(report_job)
+
+bat_speed_result = None
+exit_velocity_result = None
+if report_result is not None:
+    bat_speed_result = report_result.bat_speed_result
+    exit_velocity_result = report_result.exit_velocity_result
+    for level, text in report_result.messages:
+        (st.error if level == "error" else st.info)(text)
 
 #########################
 # PROCESS BAT SPEED CSV #
 #########################
 
-bat_speed_metrics = None
-if bat_speed_file:
-    df_bat_speed = pd.read_csv(bat_speed_file, skiprows=8)  # skip first 8 lines
-    bat_speed_data = pd.to_numeric(df_bat_speed.iloc[:, 7], errors='coerce')   # Column H
-    attack_angle_data = pd.to_numeric(df_bat_speed.iloc[:, 10], errors='coerce')  # Column K
-    time_to_contact_data = pd.to_numeric(df_bat_speed.iloc[:, 15], errors='coerce')  # ?
-
-    player_avg_bat_speed = bat_speed_data.mean()
-    top_10_percent_bat_speed = bat_speed_data.quantile(0.90)
-    avg_attack_angle_top_10 = attack_angle_data[bat_speed_data >= top_10_percent_bat_speed].mean()
-    avg_time_to_contact = time_to_contact_data.mean()
-
-    bat_speed_benchmark = benchmarks[bat_speed_level]["Avg BatSpeed"]
-    top_90_benchmark = benchmarks[bat_speed_level]["90th% BatSpeed"]
-    time_to_contact_benchmark = benchmarks[bat_speed_level]["Avg TimeToContact"]
-    attack_angle_benchmark = benchmarks[bat_speed_level]["Avg AttackAngle"]
-
-    # We’ll just display a minimal text summary for the user here.
-    bat_speed_metrics = (
+def format_bat_speed_metrics(m):
+    """Markdown summary of a BatSpeedMetrics result for the page."""
+    return (
         "### Bat Speed Metrics\n"
-        f"- **Player Average Bat Speed:** {player_avg_bat_speed:.2f} mph (Benchmark: {bat_speed_benchmark} mph)\n"
-        f"  - Player Grade: {evaluate_performance(player_avg_bat_speed, bat_speed_benchmark)}\n"
-        f"- **Top 10% Bat Speed:** {top_10_percent_bat_speed:.2f} mph (Benchmark: {top_90_benchmark} mph)\n"
-        f"  - Player Grade: {evaluate_performance(top_10_percent_bat_speed, top_90_benchmark)}\n"
-        f"- **Average Attack Angle (Top 10% Bat Speed Swings):** {avg_attack_angle_top_10:.2f}° (Benchmark: {attack_angle_benchmark}°)\n"
-        f"  - Player Grade: {evaluate_performance(avg_attack_angle_top_10, attack_angle_benchmark)}\n"
-        f"- **Average Time to Contact:** {avg_time_to_contact:.3f} sec (Benchmark: {time_to_contact_benchmark} sec)\n"
-        f"  - Player Grade: {evaluate_performance(avg_time_to_contact, time_to_contact_benchmark, lower_is_better=True)}\n"
+        f"- **Player Average Bat Speed:** {m.avg_bat_speed:.2f} mph (Benchmark: {m.bat_speed_benchmark} mph)\n"
+        f"  - Player Grade: {m.avg_bat_speed_grade}\n"
+        f"- **Top 10% Bat Speed:** {m.top_10_percent_bat_speed:.2f} mph (Benchmark: {m.top_90_benchmark} mph)\n"
+        f"  - Player Grade: {m.top_10_percent_bat_speed_grade}\n"
+        f"- **Average Attack Angle (Top 10% Bat Speed Swings):** {m.avg_attack_angle_top_10:.2f}° (Benchmark: {m.attack_angle_benchmark}°)\n"
+        f"  - Player Grade: {m.avg_attack_angle_top_10_grade}\n"
+        f"- **Average Time to Contact:** {m.avg_time_to_contact:.3f} sec (Benchmark: {m.time_to_contact_benchmark} sec)\n"
+        f"  - Player Grade: {m.avg_time_to_contact_grade}\n"
     )
 
+
+bat_speed_metrics = None
+if bat_speed_result is not None:
+    # We’ll just display a minimal text summary for the user here.
+    bat_speed_metrics = format_bat_speed_metrics(bat_speed_result)
+
 #############################
 # PROCESS EXIT VELOCITY CSV #
 #############################
 
+def format_exit_velocity_metrics(m):
+    """Markdown summary of an ExitVelocityMetrics result for the page."""
+    return (
+        "### Exit Velocity Metrics\n"
+        f"- **Average Exit Velocity (Non-zero EV):** {m.avg_exit_velocity:.2f} mph (Benchmark: {m.ev_benchmark} mph)\n"
+        f"  - Player Grade: {m.avg_exit_velocity_grade}\n"
+        f"- **Top 8% Exit Velocity:** {m.top_8_percent_exit_velocity:.2f} mph (Benchmark: {m.top_8_benchmark} mph)\n"
+        f"  - Player Grade: {m.top_8_percent_exit_velocity_grade}\n"
+        f"- **Average Launch Angle (On Top 8% EV Swings):** {m.avg_launch_angle_top_8:.2f}° (Benchmark: {m.hhb_la_benchmark}°)\n"
+        f"  - Player Grade: {m.avg_launch_angle_top_8_grade}\n"
+        f"- **Total Average Launch Angle (Avg LA):** {m.total_avg_launch_angle:.2f}° (Benchmark: {m.la_benchmark}°)\n"
+        f"  - Player Grade: {m.total_avg_launch_angle_grade}\n"
+        f"- **Average Distance (8% swings):** {m.avg_distance_top_8:.2f} ft\n"
+    )
+
+
 exit_velocity_metrics = None
-if exit_velocity_file:
-    df_exit_velocity = pd.read_csv(exit_velocity_file)
-    try:
-        # Confirm sufficient columns
-        if len(df_exit_velocity.columns) > 9:
-            # F(5): Strike Zone
-            # H(7): EV
-            # I(8): LA
-            # J(9): Dist
-            strike_zone_data = df_exit_velocity.iloc[:, 5]
-            exit_velocity_data = pd.to_numeric(df_exit_velocity.iloc[:, 7], errors='coerce')
-            launch_angle_data = pd.to_numeric(df_exit_velocity.iloc[:, 8], errors='coerce')
-            distance_data = pd.to_numeric(df_exit_velocity.iloc[:, 9], errors='coerce')
-
-            # Filter out zero EV rows
-            non_zero_mask = exit_velocity_data > 0
-            non_zero_ev_data = exit_velocity_data[non_zero_mask]
-
-            if not non_zero_ev_data.empty:
-                exit_velocity_avg = non_zero_ev_data.mean()
-                top_8_percent_exit_velocity = non_zero_ev_data.quantile(0.92)
-
-                # For top 8% calculations
-                top_8_mask = (exit_velocity_data >= top_8_percent_exit_velocity) & (exit_velocity_data > 0)
-                avg_launch_angle_top_8 = launch_angle_data[top_8_mask].mean()
-                avg_distance_top_8 = distance_data[top_8_mask].mean()
-                total_avg_launch_angle = launch_angle_data[launch_angle_data > 0].mean()
-
-                ev_benchmark = benchmarks[exit_velocity_level]["Avg EV"]
-                top_8_benchmark = benchmarks[exit_velocity_level]["Top 8th EV"]
-                la_benchmark = benchmarks[exit_velocity_level]["Avg LA"]
-                hhb_la_benchmark = benchmarks[exit_velocity_level]["HHB LA"]
-
-                # Minimal text summary
-                exit_velocity_metrics = (
-                    "### Exit Velocity Metrics\n"
-                    f"- **Average Exit Velocity (Non-zero EV):** {exit_velocity_avg:.2f} mph (Benchmark: {ev_benchmark} mph)\n"
-                    f"  - Player Grade: {evaluate_performance(exit_velocity_avg, ev_benchmark, special_metric=True)}\n"
-                    f"- **Top 8% Exit Velocity:** {top_8_percent_exit_velocity:.2f} mph (Benchmark: {top_8_benchmark} mph)\n"
-                    f"  - Player Grade: {evaluate_performance(top_8_percent_exit_velocity, top_8_benchmark, special_metric=True)}\n"
-                    f"- **Average Launch Angle (On Top 8% EV Swings):** {avg_launch_angle_top_8:.2f}° (Benchmark: {hhb_la_benchmark}°)\n"
-                    f"  - Player Grade: {evaluate_performance(avg_launch_angle_top_8, hhb_la_benchmark)}\n"
-                    f"- **Total Average Launch Angle (Avg LA):** {total_avg_launch_angle:.2f}° (Benchmark: {la_benchmark}°)\n"
-                    f"  - Player Grade: {evaluate_performance(total_avg_launch_angle, la_benchmark)}\n"
-                    f"- **Average Distance (8% swings):** {avg_distance_top_8:.2f} ft\n"
-                )
-
-                # Generate the strike zone heatmap for *all* non-zero EV data
-                non_zero_df = df_exit_velocity[non_zero_mask].copy()
-                non_zero_df["StrikeZone"] = non_zero_df.iloc[:, 5]
-                zone_avg_df = non_zero_df.groupby("StrikeZone")[df_exit_velocity.columns[7]].mean()
-
-                if not zone_avg_df.empty:
-                    min_ev = zone_avg_df.min()
-                    max_ev = zone_avg_df.max()
-                else:
-                    min_ev, max_ev = 0, 1
-
-                zone_layout = [
-                    [10, None, 11],
-                    [1,   2,    3],
-                    [4,   5,    6],
-                    [7,   8,    9],
-                    [12, None, 13]
-                ]
-
-                # Our custom colormap: darkblue -> grey -> red
-                cmap = LinearSegmentedColormap.from_list('strikezones', ['darkblue', 'grey', 'red'])
-
-                fig, ax = plt.subplots(figsize=(3,5))
-                ax.axis('off')
-
-                cell_width = 1.0
-                cell_height = 1.0
-
-                for r, row_zones in enumerate(zone_layout):
-                    for c, z in enumerate(row_zones):
-                        x = c * cell_width
-                        y = (len(zone_layout)-1 - r) * cell_height
-                        if z is not None:
-                            mean_ev = zone_avg_df.get(z, np.nan)
-                            if np.isnan(mean_ev):
-                                color = 'white'  # no data
-                            else:
-                                norm_val = (mean_ev - min_ev) / (max_ev - min_ev) if (max_ev > min_ev) else 0
-                                color = cmap(norm_val)
-
-                            rect = plt.Rectangle((x, y), cell_width, cell_height, facecolor=color, edgecolor='black')
-                            ax.add_patch(rect)
-
-                            # Zone number
-                            ax.text(x+0.5*cell_width, y+0.7*cell_height, str(z), 
-                                    ha='center', va='center', fontsize=10, color='black')
-                            # Average EV text
-                            if not np.isnan(mean_ev):
-                                ax.text(x+0.5*cell_width, y+0.3*cell_height, f"{mean_ev:.1f} mph",
-                                        ha='center', va='center', fontsize=8, color='black')
-                        else:
-                            # Blank cell
-                            rect = plt.Rectangle((x, y), cell_width, cell_height, facecolor='white', edgecolor='black')
-                            ax.add_patch(rect)
-
-                ax.set_xlim(0, 3*cell_width)
-                ax.set_ylim(0, 5*cell_height)
-
-                buf = BytesIO()
-                plt.savefig(buf, format='png', bbox_inches='tight')
-                buf.seek(0)
-                img_data = base64.b64encode(buf.read()).decode('utf-8')
-                plt.close(fig)
-
-                # Store this HTML snippet for Streamlit and emailing
-                strike_zone_img_html = (
-                    "<h3 style='color: black;'>Strike Zone Average Exit Velocity</h3>"
-                    f"<img src='data:image/png;base64,{img_data}'/>"
-                )
+if exit_velocity_result is not None:
+    # Minimal text summary
+    exit_velocity_metrics = format_exit_velocity_metrics(exit_velocity_result)
+
+###################
+# COMBINED SWINGS #
+###################
+
+def format_combined_metrics(m):
+    """Markdown summary of a CombinedMetrics result for the page."""
+    return (
+        "### Combined Swing Metrics\n"
+        f"- **Matched Swings:** {m.matched_swings} of {m.bat_swings} ({m.match_rate:.0%})\n"
+        f"- **Average Smash Factor (EV / Bat Speed):** {m.avg_smash_factor:.2f}\n"
+        f"- **Average Exit Velocity (Top 10% Bat Speed Swings):** {m.avg_exit_velocity_top_10_bat_speed:.2f} mph\n"
+        f"- **Squared-Up Rate:** {m.squared_up_rate:.0%}\n"
+    )
 
-            else:
-                st.error("No valid non-zero Exit Velocity data found in the file.")
-        else:
-            st.error("The uploaded file does not have the required columns for Exit Velocity.")
-    except Exception as e:
-        st.error(f"An error occurred while processing the Exit Velocity file: {e}")
+
+combined_result = report_result.combined_result if report_result is not None else None
+combined_metrics = format_combined_metrics(combined_result) if combined_result is not None else None
 
 ##########
 # OUTPUT #
 ##########
 
+METRIC_LABELS = {
+    "avg_bat_speed": "Average Bat Speed",
+    "top_10_percent_bat_speed": "Top 10% Bat Speed",
+    "avg_attack_angle_top_10": "Average Attack Angle (Top 10%)",
+    "avg_time_to_contact": "Average Time to Contact",
+    "avg_exit_velocity": "Average Exit Velocity",
+    "top_8_percent_exit_velocity": "Top 8% Exit Velocity",
+    "avg_launch_angle_top_8": "Average Launch Angle (Top 8%)",
+    "total_avg_launch_angle": "Total Average Launch Angle",
+    "avg_distance_top_8": "Average Distance (Top 8%)",
+    "avg_smash_factor": "Average Smash Factor",
+    "avg_exit_velocity_top_10_bat_speed": "Average Exit Velocity (Top 10% Bat Speed)",
+    "squared_up_rate": "Squared-Up Rate",
+}
+# Interval bounds print like the metric; the rest use two decimals.
+INTERVAL_FORMATS = {"avg_time_to_contact": "{:.3f}", "squared_up_rate": "{:.0%}"}
+
+
+def _ordinal(n):
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+def format_percentiles(result):
+    """Markdown list of the result's percentiles within its level, or "" without a population."""
+    if percentile_index is None:
+        return ""
+    ranks = {m: p for m, p in percentile_index.result_percentiles(result).items() if p == p}  # drop NaN
+    if not ranks:
+        return ""
+    lines = [f"**Percentile among {result.level} players:**"]
+    lines += [f"- {METRIC_LABELS[m]}: {_ordinal(round(p))}" for m, p in ranks.items()]
+    return "\n".join(lines)
+
+
+def format_confidence_intervals(intervals):
+    """Markdown list of a ConfidenceIntervals result, or "" without one."""
+    if intervals is None:
+        return ""
+    lines = [f"**{intervals.confidence:.0%} confidence intervals ({intervals.resamples} bootstrap resamples "
+             f"of {intervals.swings} swings):**"]
+    for m, interval in intervals.intervals.items():
+        if interval.low != interval.low:  # NaN: no swing counted in any resample
+            continue
+        fmt = INTERVAL_FORMATS.get(m, "{:.2f}")
+        line = f"- {METRIC_LABELS[m]}: {fmt.format(interval.low)} – {fmt.format(interval.high)}"
+        if interval.low_grade == interval.high_grade and interval.low_grade:
+            line += f" ({interval.low_grade})"
+        elif interval.low_grade:
+            line += f" ({interval.low_grade} to {interval.high_grade})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+bat_speed_intervals = report_result.bat_speed_intervals if report_result is not None else None
+exit_velocity_intervals = report_result.exit_velocity_intervals if report_result is not None else None
+combined_intervals = report_result.combined_intervals if report_result is not None else None
+
 st.write("## Calculated Metrics")
-if bat_speed_metrics:
-    st.markdown(bat_speed_metrics)
-if exit_velocity_metrics:
-    st.markdown(exit_velocity_metrics)
-if strike_zone_img_html:
-    st.markdown(strike_zone_img_html, unsafe_allow_html=True)
+for metrics_markdown, result, intervals in (
+    (bat_speed_metrics, bat_speed_result, bat_speed_intervals),
+    (exit_velocity_metrics, exit_velocity_result, exit_velocity_intervals),
+):
+    if metrics_markdown:
+        st.markdown(metrics_markdown)
+        for extra_markdown in (format_percentiles(result), format_confidence_intervals(intervals)):
+            if extra_markdown:
+                st.markdown(extra_markdown)
+if combined_metrics:
+    st.markdown(combined_metrics)
+    interval_markdown = format_confidence_intervals(combined_intervals)
+    if interval_markdown:
+        st.markdown(interval_markdown)
+# The result keeps only the PNG bytes; the embedded HTML is built per run.
+if report_result is not None and report_result.strike_zone_png is not None:
+    st.markdown(report_result.strike_zone_html(), unsafe_allow_html=True)
+
+##########
+# TRENDS #
+##########
+
+if use_history and history_player:
+    trend_tables = [
+        ("Bat Speed", "bat_speed", trend_engine.trend(
+            "bat_speed", history_player, bat_speed_level, start=history_start, end=history_end)),
+        ("Exit Velocity", "exit_velocity", trend_engine.trend(
+            "exit_velocity", history_player, exit_velocity_level, start=history_start, end=history_end)),
+    ]
+    if any(not table.empty for _, _, table in trend_tables):
+        st.write("## Week-over-Week Trends")
+        for label, kind, table in trend_tables:
+            if table.empty:
+                continue
+            st.write(f"### {label}")
+            st.line_chart(table[list(TREND_METRICS[kind])])
+            st.dataframe(table)
 
 player_name = st.text_input("Enter Player Name")
 date_range = st.text_input("Enter Date Range")
 
+###########################
+# SAVE TO PLAYER HISTORY  #
+###########################
+
+if not use_history and (bat_speed_file or exit_velocity_file):
+    session_date = st.date_input("Session Date")
+    if st.button("Save Session to History"):
+        if not player_name:
+            st.error("Please enter a player name before saving to history.")
+        else:
+            uploads = []
+            if bat_speed_file:
+                uploads.append(("Bat Speed", "bat_speed", bat_speed_digest, lambda: read_bat_speed_csv(bat_speed_file)))
+            if exit_velocity_file:
+                uploads.append((
+                    "Exit Velocity", "exit_velocity", exit_velocity_digest,
+                    lambda: read_exit_velocity_csv(exit_velocity_file)
+                ))
+            for label, kind, digest, read in uploads:
+                try:
+                    # The report job has usually parsed the file already.
+                    df = frame_cache.get_or_compute((kind, digest), read)
+                    if swing_store.add_frame(kind, df, player_name, session_date, digest):
+                        st.success(f"{label} session saved for {player_name} on {session_date}.")
+                    else:
+                        st.info(f"This {label} file was already saved to history.")
+                except ValueError as e:
+                    st.error(str(e))
+
 ########################
 # EMAIL CONFIGURATION  #
 ########################
@@ -325,134 +425,97 @@ email_password = "pslp fuab dmub cggo"    # Your generated app password
 smtp_server = "smtp.gmail.com"
 smtp_port = 587
 
+
+@st.cache_resource
+def get_delivery_queue():
+    """One pooled SMTP delivery queue shared by every session on this server."""
+    # smtplib is only needed once someone sends a report.
+    from mailer import DeliveryQueue, SMTPConfig, SMTPConnectionPool
+
+    config = SMTPConfig(smtp_server, smtp_port, username=email_address, password=email_password)
+    return DeliveryQueue(SMTPConnectionPool(config))
+
 ############################################################
 # MERGED FUNCTION: OLD EMAIL FORMAT + STRIKE ZONE HEATMAP  #
 ############################################################
 def send_email_report(
     recipient_email,
-    bat_speed_metrics,
-    exit_velocity_metrics,
+    report,
     player_name,
     date_range,
     bat_speed_level,
-    exit_velocity_level,
-    strike_zone_img_html
+    exit_velocity_level
 ):
+    """Email a ReportResult (or an empty report when report is None) through the delivery queue."""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    from mailer import DeliveryQueueFull
+
     msg = MIMEMultipart()
     msg['From'] = email_address
     msg['To'] = recipient_email
     msg['Subject'] = "OTR Baseball Metrics and Grade Report"
 
-    # We’ll reconstruct the HTML body in the older format you provided.
-    email_body = f"""
-    <html>
-    <body style="color: black; background-color: white;">
-        <h2 style="color: black;">OTR Metrics Report</h2>
-        <p style="color: black;"><strong>Player Name:</strong> {player_name}</p>
-        <p style="color: black;"><strong>Date Range:</strong> {date_range}</p>
-    """
-
-    # If we have Bat Speed metrics, we mention the level
-    if bat_speed_metrics:
-        email_body += f"<p style='color: black;'><strong>Bat Speed Level:</strong> {bat_speed_level}</p>"
-
-    # If we have Exit Velocity metrics, we mention the level
-    if exit_velocity_metrics:
-        email_body += f"<p style='color: black;'><strong>Exit Velocity Level:</strong> {exit_velocity_level}</p>"
-
-    # Add a statement about benchmarks
-    email_body += "<p style='color: black;'>The following data is constructed with benchmarks for each level.</p>"
-
-    # -------------------
-    # BAT SPEED SECTION
-    # -------------------
-    if bat_speed_metrics and player_avg_bat_speed is not None:
-        # We can do a bullet list for each metric, preserving your older HTML style.
-        # We assume all relevant variables (player_avg_bat_speed, etc.) are globally set above.
-        grade1 = evaluate_performance(player_avg_bat_speed, bat_speed_benchmark)
-        grade2 = evaluate_performance(top_10_percent_bat_speed, top_90_benchmark)
-        grade3 = evaluate_performance(avg_attack_angle_top_10, attack_angle_benchmark)
-        grade4 = evaluate_performance(avg_time_to_contact, time_to_contact_benchmark, lower_is_better=True)
-
-        email_body += f"""
-        <h3 style="color: black;">Bat Speed Metrics</h3>
-        <ul>
-            <li style="color: {'red' if grade1 == 'Below Average' else 'black'};">
-              <strong>Player Average Bat Speed:</strong> {player_avg_bat_speed:.2f} mph (Benchmark: {bat_speed_benchmark} mph)
-              <br>Player Grade: {grade1}
-            </li>
-            <li style="color: {'red' if grade2 == 'Below Average' else 'black'};">
-              <strong>Top 10% Bat Speed:</strong> {top_10_percent_bat_speed:.2f} mph (Benchmark: {top_90_benchmark} mph)
-              <br>Player Grade: {grade2}
-            </li>
-            <li style="color: {'red' if grade3 == 'Below Average' else 'black'};">
-              <strong>Average Attack Angle (Top 10% Bat Speed Swings):</strong> {avg_attack_angle_top_10:.2f}° (Benchmark: {attack_angle_benchmark}°)
-              <br>Player Grade: {grade3}
-            </li>
-            <li style="color: {'red' if grade4 == 'Below Average' else 'black'};">
-              <strong>Average Time to Contact:</strong> {avg_time_to_contact:.3f} sec (Benchmark: {time_to_contact_benchmark} sec)
-              <br>Player Grade: {grade4}
-            </li>
-        </ul>
-        """
-
-    # ------------------------
-    # EXIT VELOCITY SECTION
-    # ------------------------
-    if exit_velocity_metrics and exit_velocity_avg is not None:
-        grade5 = evaluate_performance(exit_velocity_avg, ev_benchmark, special_metric=True)
-        grade6 = evaluate_performance(top_8_percent_exit_velocity, top_8_benchmark, special_metric=True)
-        grade7 = evaluate_performance(avg_launch_angle_top_8, hhb_la_benchmark)
-        grade8 = evaluate_performance(total_avg_launch_angle, la_benchmark)
-
-        email_body += f"""
-        <h3 style="color: black;">Exit Velocity Metrics</h3>
-        <ul>
-            <li style="color: {'red' if grade5 == 'Below Average' else 'black'};">
-                <strong>Average Exit Velocity (Non-zero EV):</strong> {exit_velocity_avg:.2f} mph (Benchmark: {ev_benchmark} mph)
-                <br>Player Grade: {grade5}
-            </li>
-            <li style="color: {'red' if grade6 == 'Below Average' else 'black'};">
-                <strong>Top 8% Exit Velocity:</strong> {top_8_percent_exit_velocity:.2f} mph (Benchmark: {top_8_benchmark} mph)
-                <br>Player Grade: {grade6}
-            </li>
-            <li style="color: {'red' if grade7 == 'Below Average' else 'black'};">
-                <strong>Average Launch Angle (On Top 8% EV Swings):</strong> {avg_launch_angle_top_8:.2f}° (Benchmark: {hhb_la_benchmark}°)
-                <br>Player Grade: {grade7}
-            </li>
-            <li style="color: {'red' if grade8 == 'Below Average' else 'black'};">
-                <strong>Total Average Launch Angle (Avg LA):</strong> {total_avg_launch_angle:.2f}° (Benchmark: {la_benchmark}°)
-                <br>Player Grade: {grade8}
-            </li>
-            <li style="color: black;">
-                <strong>Average Distance (8% swings):</strong> {avg_distance_top_8:.2f} ft
-            </li>
-        </ul>
-        """
-
-    # If we generated a PNG for the strike zone, embed it
-    if strike_zone_img_html:
-        email_body += strike_zone_img_html
-
-    # Close out the email HTML
-    email_body += """
-        <p style='color: black;'>Best Regards,<br>OTR Baseball</p>
-    </body>
-    </html>
-    """
+    with perf.stage("email.build"):
+        if report is None:
+            email_body = build_email_body(player_name, date_range, bat_speed_level, exit_velocity_level)
+        else:
+            email_body = build_email_body(
+                player_name, date_range, bat_speed_level, exit_velocity_level,
+                report.bat_speed_result, report.exit_velocity_result, report.strike_zone_html(),
+                combined_result=report.combined_result
+            )
 
-    # Attach the HTML to the email
-    msg.attach(MIMEText(email_body, 'html'))
+        # Attach the HTML to the email
+        msg.attach(MIMEText(email_body, 'html'))
 
-    # Attempt sending
+    # Hand the message to the background delivery queue; the outcome is shown
+    # on the next rerun by show_email_deliveries().
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(email_address, email_password)
-            server.send_message(msg)
-        st.success("Report sent successfully!")
-    except Exception as e:
+        future = get_delivery_queue().submit(msg)
+    except DeliveryQueueFull as e:
         st.error(f"Failed to send email: {e}")
+        return
+    st.session_state.setdefault("email_deliveries", []).append((recipient_email, future))
+
+
+def show_email_deliveries():
+    """Report the outcome of emails queued earlier in this session."""
+    deliveries = st.session_state.get("email_deliveries", [])
+    still_pending = []
+    for recipient, future in deliveries:
+        if not future.done():
+            still_pending.append((recipient, future))
+            st.info(f"Sending report to {recipient}...")
+        elif future.exception() is not None:
+            st.error(f"Failed to send email to {recipient}: {future.exception()}")
+        else:
+            st.success(f"Report sent successfully to {recipient}!")
+    st.session_state["email_deliveries"] = still_pending
+
+
+def send_pending_email():
+    """Send an email requested while its report was still running, once the report finishes."""
+    pending = st.session_state.get("pending_email")
+    if pending is None or not pending["job"].done():
+        return
+    # Imported here too: the uploads may be gone by now, so has_data can be False.
+    from jobs import DONE
+
+    del st.session_state["pending_email"]
+    job, request = pending["job"], pending["request"]
+    if job.state != DONE:
+        st.error(f"The report for {pending['recipient']} was not emailed: it {job.state}.")
+        return
+    send_email_report(
+        pending["recipient"],
+        job.result,
+        pending["player_name"],
+        pending["date_range"],
+        request.bat_speed_level,
+        request.exit_velocity_level
+    )
 
 ######################
 # STREAMLIT UI: SEND #
@@ -461,17 +524,77 @@ st.write("## Email the Report")
 recipient_email = st.text_input("Enter Email Address")
 
 if st.button("Send Report"):
-    if recipient_email:
+    if recipient_email and report_job is not None and not report_job.done():
+        st.session_state["pending_email"] = {
+            "recipient": recipient_email, "player_name": player_name, "date_range": date_range,
+            "request": report_request.without_uploads(), "job": report_job,
+        }
+        st.info(f"The report will be emailed to {recipient_email} as soon as it is ready.")
+    elif recipient_email:
         send_email_report(
             recipient_email,
-            bat_speed_metrics,
-            exit_velocity_metrics,
+            report_result,
             player_name,
             date_range,
             bat_speed_level,
-            exit_velocity_level,
-            strike_zone_img_html
+            exit_velocity_level
         )
     else:
         st.error("Please enter a valid email address.")
 
+send_pending_email()
+show_email_deliveries()
+
+#############
+# PRE-WARM  #
+#############
+
+def _prewarm():
+    # Import the engine and plotting stack, build the heatmap template and run
+    # the CSV parser once, so the first upload does not pay for any of it.
+    from io import BytesIO
+
+    import trends  # noqa: F401  (also loads store and metrics)
+    from heatmap import get_renderer
+    from metrics import read_exit_velocity_csv
+
+    get_renderer()
+    read_exit_velocity_csv(BytesIO(b"Strike Zone,Velo,LA,Dist\n5,80,10,200\n"))
+
+
+@st.cache_resource
+def start_prewarm():
+    """
+    Once per server process, after the first page has been sent, warm the
+    heavy modules and caches on a background thread. OTR_PREWARM=0 skips it.
+    """
+    thread = threading.Thread(target=_prewarm, name="otr-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+if os.environ.get("OTR_PREWARM", "1") != "0":
+    start_prewarm()
+
+###############
+# PERFORMANCE #
+###############
+if page_trace is not None:
+    page_trace.finish()
+    with st.expander("Performance"):
+        st.write(f"Sum of timed stages this run: {page_trace.total_seconds * 1000:.1f} ms "
+                 "(SMTP delivery runs in the background and is only logged).")
+        if page_trace.records:
+            st.dataframe(page_trace.as_rows(), use_container_width=True)
+        job_trace = report_job.trace if report_job is not None else None
+        if job_trace is not None:
+            st.write(f"Report job {report_job.job_id}: {job_trace.total_seconds * 1000:.1f} ms of timed stages "
+                     f"on a worker thread, {report_job.elapsed:.2f} s from submission to finish.")
+            if job_trace.records:
+                st.dataframe(job_trace.as_rows(), use_container_width=True)
+            else:
+                st.write("Nothing was recomputed; every result came from a cache.")
+        st.write({
+            name: f"{cache.hits} hits / {cache.misses} misses"
+            for name, cache in (("frames", frame_cache), ("metrics", metrics_cache), ("heatmaps", heatmap_cache))
+        })
@@ -0,0 +1,250 @@
+"""
+Population percentile index.
+
+The grades compare a player to one fixed benchmark per level. This index
+ranks a player against every previously graded player at the same level,
+e.g. "78th percentile for High School average bat speed".
+
+For each (level, report metric) pair it keeps the population's values as a
+sorted float64 array, so a percentile is one `np.searchsorted` call,
+O(log n). Whole rosters are ranked in one vectorized pass per level.
+
+Each population also remembers which player contributed which value. Adding
+players merges them into the sorted arrays without a rebuild (O(n + k)), and
+re-adding a player replaces their earlier value. The index is built from
+stored results (roster CSVs written by batch.py, or metric dataclasses) and
+saved as a single .npz. Usage:
+
+    python percentiles.py add roster.csv [more.csv ...] [--index PATH]
+    python percentiles.py rank roster.csv --out ranked.csv [--index PATH]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from formats import BAT_SPEED, EXIT_VELOCITY
+from metrics import REPORT_METRICS
+from store import DEFAULT_STORE_DIR, player_key
+
+# Report fields ranked per level, grouped by the roster column holding their level.
+PERCENTILE_METRICS = {
+    "bat_speed_level": list(REPORT_METRICS[BAT_SPEED]),
+    "exit_velocity_level": list(REPORT_METRICS[EXIT_VELOCITY]),
+}
+
+# A quicker time to contact is better, so it ranks against slower players.
+LOWER_IS_BETTER = {"avg_time_to_contact"}
+
+DEFAULT_INDEX_PATH = os.environ.get("OTR_PERCENTILE_INDEX", os.path.join(DEFAULT_STORE_DIR, "percentiles.npz"))
+
+
+def _delete_values(sorted_values, removed):
+    """Remove one occurrence of each value in removed from a sorted array."""
+    if not len(removed):
+        return sorted_values
+    distinct, counts = np.unique(removed, return_counts=True)
+    starts = np.searchsorted(sorted_values, distinct, side='left')
+    positions = np.concatenate([np.arange(s, s + c) for s, c in zip(starts, counts)])
+    return np.delete(sorted_values, positions)
+
+
+class _Population:
+    __slots__ = ("values", "by_player")
+
+    def __init__(self, values=None, by_player=None):
+        self.values = np.empty(0, dtype=np.float64) if values is None else values
+        self.by_player = {} if by_player is None else by_player
+
+    def update(self, players, values):
+        # Last value wins when a player appears more than once in one update.
+        incoming = dict(zip(players, values))
+        replaced = np.array([self.by_player[p] for p in incoming if p in self.by_player], dtype=np.float64)
+        new = np.sort(np.fromiter(incoming.values(), dtype=np.float64, count=len(incoming)))
+        kept = _delete_values(self.values, replaced)
+        self.values = np.insert(kept, np.searchsorted(kept, new), new)
+        self.by_player.update(incoming)
+
+
+class PercentileIndex:
+    """Sorted per-(level, metric) populations answering percentile queries."""
+
+    def __init__(self):
+        self._populations = {}
+        self._lock = threading.Lock()
+
+    ############
+    # UPDATES  #
+    ############
+
+    def add(self, level, metric, players, values):
+        """
+        Add (or replace) each player's value for metric at level. Missing
+        values are skipped.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values)
+        keys = [player_key(str(p)) for p, k in zip(players, keep) if k]
+        if not keys:
+            return
+        with self._lock:
+            population = self._populations.setdefault((level, metric), _Population())
+            population.update(keys, values[keep])
+
+    def add_roster(self, roster):
+        """Add every graded player of a batch.py roster DataFrame."""
+        for level_column, metrics in PERCENTILE_METRICS.items():
+            if level_column not in roster.columns:
+                continue
+            graded = roster[roster[level_column].notna()]
+            for level, group in graded.groupby(level_column):
+                for metric in metrics:
+                    if metric in group.columns:
+                        self.add(level, metric, group["player"], pd.to_numeric(group[metric], errors='coerce'))
+
+    def add_result(self, player, result):
+        """Add one player's BatSpeedMetrics or ExitVelocityMetrics."""
+        for metric in _result_metrics(result):
+            self.add(result.level, metric, [player], [getattr(result, metric)])
+
+    ############
+    # QUERIES  #
+    ############
+
+    def count(self, level, metric):
+        population = self._populations.get((level, metric))
+        return 0 if population is None else len(population.values)
+
+    def levels(self):
+        return sorted({level for level, _ in self._populations})
+
+    def percentiles(self, levels, metric, values):
+        """
+        Percentile (0-100) of each value within its level's population:
+        the share of players at or below it, or at or above it for
+        lower-is-better metrics. levels is one level or one per value. NaN
+        for missing values and for levels with no population.
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if np.ndim(levels) == 0:
+            codes, uniques = np.zeros(len(values), dtype=np.int64), [levels]
+        else:
+            codes, uniques = pd.factorize(np.asarray(levels, dtype=object))
+
+        out = np.full(len(values), np.nan)
+        for code, level in enumerate(uniques):
+            population = self._populations.get((level, metric))
+            if population is None or not len(population.values):
+                continue
+            rows = np.flatnonzero((codes == code) & ~np.isnan(values))
+            out[rows] = _rank(population.values, metric, values[rows])
+        return out
+
+    def percentile(self, level, metric, value):
+        population = self._populations.get((level, metric))
+        if population is None or not len(population.values) or value is None or np.isnan(value):
+            return np.nan
+        return float(_rank(population.values, metric, value))
+
+    def result_percentiles(self, result):
+        """{metric: percentile} for a BatSpeedMetrics or ExitVelocityMetrics."""
+        return {
+            metric: self.percentile(result.level, metric, getattr(result, metric))
+            for metric in _result_metrics(result)
+        }
+
+    def rank_roster(self, roster):
+        """A copy of a batch.py roster with a <metric>_percentile column per ranked metric."""
+        ranked = roster.copy()
+        for level_column, metrics in PERCENTILE_METRICS.items():
+            if level_column not in roster.columns:
+                continue
+            for metric in metrics:
+                if metric in roster.columns:
+                    ranked[metric + "_percentile"] = self.percentiles(
+                        roster[level_column].to_numpy(dtype=object), metric,
+                        pd.to_numeric(roster[metric], errors='coerce'),
+                    )
+        return ranked
+
+    ##################
+    # SERIALIZATION  #
+    ##################
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        with self._lock:
+            arrays = {"keys": np.array([json.dumps(key) for key in self._populations], dtype=str)}
+            for i, population in enumerate(self._populations.values()):
+                arrays[f"values_{i}"] = population.values
+                arrays[f"players_{i}"] = np.array(list(population.by_player), dtype=str)
+                arrays[f"player_values_{i}"] = np.fromiter(population.by_player.values(), dtype=np.float64)
+        # Write-then-rename so readers never load a half-written index.
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        """Load a saved index; a missing file gives an empty index."""
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with np.load(path) as saved:
+            for i, key in enumerate(saved["keys"]):
+                level, metric = json.loads(key)
+                index._populations[(level, metric)] = _Population(
+                    saved[f"values_{i}"],
+                    dict(zip(saved[f"players_{i}"].tolist(), saved[f"player_values_{i}"].tolist())),
+                )
+        return index
+
+
+def _rank(sorted_values, metric, values):
+    n = len(sorted_values)
+    if metric in LOWER_IS_BETTER:
+        return 100.0 * (n - np.searchsorted(sorted_values, values, side='left')) / n
+    return 100.0 * np.searchsorted(sorted_values, values, side='right') / n
+
+
+def _result_metrics(result):
+    for metrics in PERCENTILE_METRICS.values():
+        if hasattr(result, metrics[0]):
+            return metrics
+    raise TypeError(f"Cannot rank a {type(result).__name__}.")
+
+
+def main(argv=None):
+    # --index goes after the command, as in the usage above.
+    index_option = argparse.ArgumentParser(add_help=False)
+    index_option.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index file (.npz)")
+
+    parser = argparse.ArgumentParser(description="Build or query the population percentile index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", parents=[index_option], help="Add graded rosters from batch.py to the index")
+    add.add_argument("rosters", nargs="+")
+    rank = commands.add_parser("rank", parents=[index_option], help="Add percentile columns to a roster")
+    rank.add_argument("roster")
+    rank.add_argument("--out", required=True)
+    args = parser.parse_args(argv)
+
+    index = PercentileIndex.load(args.index)
+    if args.command == "add":
+        for path in args.rosters:
+            index.add_roster(pd.read_csv(path))
+        index.save(args.index)
+        for level in index.levels():
+            sizes = {m: index.count(level, m) for ms in PERCENTILE_METRICS.values() for m in ms}
+            print(f"{level}: {max(sizes.values())} players")
+    else:
+        index.rank_roster(pd.read_csv(args.roster)).to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Lightweight per-stage timing.
+
+Wrap a stage of the report pipeline in `perf.stage(name)` and optionally set
+the number of rows it handled:
+
+    with perf.stage("parse.bat_speed") as timer:
+        df = pd.read_csv(...)
+        timer.rows = len(df)
+
+Each finished stage becomes a StageRecord. The record is added to the
+current Trace, if one is open: the page opens one per rerun and shows it in
+its "Performance" expander. It also goes to whichever sinks are configured:
+
+- OTR_PERF_LOG:  path of a JSON-lines log, one object per stage;
+- OTR_PERF_PROM: path of a Prometheus text-format file of per-stage totals,
+  rewritten atomically for the node exporter's textfile collector. Totals are
+  per process, so give batch worker processes their own file if they need one.
+
+With no trace open and no sink configured, stage() returns a shared no-op
+object. A disabled stage costs one function call, so the instrumentation can
+stay in hot paths. Only the standard library is used.
+"""
+import contextvars
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+
+
+@dataclass(frozen=True)
+class StageRecord:
+    stage: str
+    seconds: float
+    rows: int = None
+    error: str = None
+
+
+class Trace:
+    """Stage records collected while this trace is current (one page run)."""
+
+    __slots__ = ("trace_id", "records", "_token")
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.records = []
+        self._token = None
+
+    @property
+    def total_seconds(self):
+        return sum(record.seconds for record in self.records)
+
+    def as_rows(self):
+        """Records as plain dicts with milliseconds, ready for st.dataframe."""
+        return [
+            {"stage": r.stage, "ms": round(r.seconds * 1000, 2), "rows": r.rows, "error": r.error}
+            for r in self.records
+        ]
+
+    def finish(self):
+        """Stop collecting into this trace and refresh the Prometheus file."""
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        _write_prometheus()
+
+
+_current = contextvars.ContextVar("otr_perf_trace", default=None)
+
+
+def begin_trace():
+    """Start a Trace and make it current for this thread until finish()."""
+    trace = Trace()
+    trace._token = _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+###########
+# STAGES  #
+###########
+
+class _NullStage:
+    __slots__ = ()
+
+    # Accept and drop `timer.rows = n` so call sites never check enabled().
+    rows = property(lambda self: None, lambda self, value: None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "rows", "_start")
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        rows = None if self.rows is None else int(self.rows)
+        _record(StageRecord(self.name, seconds, rows, exc_type.__name__ if exc_type else None))
+        return False
+
+
+def stage(name, rows=None):
+    """Time the enclosed block as `name`; a no-op when nothing would record it."""
+    if not _sinks_enabled and _current.get() is None:
+        return _NULL_STAGE
+    return _Stage(name, rows)
+
+
+##########
+# SINKS  #
+##########
+
+_lock = threading.Lock()
+_log_path = None
+_prom_path = None
+_sinks_enabled = False
+# stage -> [calls, seconds, rows, errors] since the process started
+_totals = {}
+
+
+def configure(log_path=None, prom_path=None):
+    """Set (or with no arguments, clear) the JSON-lines and Prometheus sinks."""
+    global _log_path, _prom_path, _sinks_enabled
+    with _lock:
+        _log_path = log_path or None
+        _prom_path = prom_path or None
+        _sinks_enabled = bool(_log_path or _prom_path)
+
+
+def enabled():
+    return _sinks_enabled
+
+
+def _record(record):
+    trace = _current.get()
+    if trace is not None:
+        trace.records.append(record)
+    if not _sinks_enabled:
+        return
+
+    with _lock:
+        totals = _totals.setdefault(record.stage, [0, 0.0, 0, 0])
+        totals[0] += 1
+        totals[1] += record.seconds
+        totals[2] += record.rows or 0
+        totals[3] += record.error is not None
+        if _log_path:
+            entry = dict(
+                asdict(record),
+                ts=datetime.datetime.now().isoformat(timespec="milliseconds"),
+                trace=trace.trace_id if trace is not None else None,
+                pid=os.getpid(),
+                thread=threading.current_thread().name,
+            )
+            with open(_log_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    # Stages outside a page run (e.g. SMTP delivery threads) have no finish()
+    # to flush them, so refresh the totals file right away.
+    if trace is None:
+        _write_prometheus()
+
+
+_PROM_METRICS = [
+    ("otr_stage_calls_total", "counter", "Times each report stage ran.", 0),
+    ("otr_stage_seconds_total", "counter", "Seconds spent in each report stage.", 1),
+    ("otr_stage_rows_total", "counter", "Rows processed by each report stage.", 2),
+    ("otr_stage_errors_total", "counter", "Report stage runs that raised.", 3),
+]
+
+
+def prometheus_text():
+    """Current per-stage totals in the Prometheus text exposition format."""
+    with _lock:
+        totals = {name: list(values) for name, values in sorted(_totals.items())}
+    lines = []
+    for metric, kind, help_text, i in _PROM_METRICS:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, values in totals.items():
+            lines.append(f'{metric}{{stage="{name}"}} {values[i]}')
+    return "\n".join(lines) + "\n"
+
+
+def _write_prometheus():
+    path = _prom_path
+    if not path:
+        return
+    text = prometheus_text()
+    # Write-then-rename so the collector never scrapes a half-written file.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".prom.tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+configure(os.environ.get("OTR_PERF_LOG"), os.environ.get("OTR_PERF_PROM"))
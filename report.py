@@ -0,0 +1,130 @@
+"""
+Report email body.
+
+Builds the HTML emailed to players and coaches from the metric dataclasses in
+metrics.py. Kept free of Streamlit and smtplib so the page, batch jobs and the
+benchmark suite all build the exact same body.
+"""
+
+
+def _color(grade):
+    return 'red' if grade == 'Below Average' else 'black'
+
+
+def build_email_body(player_name, date_range, bat_speed_level, exit_velocity_level,
+                     bat_speed_result=None, exit_velocity_result=None, strike_zone_img_html="",
+                     combined_result=None):
+    """
+    HTML body of the report email. Any result may be None, in which case
+    its section is left out; strike_zone_img_html is appended when present.
+    """
+    email_body = f"""
+    <html>
+    <body style="color: black; background-color: white;">
+        <h2 style="color: black;">OTR Metrics Report</h2>
+        <p style="color: black;"><strong>Player Name:</strong> {player_name}</p>
+        <p style="color: black;"><strong>Date Range:</strong> {date_range}</p>
+    """
+
+    # If we have Bat Speed metrics, we mention the level
+    if bat_speed_result is not None:
+        email_body += f"<p style='color: black;'><strong>Bat Speed Level:</strong> {bat_speed_level}</p>"
+
+    # If we have Exit Velocity metrics, we mention the level
+    if exit_velocity_result is not None:
+        email_body += f"<p style='color: black;'><strong>Exit Velocity Level:</strong> {exit_velocity_level}</p>"
+
+    # Add a statement about benchmarks
+    email_body += "<p style='color: black;'>The following data is constructed with benchmarks for each level.</p>"
+
+    # -------------------
+    # BAT SPEED SECTION
+    # -------------------
+    if bat_speed_result is not None:
+        m = bat_speed_result
+        email_body += f"""
+        <h3 style="color: black;">Bat Speed Metrics</h3>
+        <ul>
+            <li style="color: {_color(m.avg_bat_speed_grade)};">
+              <strong>Player Average Bat Speed:</strong> {m.avg_bat_speed:.2f} mph (Benchmark: {m.bat_speed_benchmark} mph)
+              <br>Player Grade: {m.avg_bat_speed_grade}
+            </li>
+            <li style="color: {_color(m.top_10_percent_bat_speed_grade)};">
+              <strong>Top 10% Bat Speed:</strong> {m.top_10_percent_bat_speed:.2f} mph (Benchmark: {m.top_90_benchmark} mph)
+              <br>Player Grade: {m.top_10_percent_bat_speed_grade}
+            </li>
+            <li style="color: {_color(m.avg_attack_angle_top_10_grade)};">
+              <strong>Average Attack Angle (Top 10% Bat Speed Swings):</strong> {m.avg_attack_angle_top_10:.2f}° (Benchmark: {m.attack_angle_benchmark}°)
+              <br>Player Grade: {m.avg_attack_angle_top_10_grade}
+            </li>
+            <li style="color: {_color(m.avg_time_to_contact_grade)};">
+              <strong>Average Time to Contact:</strong> {m.avg_time_to_contact:.3f} sec (Benchmark: {m.time_to_contact_benchmark} sec)
+              <br>Player Grade: {m.avg_time_to_contact_grade}
+            </li>
+        </ul>
+        """
+
+    # ------------------------
+    # EXIT VELOCITY SECTION
+    # ------------------------
+    if exit_velocity_result is not None:
+        m = exit_velocity_result
+        email_body += f"""
+        <h3 style="color: black;">Exit Velocity Metrics</h3>
+        <ul>
+            <li style="color: {_color(m.avg_exit_velocity_grade)};">
+                <strong>Average Exit Velocity (Non-zero EV):</strong> {m.avg_exit_velocity:.2f} mph (Benchmark: {m.ev_benchmark} mph)
+                <br>Player Grade: {m.avg_exit_velocity_grade}
+            </li>
+            <li style="color: {_color(m.top_8_percent_exit_velocity_grade)};">
+                <strong>Top 8% Exit Velocity:</strong> {m.top_8_percent_exit_velocity:.2f} mph (Benchmark: {m.top_8_benchmark} mph)
+                <br>Player Grade: {m.top_8_percent_exit_velocity_grade}
+            </li>
+            <li style="color: {_color(m.avg_launch_angle_top_8_grade)};">
+                <strong>Average Launch Angle (On Top 8% EV Swings):</strong> {m.avg_launch_angle_top_8:.2f}° (Benchmark: {m.hhb_la_benchmark}°)
+                <br>Player Grade: {m.avg_launch_angle_top_8_grade}
+            </li>
+            <li style="color: {_color(m.total_avg_launch_angle_grade)};">
+                <strong>Total Average Launch Angle (Avg LA):</strong> {m.total_avg_launch_angle:.2f}° (Benchmark: {m.la_benchmark}°)
+                <br>Player Grade: {m.total_avg_launch_angle_grade}
+            </li>
+            <li style="color: black;">
+                <strong>Average Distance (8% swings):</strong> {m.avg_distance_top_8:.2f} ft
+            </li>
+        </ul>
+        """
+
+    # ------------------------
+    # COMBINED SWING SECTION
+    # ------------------------
+    if combined_result is not None:
+        m = combined_result
+        email_body += f"""
+        <h3 style="color: black;">Combined Swing Metrics</h3>
+        <ul>
+            <li style="color: black;">
+                <strong>Matched Swings:</strong> {m.matched_swings} of {m.bat_swings} ({m.match_rate:.0%})
+            </li>
+            <li style="color: black;">
+                <strong>Average Smash Factor (EV / Bat Speed):</strong> {m.avg_smash_factor:.2f}
+            </li>
+            <li style="color: black;">
+                <strong>Average Exit Velocity (Top 10% Bat Speed Swings):</strong> {m.avg_exit_velocity_top_10_bat_speed:.2f} mph
+            </li>
+            <li style="color: black;">
+                <strong>Squared-Up Rate:</strong> {m.squared_up_rate:.0%}
+            </li>
+        </ul>
+        """
+
+    # If we generated a PNG for the strike zone, embed it
+    if strike_zone_img_html:
+        email_body += strike_zone_img_html
+
+    # Close out the email HTML
+    email_body += """
+        <p style='color: black;'>Best Regards,<br>OTR Baseball</p>
+    </body>
+    </html>
+    """
+    return email_body
@@ -0,0 +1,265 @@
+"""
+Persistent columnar swing store.
+
+Each uploaded Bat Speed or Exit Velocity file is ingested once into an
+append-only directory of NumPy column files, partitioned by player and
+session date:
+
+    <root>/manifest.json
+    <root>/<kind>/<player>/<YYYY-MM-DD>/<file digest>/<column>.npy
+
+The manifest records every ingested file by content digest, so uploading the
+same export again is a no-op. Reports for a date range load just the needed
+columns of the matching partitions (memory-mapped) and feed them to the
+array entry points in metrics.py, without touching the original CSVs.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import perf
+from bootstrap import bat_speed_intervals_from_arrays, exit_velocity_intervals_from_arrays
+from formats import BAT_SPEED, EXIT_VELOCITY
+from metrics import (
+    ATTACK_ANGLE_COL,
+    BAT_SPEED_COL,
+    DISTANCE_COL,
+    EXIT_VELOCITY_COL,
+    LAUNCH_ANGLE_COL,
+    STRIKE_ZONE_COL,
+    TIME_TO_CONTACT_COL,
+    ExitVelocityDataError,
+    bat_speed_metrics_from_arrays,
+    exit_velocity_metrics_from_arrays,
+    read_bat_speed_csv,
+    read_exit_velocity_csv,
+    zone_stats_from_sums,
+    zone_sums,
+)
+
+# Stored columns per kind: parsed frame columns, one <column>.npy file each.
+STORE_COLUMNS = {
+    BAT_SPEED: (BAT_SPEED_COL, ATTACK_ANGLE_COL, TIME_TO_CONTACT_COL),
+    EXIT_VELOCITY: (STRIKE_ZONE_COL, EXIT_VELOCITY_COL, LAUNCH_ANGLE_COL, DISTANCE_COL),
+}
+
+DEFAULT_STORE_DIR = os.environ.get("OTR_STORE_DIR", "swing_store")
+
+
+def player_key(player):
+    """Case- and whitespace-insensitive key used for a player's directory."""
+    key = re.sub(r"\s+", " ", player).strip().casefold()
+    return re.sub(r"[^\w\- ]+", "_", key).replace(" ", "_")
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+class SwingStore:
+    """Append-only, deduplicated store of per-swing columns."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._manifest_path = os.path.join(root, "manifest.json")
+        self._manifest = self._read_manifest()
+
+    ##############
+    # MANIFEST   #
+    ##############
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path):
+            return {"files": {}}
+        with open(self._manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        # Write-then-rename so a crash never leaves a half-written manifest.
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path)
+
+    def contains(self, digest):
+        return digest in self._manifest["files"]
+
+    def sessions(self, player=None, kind=None, start=None, end=None):
+        """
+        Ingested files as a DataFrame (digest, player, kind, session_date, rows),
+        optionally filtered by player, kind and inclusive session date range.
+        """
+        rows = [dict(entry, digest=digest) for digest, entry in self._manifest["files"].items()]
+        sessions = pd.DataFrame(rows, columns=["digest", "player", "kind", "session_date", "rows", "ingested_at"])
+        if player is not None:
+            sessions = sessions[sessions["player"].map(player_key) == player_key(player)]
+        if kind is not None:
+            sessions = sessions[sessions["kind"] == kind]
+        if start is not None:
+            sessions = sessions[sessions["session_date"] >= _as_date(start).isoformat()]
+        if end is not None:
+            sessions = sessions[sessions["session_date"] <= _as_date(end).isoformat()]
+        return sessions.sort_values(["session_date", "ingested_at"]).reset_index(drop=True)
+
+    def players(self):
+        return sorted({entry["player"] for entry in self._manifest["files"].values()})
+
+    ##############
+    # INGESTION  #
+    ##############
+
+    def _partition_dir(self, kind, player, session_date, digest):
+        return os.path.join(self.root, kind, player_key(player), session_date.isoformat(), digest)
+
+    def add_frame(self, kind, df, player, session_date, digest):
+        """
+        Store the metric columns of an already parsed export. Returns False
+        (and writes nothing) when a file with this digest was stored before.
+        """
+        session_date = _as_date(session_date)
+        columns = STORE_COLUMNS[kind]
+        if not set(columns).issubset(df.columns):
+            if kind == EXIT_VELOCITY:
+                raise ExitVelocityDataError("The uploaded file does not have the required columns for Exit Velocity.")
+            raise ValueError("The uploaded file does not have the required columns for Bat Speed.")
+
+        with self._lock:
+            if self.contains(digest):
+                return False
+
+            partition = self._partition_dir(kind, player, session_date, digest)
+            tmp_dir = tempfile.mkdtemp(dir=self.root, prefix=".ingest-")
+            try:
+                for name in columns:
+                    values = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+                    np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+                os.makedirs(os.path.dirname(partition), exist_ok=True)
+                os.replace(tmp_dir, partition)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+
+            self._manifest["files"][digest] = {
+                "player": player.strip(),
+                "kind": kind,
+                "session_date": session_date.isoformat(),
+                "rows": len(df),
+                "ingested_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            }
+            self._write_manifest()
+            return True
+
+    def add_file(self, kind, source, player, session_date):
+        """
+        Parse and store an export (path or file-like). Re-uploads are detected
+        from the file bytes before any parsing. Returns (digest, added).
+        """
+        if hasattr(source, "read"):
+            data = source.getvalue() if hasattr(source, "getvalue") else source.read()
+        else:
+            with open(source, "rb") as f:
+                data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if self.contains(digest):
+            return digest, False
+
+        read = read_bat_speed_csv if kind == BAT_SPEED else read_exit_velocity_csv
+        return digest, self.add_frame(kind, read(BytesIO(data)), player, session_date, digest)
+
+    ############
+    # QUERIES  #
+    ############
+
+    def load(self, kind, player, start=None, end=None, columns=None):
+        """
+        Concatenate the stored columns for one player between start and end
+        (inclusive dates, either may be None). Returns {column: float array}.
+        """
+        columns = list(columns or STORE_COLUMNS[kind])
+        sessions = self.sessions(player, kind, start, end)
+
+        with perf.stage("store.load") as timer:
+            parts = {name: [] for name in columns}
+            for session in sessions.itertuples():
+                data = self.load_session(kind, session.player, session.session_date, session.digest, columns)
+                for name in columns:
+                    parts[name].append(data[name])
+            loaded = {
+                name: np.concatenate(arrays) if arrays else np.empty(0, dtype=np.float64)
+                for name, arrays in parts.items()
+            }
+            timer.rows = len(loaded[columns[0]])
+        return loaded
+
+    def load_session(self, kind, player, session_date, digest, columns=None):
+        """Memory-mapped columns of one stored file. Returns {column: array}."""
+        partition = self._partition_dir(kind, player, _as_date(session_date), digest)
+        return {
+            name: np.load(os.path.join(partition, f"{name}.npy"), mmap_mode="r")
+            for name in (columns or STORE_COLUMNS[kind])
+        }
+
+    def bat_speed_metrics(self, player, level, start=None, end=None):
+        """BatSpeedMetrics over every stored swing for player in the date range."""
+        data = self.load(BAT_SPEED, player, start, end)
+        if not len(data["bat_speed"]):
+            raise LookupError(f"No stored Bat Speed sessions for {player} in that date range.")
+        with perf.stage("metrics.bat_speed", rows=len(data["bat_speed"])):
+            return bat_speed_metrics_from_arrays(
+                data["bat_speed"], data["attack_angle"], data["time_to_contact"], level
+            )
+
+    def exit_velocity_metrics(self, player, level, start=None, end=None):
+        """ExitVelocityMetrics over every stored swing for player in the date range."""
+        data = self.load(EXIT_VELOCITY, player, start, end)
+        if not len(data["exit_velocity"]):
+            raise LookupError(f"No stored Exit Velocity sessions for {player} in that date range.")
+        with perf.stage("metrics.exit_velocity", rows=len(data["exit_velocity"])):
+            return exit_velocity_metrics_from_arrays(
+                data["exit_velocity"], data["launch_angle"], data["distance"], level
+            )
+
+    def bat_speed_intervals(self, player, level, start=None, end=None, **kwargs):
+        """Bootstrap intervals (see bootstrap.py) for bat_speed_metrics() over the same swings."""
+        data = self.load(BAT_SPEED, player, start, end)
+        if not len(data["bat_speed"]):
+            raise LookupError(f"No stored Bat Speed sessions for {player} in that date range.")
+        return bat_speed_intervals_from_arrays(
+            data["bat_speed"], data["attack_angle"], data["time_to_contact"], level, **kwargs
+        )
+
+    def exit_velocity_intervals(self, player, level, start=None, end=None, **kwargs):
+        """Bootstrap intervals (see bootstrap.py) for exit_velocity_metrics() over the same swings."""
+        data = self.load(EXIT_VELOCITY, player, start, end)
+        if not len(data["exit_velocity"]):
+            raise LookupError(f"No stored Exit Velocity sessions for {player} in that date range.")
+        return exit_velocity_intervals_from_arrays(
+            data["exit_velocity"], data["launch_angle"], data["distance"], level, **kwargs
+        )
+
+    def zone_stats(self, player, start=None, end=None):
+        """Per-zone stats (see metrics.compute_zone_stats) for player in the date range."""
+        data = self.load(EXIT_VELOCITY, player, start, end)
+        with perf.stage("zone_aggregation", rows=len(data["exit_velocity"])):
+            return zone_stats_from_sums(zone_sums(
+                data["strike_zone"], data["exit_velocity"], data["launch_angle"], data["distance"]
+            ))
+
+    def zone_averages(self, player, start=None, end=None):
+        """Mean non-zero EV per strike zone for player in the date range."""
+        return self.zone_stats(player, start, end)["avg_exit_velocity"].dropna()
@@ -0,0 +1,55 @@
+import zipfile
+
+import pytest
+
+from batch import BAT_SPEED, DUPLICATES, discover_player_files, grade_roster
+
+BLAST_CSV = (
+    "Blast Motion export\n"
+    "Date,Bat Speed (mph),Attack Angle (deg),Time to Contact (sec)\n"
+    "2024-05-01 10:00:00,{speed},10.0,0.150\n"
+    "2024-05-01 10:00:45,{speed},12.0,0.160\n"
+)
+HITTRAX_CSV = "#,Strike Zone,Velo,LA,Dist\n1,5,80,10,200\n2,6,90,20,300\n"
+
+
+def write_exports(root, files):
+    for name, text in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+@pytest.mark.parametrize("files", [
+    # Told apart by file name...
+    {"Jane Doe - Bat Speed.csv": BLAST_CSV.format(speed=60.0),
+     "Jane Doe - Blast.csv": BLAST_CSV.format(speed=70.0),
+     "Jane Doe - Exit Velocity.csv": HITTRAX_CSV},
+    # ...or by sniffing the header, in a per-player folder.
+    {"Jane Doe/session_1.csv": BLAST_CSV.format(speed=60.0),
+     "Jane Doe/session_2.csv": BLAST_CSV.format(speed=70.0),
+     "Jane Doe/hittrax.csv": HITTRAX_CSV},
+])
+@pytest.mark.parametrize("as_zip", [False, True])
+def test_two_blast_exports_for_one_player_are_reported(tmp_path, files, as_zip):
+    exports = tmp_path / "exports"
+    write_exports(exports, files)
+    source = str(exports)
+    if as_zip:
+        source = str(tmp_path / "exports.zip")
+        with zipfile.ZipFile(source, "w") as archive:
+            for name in files:
+                archive.write(exports / name, name)
+
+    players = discover_player_files(source)
+    assert list(players) == ["Jane Doe"]
+    assert len(players["Jane Doe"][DUPLICATES][BAT_SPEED]) == 2
+
+    row = grade_roster(source, "High School", "Var/18u", workers=1).iloc[0]
+    assert "bat speed: 2 exports found" in row["error"]
+    bat_speed_names = [name for name in files if "Exit" not in name and "hittrax" not in name]
+    for name in bat_speed_names:
+        assert name.split("/")[-1] in row["bat_speed_file"]
+    # Neither Bat Speed export is graded; the Exit Velocity one still is.
+    assert "avg_bat_speed" not in row.index
+    assert row["avg_exit_velocity"] == 85.0
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_cli(*args):
+    return subprocess.run(
+        [sys.executable, os.path.join(REPO, "percentiles.py"), *args],
+        capture_output=True, text=True, check=True,
+    )
+
+
+def test_add_then_rank_with_index_after_command(tmp_path):
+    roster = pd.DataFrame({
+        "player": ["A", "B", "C", "D"],
+        "bat_speed_level": ["High School"] * 4,
+        "avg_bat_speed": [60.0, 62.0, 64.0, 66.0],
+        "avg_time_to_contact": [0.17, 0.16, 0.15, 0.14],
+    })
+    roster_path = tmp_path / "roster.csv"
+    roster.to_csv(roster_path, index=False)
+    index_path = tmp_path / "index.npz"
+    ranked_path = tmp_path / "ranked.csv"
+
+    added = run_cli("add", str(roster_path), "--index", str(index_path))
+    assert "High School: 4 players" in added.stdout
+    assert index_path.exists()
+
+    run_cli("rank", str(roster_path), "--out", str(ranked_path), "--index", str(index_path))
+    ranked = pd.read_csv(ranked_path)
+    assert ranked["avg_bat_speed_percentile"].tolist() == [25.0, 50.0, 75.0, 100.0]
+    # Quicker time to contact ranks higher.
+    assert ranked["avg_time_to_contact_percentile"].tolist() == [25.0, 50.0, 75.0, 100.0]
@@ -0,0 +1,233 @@
+"""
+Incremental longitudinal trends over stored sessions.
+
+Each stored session is reduced once to a small, mergeable SessionAggregate.
+The aggregate holds:
+- counts and sums for the means;
+- a 0.1-wide histogram of bat speed or non-zero EV, which serves as a
+  quantile sketch;
+- per-bin sums of the columns the report averages over the top of that
+  distribution (attack angle, launch angle, distance).
+
+Aggregates add and subtract, so weekly, rolling-window and cumulative metrics
+come from summing aggregates. Nothing is recomputed from swings. Adding a
+session costs O(its swings) plus O(bins) per trend row.
+
+The sketch treats every bin as a point at its centre. Device exports round
+to 0.1 mph, so each distinct value gets its own bin and the percentiles match
+the per-file report. Unrounded data is within half a bin (0.05 mph).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from metrics import (
+    REPORT_METRICS,
+    build_bat_speed_metrics,
+    build_exit_velocity_metrics,
+    grade_metric_array,
+    lerp,
+    quantile_position,
+)
+from store import BAT_SPEED, EXIT_VELOCITY, player_key
+
+SKETCH_WIDTH = 0.1
+SKETCH_BINS = 2000          # bin i is centred on i * 0.1, covering 0 - 200 mph
+_SKETCH_CENTRES = np.round(np.arange(SKETCH_BINS) * SKETCH_WIDTH, 1)
+
+# Rows of SessionAggregate.bins per kind: primary count, then a sum/count pair
+# per secondary column averaged over the top of the primary's distribution.
+_SECONDARIES = {
+    BAT_SPEED: ["attack_angle"],
+    EXIT_VELOCITY: ["launch_angle", "distance"],
+}
+
+# Report metrics tracked over time (the graded ones), with the benchmark each
+# one is graded against.
+TREND_METRICS = {
+    kind: {name: benchmark for name, benchmark in metrics.items() if benchmark is not None}
+    for kind, metrics in REPORT_METRICS.items()
+}
+
+
+def _sketch_index(values):
+    idx = np.floor(values / SKETCH_WIDTH + 0.5)
+    return np.clip(idx, 0, SKETCH_BINS - 1).astype(np.int64)
+
+
+def _mean(total, count):
+    return total / count if count else np.nan
+
+
+class SessionAggregate:
+    """
+    Mergeable summary of one or more sessions.
+
+    bins:   (1 + 2 * n_secondary, SKETCH_BINS) array. Row 0 counts primary
+            values per bin; then a (sum, count) row pair per secondary column.
+    totals: [primary sum, extra sum, extra count] where "extra" is time to
+            contact for bat speed and positive launch angle for exit velocity.
+    """
+
+    __slots__ = ("kind", "bins", "totals")
+
+    def __init__(self, kind, bins, totals):
+        self.kind = kind
+        self.bins = bins
+        self.totals = totals
+
+    @classmethod
+    def empty(cls, kind):
+        rows = 1 + 2 * len(_SECONDARIES[kind])
+        return cls(kind, np.zeros((rows, SKETCH_BINS)), np.zeros(3))
+
+    @classmethod
+    def from_columns(cls, kind, data):
+        """Build the aggregate for one session from its stored columns."""
+        if kind == BAT_SPEED:
+            primary = data["bat_speed"]
+            keep = ~np.isnan(primary)
+            secondaries = [data["attack_angle"]]
+            extra = data["time_to_contact"]
+            extra = extra[~np.isnan(extra)]
+        else:
+            primary = data["exit_velocity"]
+            keep = primary > 0
+            secondaries = [data["launch_angle"], data["distance"]]
+            extra = data["launch_angle"]
+            extra = extra[extra > 0]
+
+        primary = primary[keep]
+        idx = _sketch_index(primary)
+        rows = [np.bincount(idx, minlength=SKETCH_BINS)]
+        for values in secondaries:
+            values = values[keep]
+            present = ~np.isnan(values)
+            rows.append(np.bincount(idx, weights=np.where(present, values, 0.0), minlength=SKETCH_BINS))
+            rows.append(np.bincount(idx, weights=present, minlength=SKETCH_BINS))
+        totals = np.array([primary.sum(), extra.sum(), len(extra)], dtype=np.float64)
+        return cls(kind, np.vstack(rows).astype(np.float64), totals)
+
+    def __add__(self, other):
+        return SessionAggregate(self.kind, self.bins + other.bins, self.totals + other.totals)
+
+    def __sub__(self, other):
+        return SessionAggregate(self.kind, self.bins - other.bins, self.totals - other.totals)
+
+    @property
+    def count(self):
+        return int(round(self.bins[0].sum()))
+
+    def quantile_tail(self, q):
+        """
+        Linearly interpolated quantile q from the sketch, plus the mean of
+        each secondary column over bins at or above it.
+        """
+        n = self.count
+        n_secondary = (len(self.bins) - 1) // 2
+        if not n:
+            return np.nan, [np.nan] * n_secondary
+        counts = self.bins[0]
+        cumulative = np.cumsum(counts)
+        lower, upper, fraction = quantile_position(n, q)
+        low, high = _SKETCH_CENTRES[np.searchsorted(cumulative, [lower, upper], side='right')]
+        quantile = lerp(low, high, fraction)
+
+        top = _SKETCH_CENTRES >= quantile
+        means = [
+            _mean(self.bins[1 + 2 * i][top].sum(), self.bins[2 + 2 * i][top].sum())
+            for i in range(n_secondary)
+        ]
+        return quantile, means
+
+    def metrics(self, level):
+        """The report's metric dataclass for everything in this aggregate."""
+        primary_mean = _mean(self.totals[0], self.count)
+        extra_mean = _mean(self.totals[1], self.totals[2])
+        if self.kind == BAT_SPEED:
+            top, (attack_angle,) = self.quantile_tail(0.90)
+            return build_bat_speed_metrics(level, primary_mean, top, attack_angle, extra_mean)
+        top, (launch_angle, distance) = self.quantile_tail(0.92)
+        return build_exit_velocity_metrics(level, primary_mean, top, launch_angle, extra_mean, distance)
+
+
+class TrendEngine:
+    """
+    Per-session aggregates for every player in a SwingStore, persisted next
+    to the store so each session is summarised exactly once.
+    """
+
+    def __init__(self, store, max_cached=512):
+        self.store = store
+        self._aggregates = LRUCache(max_entries=max_cached)
+
+    def _path(self, kind, player, digest):
+        return os.path.join(self.store.root, "aggregates", kind, player_key(player), f"{digest}.npz")
+
+    def session_aggregate(self, kind, player, session_date, digest):
+        """Load or build (and persist) the aggregate for one stored session."""
+        return self._aggregates.get_or_compute(
+            (kind, digest), lambda: self._load_or_build(kind, player, session_date, digest)
+        )
+
+    def _load_or_build(self, kind, player, session_date, digest):
+        path = self._path(kind, player, digest)
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                return SessionAggregate(kind, saved["bins"], saved["totals"])
+
+        aggregate = SessionAggregate.from_columns(kind, self.store.load_session(kind, player, session_date, digest))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, bins=aggregate.bins, totals=aggregate.totals)
+        os.replace(tmp_path, path)
+        return aggregate
+
+    def period_aggregates(self, kind, player, freq="W", start=None, end=None):
+        """
+        Sum session aggregates into calendar periods (pandas offset alias,
+        default weekly), optionally limited to sessions between start and end.
+        Returns [(period start, SessionAggregate)] in order.
+        """
+        sessions = self.store.sessions(player, kind, start, end)
+        if sessions.empty:
+            return []
+        periods = pd.to_datetime(sessions["session_date"]).dt.to_period(freq).dt.start_time
+        grouped = {}
+        for period, session in zip(periods, sessions.itertuples()):
+            aggregate = self.session_aggregate(kind, session.player, session.session_date, session.digest)
+            grouped[period] = grouped[period] + aggregate if period in grouped else aggregate
+        return sorted(grouped.items(), key=lambda item: item[0])
+
+    def trend(self, kind, player, level, freq="W", window=4, start=None, end=None):
+        """
+        One row per period with each tracked metric for the period itself,
+        over the trailing `window` periods and cumulatively to date, plus the
+        grade of the period value. Windows come from differences of running
+        totals, so each row costs O(bins) regardless of history length.
+        """
+        periods = self.period_aggregates(kind, player, freq, start, end)
+        if not periods:
+            return pd.DataFrame()
+
+        running = [SessionAggregate.empty(kind)]
+        for _, aggregate in periods:
+            running.append(running[-1] + aggregate)
+
+        rows = []
+        for i, (period, aggregate) in enumerate(periods):
+            cumulative = running[i + 1]
+            rolling = cumulative - running[max(0, i + 1 - window)]
+            row = {"period": period, "swings": aggregate.count}
+            for suffix, agg in (("", aggregate), ("_rolling", rolling), ("_cumulative", cumulative)):
+                result = agg.metrics(level)
+                for name in TREND_METRICS[kind]:
+                    row[name + suffix] = getattr(result, name)
+            rows.append(row)
+
+        table = pd.DataFrame(rows).set_index("period")
+        for name, benchmark_metric in TREND_METRICS[kind].items():
+            table[name + "_grade"] = grade_metric_array(table[name], level, benchmark_metric)
+        return table